@@ -2,20 +2,19 @@
 import datetime
 import itertools
 from collections import defaultdict
-from operator import attrgetter, itemgetter  # pylint: disable=E0611
+from operator import attrgetter  # pylint: disable=E0611
 
-from django.conf import settings
 from django.contrib.auth.models import AnonymousUser, User
 from django.template import RequestContext
 from django.template.loader import render_to_string
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ugettext_noop
-from six.moves import zip
 
 from oioioi.acm.score import ACMScore, BinaryScore, format_time
 from oioioi.contests.models import (ProblemInstance, Submission,
                                     SubmissionReport, UserResultForProblem)
+from oioioi.contests.predicates import cached_predicate
 from oioioi.contests.utils import rounds_times
 from oioioi.participants.controllers import (OpenParticipantsController,
                                              ParticipantsController)
@@ -164,6 +163,7 @@ class ACMContestController(ProgrammingContestController):
     def ranking_controller(self):
         return ACMRankingController(self.contest)
 
+    @cached_predicate(cross_request=True)
     def can_see_round(self, request_or_context, round):
         context = self.make_context(request_or_context)
         if context.is_admin:
@@ -181,6 +181,7 @@ class ACMOpenContestController(ACMContestController):
     def registration_controller(self):
         return OpenParticipantsController(self.contest)
 
+    @cached_predicate(cross_request=True)
     def can_submit(self, request, problem_instance, check_round_times=True):
         if request.user.is_anonymous():
             return False
@@ -271,8 +272,7 @@ class ACMRankingController(DefaultRankingController):
                 results.append(result)
         return results
 
-    def serialize_ranking(self, key):
-        controller = self.contest.controller
+    def _get_rounds_and_pis(self, key):
         rounds = list(self._rounds_for_key(key))
         # If at least one visible round is not trial we don't want to show
         # trial rounds in default ranking.
@@ -281,30 +281,36 @@ class ACMRankingController(DefaultRankingController):
             if not_trial:
                 rounds = not_trial
 
-        freeze_times = [controller.get_round_freeze_time(round)
-                        for round in rounds]
-
         pis = list(ProblemInstance.objects.filter(round__in=rounds)
                 .select_related('problem').prefetch_related('round'))
+        return rounds, pis
+
+    def _get_freeze_time(self, key, round):
+        """Returns the time of the round's ranking freeze, or ``None`` if
+           the round's results should not be frozen in the ranking.
+        """
+        ccontroller = self.contest.controller
+        freeze_time = ccontroller.get_round_freeze_time(round)
+        rtimes = ccontroller.get_round_times(None, round)
+        now = timezone.now()
+        if freeze_time is None or \
+                self.is_admin_key(key) or \
+                rtimes.results_visible(now) or \
+                now <= freeze_time:
+            return None
+        return freeze_time
+
+    def _get_results(self, key, rounds, pis, users):
         rtopis = defaultdict(lambda: [])
 
         for pi in pis:
             rtopis[pi.round].append(pi)
 
-        users = self.filter_users_for_ranking(key, User.objects.all())
-
         results = []
-        ccontroller = self.contest.controller
-
-        frozen = False
-        for round, freeze_time in zip(rounds, freeze_times):
+        for round in rounds:
             rpis = rtopis[round]
-            rtimes = ccontroller.get_round_times(None, round)
-            now = timezone.now()
-            if freeze_time is None or \
-                    self.is_admin_key(key) or \
-                    rtimes.results_visible(now) or \
-                    now <= freeze_time:
+            freeze_time = self._get_freeze_time(key, round)
+            if freeze_time is None:
                 results += UserResultForProblem.objects \
                     .filter(problem_instance__in=rpis, user__in=users) \
                     .prefetch_related('problem_instance__round') \
@@ -312,15 +318,14 @@ class ACMRankingController(DefaultRankingController):
                             'problem_instance__contest')
             else:
                 results += self._get_old_results(freeze_time, rpis, users)
-                frozen = True
-
-        data = self._get_users_results(pis, results, rounds, users)
-        self._assign_places(data, itemgetter('sum'))
-        return {'rows': data,
-                'problem_instances': self._get_pis_with_visibility(key, pis),
-                'frozen': frozen,
-                'participants_on_page': getattr(settings,
-                    'PARTICIPANTS_ON_PAGE', 100)}
+        return results
+
+    def _serialize_header(self, key, rounds, pis):
+        header = super(ACMRankingController, self) \
+                ._serialize_header(key, rounds, pis)
+        header['frozen'] = any(self._get_freeze_time(key, round) is not None
+                               for round in rounds)
+        return header
 
 
 class NotificationsMixinForACMContestController(object):
@@ -20,6 +20,7 @@ class BinaryScore(ScoreValue):
     """
 
     symbol = 'bool'
+    int_sort_key = True
     accepted = False
 
     def __init__(self, solved=False):
@@ -54,6 +55,9 @@ class BinaryScore(ScoreValue):
         else:
             return _("Rejected")
 
+    def to_sort_key(self):
+        return int(self.accepted)
+
     def to_int(self):
         return int(self.accepted)
 
@@ -158,10 +162,13 @@ class ACMScore(ScoreValue):
 
            ``penalties_count`` is number of unsuccessful submissions.
         """
-        ordering = 10**10 * (self.problems_solved + 1) - self.total_time
-        return '%020d:%010d:%010d:%010d' % (ordering,
+        return '%020d:%010d:%010d:%010d' % (self.to_sort_key(),
                 self.problems_solved, self.time_passed, self.penalties_count)
 
+    def to_sort_key(self):
+        """More problems solved, then less total time, give greater keys."""
+        return 10**10 * (self.problems_solved + 1) - self.total_time
+
     @property
     def total_time(self):
         if self.problems_solved > 0:
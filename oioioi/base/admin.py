@@ -305,7 +305,7 @@ class AdminSite(DjangoAdminSite):
 site = AdminSite(name='oioioiadmin')
 
 system_admin_menu_registry = MenuRegistry(_("System Administration"),
-                                          is_superuser)
+                                          is_superuser, name='system_admin')
 side_pane_menus_registry.register(system_admin_menu_registry, order=10)
 
 
@@ -0,0 +1,137 @@
+"""Cached values of context processors.
+
+   Context processors run for every rendered page, so the values they put
+   into the template context should be cheap to get. Processors (and
+   functions computing parts of their values) decorated with
+   :func:`cached_processor` keep their results in the cache:
+
+   * ``key`` is a function of the request returning a tuple of the
+     properties of the request the value depends on (e.g. the id of the
+     current contest), or ``None`` if the value mustn't be cached for the
+     request,
+   * ``per_user=True`` makes the value depend also on the user,
+   * ``timeout`` is the number of seconds for which the value is reused
+     (``settings.CACHED_PROCESSORS_TIMEOUT`` by default), or a function
+     returning it,
+   * ``invalidated_by`` is a function of the request returning a list of
+     invalidation keys; after :func:`invalidate_processors` is called with
+     one of them, values computed for it are no longer used.
+
+   Values depending on the state of a user, which may change with nearly
+   any of the user's actions, can be invalidated by
+   :func:`user_actions_key`, which is done by
+   :class:`~oioioi.base.middleware.InvalidateUserProcessorsMiddleware`
+   after each request of the user changing data, and when the user, their
+   permissions or participations in contests are saved.
+
+   Values are cached separately for each language. They must be picklable,
+   so they should be computed eagerly, not wrapped in lazy objects.
+
+   Hit rates of the cache and times spent in all context processors are
+   shown by :class:`~oioioi.base.panels.ContextProcessorsPanel` of the
+   debug toolbar.
+"""
+import functools
+import hashlib
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import get_language
+
+
+def _version_key(invalidation_key):
+    return 'cached_processor_version/%s' % (invalidation_key,)
+
+
+def _versions(invalidation_keys):
+    keys = [_version_key(key) for key in invalidation_keys]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        for key in missing:
+            cache.add(key, uuid.uuid4().hex, None)
+        versions.update(cache.get_many(missing))
+    return [versions.get(key) for key in keys]
+
+
+def invalidation_version(invalidation_key):
+    """Returns the current version of values computed for the invalidation
+       key, which changes whenever :func:`invalidate_processors` is called
+       with it. It may be used to version other cached values.
+    """
+    return _versions([invalidation_key])[0]
+
+
+def invalidate_processors(invalidation_key):
+    """Drops values of cached processors computed for the invalidation
+       key.
+    """
+    cache.delete(_version_key(invalidation_key))
+    transaction.on_commit(lambda: cache.delete(_version_key(invalidation_key)))
+
+
+def user_actions_key(user_id):
+    """Returns the invalidation key of values depending on actions of the
+       user with the given id.
+    """
+    return 'user_actions/%s' % (user_id,)
+
+
+def _stats(request):
+    if not hasattr(request, '_cached_processors_stats'):
+        request._cached_processors_stats = Counter()
+    return request._cached_processors_stats
+
+
+def processor_cache_stats(request):
+    """Returns a dictionary mapping names of the cached processors called
+       during ``request`` into pairs ``(hits, misses)``.
+    """
+    stats = _stats(request)
+    return dict((name, (stats[name, 'hit'], stats[name, 'miss']))
+                for name in set(name for name, _kind in stats))
+
+
+def cached_processor(key=None, per_user=False, timeout=None,
+                     invalidated_by=None, name=None):
+    """Decorator of functions of a request, whose results are kept in the
+       cache, see :mod:`oioioi.base.cached_processors`.
+
+       :param name: the name of the value, unique across the project; the
+                    dotted path of the function by default
+    """
+    def decorator(fn):
+        value_name = name or '%s.%s' % (fn.__module__, fn.__name__)
+
+        @functools.wraps(fn)
+        def wrapper(request):
+            parts = key(request) if key is not None else ()
+            if parts is None:
+                return fn(request)
+            parts = [value_name, str(get_language())] + \
+                    [repr(part) for part in parts]
+            if per_user:
+                parts.append(repr(request.user.id))
+            if invalidated_by is not None:
+                parts.extend(str(version) for version
+                             in _versions(invalidated_by(request)))
+            cache_key = 'cached_processor/%s' % (
+                    hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest(),)
+
+            value_timeout = timeout() if callable(timeout) else timeout
+            if value_timeout is None:
+                value_timeout = settings.CACHED_PROCESSORS_TIMEOUT
+
+            cached = cache.get(cache_key)
+            if cached is not None:
+                _stats(request)[value_name, 'hit'] += 1
+                return cached[0]
+            _stats(request)[value_name, 'miss'] += 1
+            value = fn(request)
+            cache.set(cache_key, (value,), value_timeout)
+            return value
+        return wrapper
+    return decorator
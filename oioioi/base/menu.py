@@ -4,13 +4,49 @@ import sys
 from operator import attrgetter  # pylint: disable=E0611
 
 import six
+from django.conf import settings
 from django.utils.html import escape
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 
+from oioioi.base.cached_processors import cached_processor, user_actions_key
 from oioioi.base.permissions import Condition
 
 
+def menus_invalidation_key(contest_id):
+    """Returns the invalidation key of cached menus (see
+       :mod:`oioioi.base.cached_processors`) of the contest with the given
+       id (``None`` for pages outside of contests).
+    """
+    return 'menus/%s' % (contest_id,)
+
+
+def menu_cache_key(request):
+    """Returns the key of cached menus for the request, or ``None`` if
+       menus mustn't be cached.
+
+       Menus are kept in the cache for ``settings.MENU_CACHE_TIMEOUT``
+       seconds per user and contest. They're dropped along with other
+       values of :func:`~oioioi.base.cached_processors.user_actions_key`
+       (e.g. after each action of the user changing data, or changes of the
+       user's permissions or participations), and when
+       :func:`menus_invalidation_key` of the contest is invalidated (e.g.
+       when its structure or links change).
+    """
+    if settings.MENU_CACHE_TIMEOUT <= 0 or not hasattr(request, 'user'):
+        return None
+    contest = getattr(request, 'contest', None)
+    real_user = getattr(request, 'real_user', request.user)
+    return (contest.id if contest is not None else None, real_user.id)
+
+
+def menu_invalidation_keys(request):
+    contest = getattr(request, 'contest', None)
+    return [menus_invalidation_key(contest.id if contest is not None
+                                   else None),
+            user_actions_key(request.user.id)]
+
+
 class OrderedRegistry(object):
     """Maintains a collection of values ordered by a separate key."""
 
@@ -82,15 +118,26 @@ class MenuRegistry(object):
        :param text: menu name to display (if appropriate)
        :param condition: decides if menu should be considered as available
        :type condition: :class:`oioioi.base.permissions.Condition`
+       :param name: a unique identifier; lists of items of menus with names
+                    are kept in the cache (see :func:`menu_cache_key`), so
+                    they shouldn't depend on anything but the user, the
+                    contest, the language and time
     """
 
-    def __init__(self, text=None, condition=None):
+    def __init__(self, text=None, condition=None, name=None):
         self.text = text
         if condition is None:
             condition = lambda request: True
         self.condition = condition
+        self.name = name
         self._registry = []
         self._generators = {}
+        if name is not None:
+            self._cached_template_context = cached_processor(
+                    key=menu_cache_key, per_user=True,
+                    timeout=lambda: settings.MENU_CACHE_TIMEOUT,
+                    invalidated_by=menu_invalidation_keys,
+                    name='menu:%s' % (name,))(self._template_context)
 
     def register(self, name, text, url_generator, condition=None, attrs=None,
                  order=sys.maxsize):
@@ -163,6 +210,11 @@ class MenuRegistry(object):
 
     def template_context(self, request):
         """Returns a list of items to pass to a template for rendering."""
+        if self.name is not None:
+            return self._cached_template_context(request)
+        return self._template_context(request)
+
+    def _template_context(self, request):
         if not self.condition(request):
             return []
 
@@ -185,12 +237,12 @@ class MenuRegistry(object):
 
 #: The default menu registry. Modules should use this to register menu items
 #: commonly accessible to users.
-menu_registry = MenuRegistry(_("User Menu"))
+menu_registry = MenuRegistry(_("User Menu"), name='menu')
 
 #: The menu registry for the user menu, shown as a drop down when a logged in
 #: user clicks on its login in the navbar.
 account_menu_registry = MenuRegistry(_("Account Menu"),
-        lambda request: request.user.is_authenticated())
+        lambda request: request.user.is_authenticated(), name='account')
 
 #: The registry for *menus* displayed on the side.
 side_pane_menus_registry = OrderedRegistry()
@@ -10,6 +10,8 @@ from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 
+from oioioi.base.cached_processors import (invalidate_processors,
+                                           user_actions_key)
 from oioioi.base.utils.user import has_valid_username
 from oioioi.su.utils import is_under_su
 
@@ -39,6 +41,26 @@ class HttpResponseNotAllowedMiddleware(object):
         return response
 
 
+class InvalidateUserProcessorsMiddleware(object):
+    """Middleware dropping cached values depending on actions of the user
+       (see :func:`oioioi.base.cached_processors.user_actions_key`) after
+       each request which may change data, i.e. with a method other than
+       GET, HEAD or OPTIONS.
+
+       It should be placed after the authentication middlewares.
+    """
+
+    def process_response(self, request, response):
+        if request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return response
+        users = [getattr(request, 'user', None),
+                 getattr(request, 'real_user', None)]
+        for user_id in set(user.id for user in users
+                           if user is not None and user.is_authenticated()):
+            invalidate_processors(user_actions_key(user_id))
+        return response
+
+
 class AnnotateUserBackendMiddleware(object):
     """Middleware annotating user object with path of authentication
        backend.
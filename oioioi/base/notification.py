@@ -5,8 +5,10 @@ import time
 import uuid
 
 from django.conf import settings
+from django.core.cache import cache
 from pika import BlockingConnection, ConnectionParameters, PlainCredentials
-from pika.exceptions import AMQPChannelError, AMQPConnectionError
+from pika.exceptions import (AMQPChannelError, AMQPConnectionError,
+                             ChannelClosed)
 import six.moves.urllib.parse
 
 from oioioi.base.utils.loaders import load_modules
@@ -15,6 +17,91 @@ logger = logging.getLogger(__name__)
 thread_data = threading.local()
 
 
+class NotificationPublisher(object):
+    """Publishes notification messages to RabbitMQ through a channel kept
+       open for the whole connection.
+
+       Queues are declared once per channel. Messages are published in
+       transactions of ``settings.NOTIFICATIONS_PUBLISH_BATCH_SIZE``
+       messages, so that the broker confirms a whole batch at once.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._open_channel()
+
+    def _open_channel(self):
+        self.channel = self.connection.channel()
+        self.channel.tx_select()
+        self.declared_queues = set()
+
+    def _declare_queue(self, queue_name):
+        if queue_name not in self.declared_queues:
+            self.channel.queue_declare(queue=queue_name, durable=True)
+            self.declared_queues.add(queue_name)
+
+    def publish(self, queue_names, body):
+        """Publishes the message ``body`` to each of the queues."""
+        batch_size = settings.NOTIFICATIONS_PUBLISH_BATCH_SIZE
+        pending = 0
+        for queue_name in queue_names:
+            self._declare_queue(queue_name)
+            self.channel.basic_publish(exchange='', routing_key=queue_name,
+                    body=body)
+            pending += 1
+            if pending >= batch_size:
+                self.channel.tx_commit()
+                pending = 0
+        if pending:
+            self.channel.tx_commit()
+
+    def _bindings_key(self, exchange):
+        return 'notifications_bindings:%s' % exchange
+
+    def _exchange_exists(self, exchange):
+        try:
+            self.channel.exchange_declare(exchange=exchange,
+                    exchange_type='fanout', durable=True, passive=True)
+            return True
+        except ChannelClosed:
+            # The broker closes the channel when the exchange is missing.
+            self._open_channel()
+            return False
+
+    def _update_bindings(self, exchange, queue_names):
+        # Bindings are shared by all processes, so the bound queues are kept
+        # in the cache, and only the changes since the previous broadcast
+        # are made. If the exchange is gone (e.g. the broker lost it), so
+        # are its bindings, and all the queues are bound again. If the
+        # cache entry is lost, the queues are bound again too, which is
+        # harmless, but queues which are no longer wanted stay bound.
+        key = self._bindings_key(exchange)
+        bound = cache.get(key)
+        if bound is None or not self._exchange_exists(exchange):
+            self.channel.exchange_declare(exchange=exchange,
+                    exchange_type='fanout', durable=True)
+            bound = set()
+        for queue_name in bound - queue_names:
+            self.channel.queue_unbind(queue=queue_name, exchange=exchange)
+        for queue_name in queue_names - bound:
+            self._declare_queue(queue_name)
+            self.channel.queue_bind(queue=queue_name, exchange=exchange)
+        cache.set(key, queue_names, None)
+
+    def broadcast(self, exchange, queue_names, body):
+        """Publishes the message ``body`` once to the fanout exchange
+           ``exchange``, which delivers it to each of the queues.
+
+           The queues bound to the exchange are updated first, so only
+           changes of the set of queues since the previous broadcast cost
+           additional calls.
+        """
+        self._update_bindings(exchange, set(queue_names))
+        self.channel.basic_publish(exchange=exchange, routing_key='',
+                body=body)
+        self.channel.tx_commit()
+
+
 class NotificationHandler(logging.StreamHandler):
     """This handler catches all logs and emits a notification
        if a notification type is set in the extra dictionary,
@@ -54,6 +141,7 @@ class NotificationHandler(logging.StreamHandler):
                     kwargs['credentials'] = PlainCredentials(o.username, o.password)
                 parameters = ConnectionParameters(**kwargs)
                 thread_data.conn = BlockingConnection(parameters)
+                thread_data.publisher = None
 
                 thread_data.rabbitmq_connected = True
             # pylint: disable=broad-except
@@ -63,28 +151,64 @@ class NotificationHandler(logging.StreamHandler):
                             exc_info=True)
 
     @classmethod
-    def _send_notification_message(cls, user, message, repeated=False):
+    def _get_publisher(cls):
+        if getattr(thread_data, 'publisher', None) is None:
+            thread_data.publisher = NotificationPublisher(thread_data.conn)
+        return thread_data.publisher
+
+    @classmethod
+    def _publish(cls, publish, repeated=False):
         if not hasattr(thread_data, 'conn') or \
                 not getattr(thread_data, 'rabbitmq_connected', False):
             return
 
         try:
-            queue_name = NotificationHandler.notification_queue_prefix \
-                    + str(user.pk)
-            channel = thread_data.conn.channel()
-            channel.queue_declare(queue=queue_name, durable=True)
-            channel.basic_publish(exchange='',
-                routing_key=queue_name, body=json.dumps(message))
+            publish(NotificationHandler._get_publisher())
         except (AMQPChannelError, AMQPConnectionError):
             logger.info("Notifications: Connection with RabbitMQ broken",
                     exc_info=True)
             thread_data.rabbitmq_connected = False
+            thread_data.publisher = None
 
             # Make a second try
             if not repeated:
                 NotificationHandler._check_connection()
-                NotificationHandler._send_notification_message(user, message,
-                        repeated=True)
+                NotificationHandler._publish(publish, repeated=True)
+
+    @classmethod
+    def _queue_name(cls, user):
+        return NotificationHandler.notification_queue_prefix + str(user.pk)
+
+    @classmethod
+    def _send_notification_message(cls, users, message):
+        queue_names = [NotificationHandler._queue_name(user)
+                       for user in users]
+        body = json.dumps(message)
+        NotificationHandler._publish(
+                lambda publisher: publisher.publish(queue_names, body))
+
+    @classmethod
+    def _make_message(cls, notification_message,
+            notification_message_arguments):
+        message = {}
+
+        # Id of a message is an unique uuid4.
+        message['id'] = str(uuid.uuid4())
+
+        message['date'] = round(time.time() * 1000)
+        message['message'] = notification_message
+
+        if 'details' in notification_message_arguments:
+            message['details'] = notification_message_arguments['details']
+
+        if 'address' in notification_message_arguments:
+            message['address'] = notification_message_arguments['address']
+
+        if 'popup' in notification_message_arguments:
+            message['popup'] = notification_message_arguments['popup']
+
+        message['arguments'] = notification_message_arguments
+        return message
 
     @classmethod
     def send_notification(cls, user, notification_type,
@@ -113,29 +237,47 @@ class NotificationHandler(logging.StreamHandler):
                    * "details" -- a short information
                        for the user about the event.
         """
+        NotificationHandler.send_notifications([user], notification_type,
+                notification_message, notification_message_arguments)
 
-        NotificationHandler._check_connection()
-
-        message = {}
-
-        # Id of a message is an unique uuid4.
-        message['id'] = str(uuid.uuid4())
-
-        message['date'] = round(time.time() * 1000)
-        message['message'] = notification_message
-
-        if 'details' in notification_message_arguments:
-            message['details'] = notification_message_arguments['details']
+    @classmethod
+    def send_notifications(cls, users, notification_type,
+            notification_message, notification_message_arguments):
+        """Sends the same notification to each of the users, publishing
+           the messages in batches.
 
-        if 'address' in notification_message_arguments:
-            message['address'] = notification_message_arguments['address']
+           See :meth:`send_notification` for the description of
+           the arguments.
+        """
+        NotificationHandler._check_connection()
+        message = NotificationHandler._make_message(notification_message,
+                notification_message_arguments)
+        NotificationHandler._send_notification_message(users, message)
 
-        if 'popup' in notification_message_arguments:
-            message['popup'] = notification_message_arguments['popup']
+    @classmethod
+    def broadcast_notification(cls, audience, users, notification_type,
+            notification_message, notification_message_arguments):
+        """Sends the same notification to a group of users, publishing
+           a single message to a fanout exchange.
 
-        message['arguments'] = notification_message_arguments
+           :param audience: A string identifying the group, e.g.
+               ``'contest_%s' % contest.id``. The exchange of the group is
+               bound to queues of ``users``, so it should be used for one
+               set of users, which may change over time.
 
-        NotificationHandler._send_notification_message(user, message)
+           See :meth:`send_notification` for the description of
+           the other arguments.
+        """
+        NotificationHandler._check_connection()
+        message = NotificationHandler._make_message(notification_message,
+                notification_message_arguments)
+        exchange = NotificationHandler.notification_queue_prefix \
+                + 'broadcast_' + audience
+        queue_names = [NotificationHandler._queue_name(user)
+                       for user in users]
+        body = json.dumps(message)
+        NotificationHandler._publish(lambda publisher:
+                publisher.broadcast(exchange, queue_names, body))
 
     @classmethod
     def register_notification(cls, notification_type, notification_function):
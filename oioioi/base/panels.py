@@ -0,0 +1,75 @@
+import time
+from collections import OrderedDict
+
+from debug_toolbar.panels import Panel
+from django.template import engines
+from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import ungettext
+
+from oioioi.base.cached_processors import processor_cache_stats
+
+
+def _timed(processor):
+    def timed_processor(request):
+        start = time.time()
+        try:
+            return processor(request)
+        finally:
+            if not hasattr(request, '_context_processors_times'):
+                request._context_processors_times = []
+            request._context_processors_times.append(
+                    (timed_processor.name, time.time() - start))
+    timed_processor.original = processor
+    timed_processor.name = '%s.%s' % (processor.__module__,
+                                      processor.__name__)
+    return timed_processor
+
+
+class ContextProcessorsPanel(Panel):
+    """Panel of the debug toolbar showing times spent in context processors
+       and hit rates of cached processors (see
+       :mod:`oioioi.base.cached_processors`).
+    """
+    title = _("Context processors")
+    template = 'base/debug_toolbar/context_processors.html'
+
+    def _django_engines(self):
+        return [backend.engine for backend in engines.all()
+                if hasattr(backend, 'engine')]
+
+    def enable_instrumentation(self):
+        for engine in self._django_engines():
+            processors = engine.template_context_processors
+            if not any(hasattr(p, 'original') for p in processors):
+                engine.template_context_processors = \
+                        tuple(_timed(p) for p in processors)
+
+    def disable_instrumentation(self):
+        for engine in self._django_engines():
+            engine.template_context_processors = \
+                    tuple(getattr(p, 'original', p)
+                          for p in engine.template_context_processors)
+
+    @property
+    def nav_subtitle(self):
+        stats = self.get_stats()
+        if not stats:
+            return ''
+        return ungettext("%(count)d call in %(time).1f ms",
+                         "%(count)d calls in %(time).1f ms",
+                         stats['calls']) % {'count': stats['calls'],
+                                            'time': stats['time']}
+
+    def process_response(self, request, response):
+        processors = OrderedDict()
+        for name, seconds in getattr(request, '_context_processors_times',
+                                     []):
+            calls, total = processors.get(name, (0, 0.))
+            processors[name] = (calls + 1, total + 1000 * seconds)
+        self.record_stats({
+            'processors': [(name, calls, total) for name, (calls, total)
+                           in processors.items()],
+            'cached': sorted(processor_cache_stats(request).items()),
+            'calls': sum(calls for calls, _total in processors.values()),
+            'time': sum(total for _calls, total in processors.values()),
+        })
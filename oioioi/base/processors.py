@@ -1,16 +1,26 @@
 from django.conf import settings
 from django.core.urlresolvers import get_script_prefix
 
-from oioioi.base.menu import side_pane_menus_registry
+from oioioi.base.cached_processors import cached_processor
+from oioioi.base.menu import (menu_cache_key, menu_invalidation_keys,
+                              side_pane_menus_registry)
 
 
 def base_url(request):
     return {'base_url': get_script_prefix()}
 
 
+@cached_processor(key=menu_cache_key, per_user=True,
+                  timeout=lambda: settings.MENU_CACHE_TIMEOUT,
+                  invalidated_by=menu_invalidation_keys)
+def _visible_side_menus(request):
+    return [i for i, m in enumerate(side_pane_menus_registry)
+            if m.condition(request)]
+
+
 def side_menus(request):
-    menus = [m for m in side_pane_menus_registry if m.condition(request)]
-    return {'side_menus': menus}
+    menus = list(side_pane_menus_registry)
+    return {'side_menus': [menus[i] for i in _visible_side_menus(request)]}
 
 
 def site_name(request):
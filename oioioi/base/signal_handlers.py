@@ -1,7 +1,36 @@
+from django.contrib.auth.models import User
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_save
+
+from oioioi.base.cached_processors import (invalidate_processors,
+                                           user_actions_key)
 
 
 def set_first_view_after_logging_flag(sender, user, request, **kwargs):
     request.session['first_view_after_logging'] = True
 
 user_logged_in.connect(set_first_view_after_logging_flag)
+
+
+def invalidate_user_processors(sender, instance, **kwargs):
+    # Menus (and other cached values) of the user depend on their flags
+    # (e.g. is_superuser), permissions and groups.
+    invalidate_processors(user_actions_key(instance.id))
+
+post_save.connect(invalidate_user_processors, sender=User)
+
+
+def invalidate_user_processors_m2m(sender, instance, action, reverse, pk_set,
+                                   **kwargs):
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        invalidate_user_processors(sender, instance)
+    else:
+        for user_id in pk_set or ():
+            invalidate_processors(user_actions_key(user_id))
+
+m2m_changed.connect(invalidate_user_processors_m2m,
+                    sender=User.user_permissions.through)
+m2m_changed.connect(invalidate_user_processors_m2m,
+                    sender=User.groups.through)
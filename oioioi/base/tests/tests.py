@@ -26,10 +26,15 @@ from django.template import Context, Template
 from django.template.response import TemplateResponse
 from django.test.client import RequestFactory
 from django.test.utils import override_settings
+import mock
+from pika.exceptions import ChannelClosed
 import six
 from six.moves import reload_module, zip
 
 from oioioi.base import utils
+from oioioi.base.cached_processors import (cached_processor,
+                                           invalidate_processors,
+                                           processor_cache_stats)
 from oioioi.base.fields import DottedNameField, EnumField, EnumRegistry
 from oioioi.base.main_page import (register_main_page_view,
                                    unregister_main_page_view)
@@ -37,7 +42,7 @@ from oioioi.base.management.commands import import_users
 from oioioi.base.menu import (MenuRegistry, OrderedRegistry, menu_registry,
                               side_pane_menus_registry)
 from oioioi.base.middleware import UserInfoInErrorMessage
-from oioioi.base.notification import NotificationHandler
+from oioioi.base.notification import NotificationHandler, thread_data
 from oioioi.base.permissions import (Condition, RequestBasedCondition,
                                      enforce_condition, is_superuser,
                                      make_condition, make_request_condition)
@@ -45,6 +50,7 @@ from oioioi.base.tests import TestCase
 from oioioi.base.utils import (RegisteredSubclassesBase, archive,
                                split_extension, strip_num_or_hash)
 from oioioi.base.utils.execute import ExecuteError, execute
+from oioioi.contests.models import Contest, ContestPermission
 from oioioi.contests.utils import is_contest_admin
 
 if not getattr(settings, 'TESTS', False):
@@ -270,6 +276,85 @@ class TestMenu(TestCase):
             side_pane_menus_registry.items = old_items
 
 
+class TestCachedProcessors(TestCase):
+    fixtures = ['test_users', 'test_contest']
+
+    def _request(self, username):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(username=username)
+        return request
+
+    def test_cached_processor(self):
+        calls = []
+
+        @cached_processor(per_user=True, name='test_processor',
+                          invalidated_by=lambda request: ['test_key'])
+        def processor(request):
+            calls.append(request.user.username)
+            return {'value': len(calls)}
+
+        request = self._request('test_user')
+        self.assertEqual(processor(request), {'value': 1})
+        self.assertEqual(processor(request), {'value': 1})
+        self.assertEqual(processor(self._request('test_admin')),
+                         {'value': 2})
+        invalidate_processors('test_key')
+        self.assertEqual(processor(self._request('test_user')),
+                         {'value': 3})
+        self.assertEqual(processor_cache_stats(request),
+                         {'test_processor': (1, 1)})
+
+    def test_uncached_requests(self):
+        calls = []
+
+        @cached_processor(key=lambda request: None)
+        def processor(request):
+            calls.append(request)
+            return len(calls)
+
+        request = self._request('test_user')
+        self.assertEqual(processor(request), 1)
+        self.assertEqual(processor(request), 2)
+        self.assertEqual(processor_cache_stats(request), {})
+
+    def test_cached_menu(self):
+        calls = []
+
+        def condition(request):
+            calls.append(request)
+            return True
+
+        saved_menu = menu_registry._registry
+        menu_registry._registry = []
+        try:
+            menu_registry.register('test', 'Test Menu Item',
+                    lambda request: '/test_menu_link',
+                    condition=Condition(condition))
+            self.assertTrue(self.client.login(username='test_user'))
+            url = reverse('contest_dashboard', kwargs={'contest_id': 'c'})
+            response = self.client.get(url)
+            self.assertIn('/test_menu_link', response.content)
+            self.assertEqual(len(calls), 1)
+
+            response = self.client.get(url)
+            self.assertIn('/test_menu_link', response.content)
+            self.assertEqual(len(calls), 1)
+
+            # Actions of the user invalidate their menus
+            self.client.post(url)
+            calls_after_post = len(calls)
+            self.client.get(url)
+            self.assertEqual(len(calls), calls_after_post + 1)
+
+            # So do changes of their permissions
+            ContestPermission.objects.create(contest=Contest.objects.get(),
+                    user=User.objects.get(username='test_user'))
+            self.client.get(url)
+            self.assertEqual(len(calls), calls_after_post + 2)
+        finally:
+            menu_registry._registry = saved_menu
+
+
 class TestErrorHandlers(TestCase):
     fixtures = ['test_users']
 
@@ -722,6 +807,35 @@ class TestArchive(TestCase):
         finally:
             shutil.rmtree(tmpdir)
 
+    def test_partial_extract(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            for good_file in self.good_files:
+                filename = os.path.join(self.base_dir, good_file)
+                archive.extract(filename, tmpdir, members=['b'])
+                self.assertEqual(os.listdir(tmpdir), ['b'])
+                os.unlink(os.path.join(tmpdir, 'b'))
+        finally:
+            shutil.rmtree(tmpdir)
+
+    def test_iter_files(self):
+        for good_file in self.good_files:
+            filename = os.path.join(self.base_dir, good_file)
+            files = [(name, f.read().strip()) for name, f
+                     in archive.Archive(filename).iter_files()]
+            self.assertEqual(files, [('a', 'foo'), ('b', 'bar')])
+            files = [name for name, _f
+                     in archive.Archive(filename).iter_files(['b'])]
+            self.assertEqual(files, ['b'])
+        for bad_file, link in zip(self.bad_files,
+                                  ['a-symlink', 'a-hardlink']):
+            filename = os.path.join(self.base_dir, bad_file)
+            files = [name for name, _f
+                     in archive.Archive(filename).iter_files()]
+            self.assertEqual(files, ['a'])
+            with self.assertRaises(archive.ArchiveException):
+                list(archive.Archive(filename).iter_files(['a', link]))
+
     def test_size_calc(self):
         for good_file, expected_size in zip(self.good_files, (8, 8)):
             filename = os.path.join(self.base_dir, good_file)
@@ -866,6 +980,51 @@ class TestNotifications(TestCase):
             extra={'notification': 'test_notification'})
         self.assertTrue(flags['got_notification'])
 
+    @override_settings(NOTIFICATIONS_PUBLISH_BATCH_SIZE=2)
+    def test_publishing(self):
+        conn = mock.Mock()
+        channel = conn.channel.return_value
+        with mock.patch.multiple(thread_data, create=True, conn=conn,
+                rabbitmq_connected=True, publisher=None):
+            users = list(User.objects.all()[:3])
+            NotificationHandler.send_notifications(users, 'test_notification',
+                    "Test", {})
+            NotificationHandler.send_notification(users[0],
+                    'test_notification', "Test", {})
+            self.assertEqual(conn.channel.call_count, 1)
+            self.assertEqual(channel.queue_declare.call_count, 3)
+            self.assertEqual(channel.basic_publish.call_count, 4)
+            self.assertEqual(channel.tx_commit.call_count, 3)
+
+            channel.reset_mock()
+            for _i in range(2):
+                NotificationHandler.broadcast_notification('test', users,
+                        'test_notification', "Test", {})
+            self.assertEqual(channel.queue_bind.call_count, 3)
+            self.assertFalse(channel.exchange_delete.called)
+            self.assertEqual(channel.basic_publish.call_count, 2)
+            channel.basic_publish.assert_called_with(
+                    exchange='_notifs_broadcast_test', routing_key='',
+                    body=mock.ANY)
+
+            channel.reset_mock()
+            NotificationHandler.broadcast_notification('test', users[1:],
+                    'test_notification', "Test", {})
+            channel.queue_unbind.assert_called_once_with(
+                    queue='_notifs_%d' % users[0].pk,
+                    exchange='_notifs_broadcast_test')
+            self.assertFalse(channel.queue_bind.called)
+
+            # The exchange was lost by the broker, so the queues are bound
+            # again, through a new channel.
+            channel.reset_mock()
+            channel.exchange_declare.side_effect = [
+                    ChannelClosed(404, 'NOT_FOUND'), None]
+            NotificationHandler.broadcast_notification('test', users[1:],
+                    'test_notification', "Test", {})
+            self.assertEqual(conn.channel.call_count, 2)
+            self.assertEqual(channel.queue_bind.call_count, 2)
+
 
 class TestCondition(TestCase):
     fixtures = ['test_users']
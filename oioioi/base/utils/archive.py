@@ -102,6 +102,9 @@ class Archive(object):
     def extracted_size(self):
         return self._archive.extracted_size()
 
+    def iter_files(self, names=None):
+        return self._archive.iter_files(names)
+
 
 class BaseArchive(object):
     """
@@ -123,22 +126,37 @@ class BaseArchive(object):
         """
         raise NotImplementedError()
 
-    def _extract(self, to_path):
+    def iter_files(self, names=None):
+        """
+        Yield pairs (filename, file-like object) for the regular files in the
+        archive, in the order in which they are stored, without extracting
+        them.  If 'names' is given, only the files with these names are
+        yielded, and ArchiveException is raised if any of them isn't
+        a regular file (e.g. is a link).  Each file object should be read
+        before the next one is requested.
+        """
+        raise NotImplementedError()
+
+    def _extract(self, to_path, members=None):
         """
         Performs the actual extraction.  Separate from 'extract' method so that
         we don't recurse when subclasses don't declare their own 'extract'
         method.
         """
-        self._archive.extractall(to_path)
+        self._archive.extractall(to_path, members)
 
-    def extract(self, to_path='', method='safe'):
+    def extract(self, to_path='', method='safe', members=None):
+        """
+        Extract the archive to 'to_path'.  If 'members' is given, only the
+        entries with these names (as returned by 'filenames') are extracted.
+        """
         if method == 'safe':
             self.check_files(to_path)
         elif method == 'insecure':
             pass
         else:
             raise ValueError("Invalid method option")
-        self._extract(to_path)
+        self._extract(to_path, members)
 
     def check_files(self, to_path=None):
         """
@@ -175,6 +193,22 @@ class TarArchive(BaseArchive):
             total += member.size
         return total
 
+    def iter_files(self, names=None):
+        for member in self._archive:
+            if names is not None and member.name not in names:
+                continue
+            if member.isfile():
+                yield member.name, self._archive.extractfile(member)
+            elif names is not None:
+                raise ArchiveException("Not a regular file: " + member.name)
+
+    def _extract(self, to_path, members=None):
+        if members is not None:
+            members = set(members)
+            members = [member for member in self._archive.getmembers()
+                       if member.name in members]
+        self._archive.extractall(to_path, members)
+
     def check_files(self, to_path=None):
         BaseArchive.check_files(self, to_path)
 
@@ -199,6 +233,23 @@ class ZipArchive(BaseArchive):
     def filenames(self):
         return [name.rstrip('/') for name in self._archive.namelist()]
 
+    def iter_files(self, names=None):
+        for info in self._archive.infolist():
+            if info.filename.endswith('/'):
+                if names is not None and info.filename.rstrip('/') in names:
+                    raise ArchiveException("Not a regular file: "
+                                           + info.filename)
+                continue
+            if names is None or info.filename in names:
+                yield info.filename, self._archive.open(info)
+
+    def _extract(self, to_path, members=None):
+        if members is not None:
+            members = set(members)
+            members = [name for name in self._archive.namelist()
+                       if name.rstrip('/') in members]
+        self._archive.extractall(to_path, members)
+
 extension_map = {
     '.tar': TarArchive,
     '.tar.bz2': TarArchive,
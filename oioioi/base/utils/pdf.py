@@ -11,6 +11,19 @@ from oioioi.base.utils.execute import execute
 from oioioi.filetracker.utils import stream_file
 
 
+def compile_pdf(tex_path, extra_args=[], num_passes=3):
+    """Runs pdflatex on the file ``tex_path`` and returns the path of
+       the generated PDF, which is placed in the same directory.
+    """
+    tmp_folder, tex_filename = os.path.split(tex_path)
+    command = ['pdflatex']
+    command.extend(extra_args)
+    command.append(tex_filename)
+    for _i in range(num_passes):
+        execute(command, cwd=tmp_folder)
+    return os.path.splitext(tex_path)[0] + '.pdf'
+
+
 def generate_pdf(tex_code, filename, extra_args=[], num_passes=3):
     # Create temporary file and folder
     tmp_folder = tempfile.mkdtemp()
@@ -21,14 +34,10 @@ def generate_pdf(tex_code, filename, extra_args=[], num_passes=3):
         with codecs.open(tex_path, 'w', 'utf-8') as f:
             f.write(tex_code)
 
-        command = ['pdflatex']
-        command.extend(extra_args)
-        command.append(tex_filename)
-        for _i in range(num_passes):
-            execute(command, cwd=tmp_folder)
+        pdf_path = compile_pdf(tex_path, extra_args, num_passes)
 
         # Get PDF file contents
-        pdf_file = open(os.path.splitext(tex_path)[0] + '.pdf')
+        pdf_file = open(pdf_path)
         return stream_file(File(pdf_file), filename)
     finally:
         shutil.rmtree(tmp_folder)
@@ -1,4 +1,5 @@
 import urllib
+import uuid
 from functools import partial
 
 import six.moves.urllib.parse
@@ -30,7 +31,9 @@ from oioioi.contests.models import (Contest, ContestAttachment, ContestLink,
                                     RoundTimeExtension, Submission,
                                     SubmissionReport, submission_kinds)
 from oioioi.contests.utils import is_contest_admin, is_contest_observer
+from oioioi.evalmgr.tasks import batched_evaluation
 from oioioi.problems.models import ProblemPackage, ProblemSite
+from oioioi.programs import test_result_cache
 from oioioi.programs.models import Test, TestReport
 
 
@@ -527,11 +530,14 @@ class SubmissionAdmin(admin.ModelAdmin):
                 break
 
         if all_reports_exist or rejudge_type == 'FULL':
-            for sub in submissions.values():
-                sub.problem_instance.controller.judge(sub,
-                                 is_rejudge=True,
-                                 extra_args={'tests_to_judge': tests,
-                                             'rejudge_type': rejudge_type})
+            rejudge_id = uuid.uuid4().hex
+            with batched_evaluation():
+                for sub in submissions.values():
+                    sub.problem_instance.controller.judge(sub,
+                            is_rejudge=True,
+                            extra_args={'tests_to_judge': tests,
+                                        'rejudge_type': rejudge_type,
+                                        'rejudge_id': rejudge_id})
 
             counter = len(submissions)
             self.message_user(
@@ -539,6 +545,9 @@ class SubmissionAdmin(admin.ModelAdmin):
                 ungettext_lazy("Queued one submission for rejudge.",
                                "Queued %(counter)d submissions for rejudge.",
                                counter) % {'counter': counter})
+            if test_result_cache.is_enabled():
+                self.message_user(request,
+                        _("Rejudge id: %s") % rejudge_id)
         else:
             self.message_user(
                 request,
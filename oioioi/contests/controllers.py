@@ -14,11 +14,14 @@ from django.utils.translation import ugettext_noop
 
 from oioioi.base.utils import (ObjectWithMixins, RegisteredSubclassesBase,
                                get_user_display_name)
-from oioioi.contests.models import (Contest, ProblemStatementConfig, Round,
+from oioioi.contests.models import (Contest, ProblemStatementConfig,
                                     RoundTimeExtension, Submission, ScoreReport,
                                     SubmissionReport, UserResultForContest,
                                     UserResultForProblem, UserResultForRound,
                                     submission_kinds)
+from oioioi.contests.predicates import cached_predicate
+from oioioi.contests.score_keys import sum_scores
+from oioioi.contests.structure import contest_rounds
 from oioioi.contests.scores import ScoreValue
 from oioioi.contests.utils import (generic_rounds_times, has_any_active_round,
                                    is_contest_admin, is_contest_observer,
@@ -37,11 +40,31 @@ def export_entries(registry, values):
     return result
 
 
-def submission_template_context(request, submission):
+def _score_reports(submission_ids):
+    """Returns a dictionary mapping ids of submissions into score reports
+       of their latest submission reports, using two queries.
+    """
+    latest_reports = {}
+    for report_id, submission_id in SubmissionReport.objects \
+            .filter(submission__in=submission_ids) \
+            .values_list('id', 'submission_id'):
+        latest_reports.setdefault(submission_id, report_id)
+
+    score_reports = {}
+    for score_report in ScoreReport.objects \
+            .filter(submission_report__in=list(latest_reports.values())) \
+            .order_by('id'):
+        score_reports.setdefault(score_report.submission_report_id,
+                                 score_report)
+    return dict((submission_id, score_reports.get(report_id))
+                for submission_id, report_id in latest_reports.items())
+
+
+def _submission_template_context(request, submission, can_see_score,
+        score_report):
     pi = submission.problem_instance
     controller = pi.controller
     can_see_status = controller.can_see_submission_status(request, submission)
-    can_see_score = controller.can_see_submission_score(request, submission)
     can_see_comment = controller.can_see_submission_comment(request,
             submission)
     link = reverse('submission', kwargs={
@@ -56,9 +79,6 @@ def submission_template_context(request, submission):
     message = submission.get_status_display
 
     if can_see_score and (submission.status == 'INI_OK' or submission.status == 'OK'):
-        submission_report = SubmissionReport.objects.filter(submission=submission).first()
-        score_report = ScoreReport.objects.filter(submission_report=submission_report).first()
-
         try:
             score_percentage = float(score_report.score.to_int()) / score_report.max_score.to_int()
 
@@ -95,6 +115,31 @@ def submission_template_context(request, submission):
             'valid_kinds_for_submission': valid_kinds_for_submission}
 
 
+def submission_template_contexts(request, submissions):
+    """Returns the list of contexts of
+       :func:`submission_template_context` for ``submissions``.
+
+       The score reports of all the submissions are fetched together, so
+       only a constant number of queries is made apart from the permission
+       checks of the controllers.
+    """
+    submissions = list(submissions)
+    can_see_scores = [s.problem_instance.controller
+                      .can_see_submission_score(request, s)
+                      for s in submissions]
+    score_reports = _score_reports([s.id for s, can_see_score
+                                    in zip(submissions, can_see_scores)
+                                    if can_see_score
+                                    and s.status in ('INI_OK', 'OK')])
+    return [_submission_template_context(request, s, can_see_score,
+                                         score_reports.get(s.id))
+            for s, can_see_score in zip(submissions, can_see_scores)]
+
+
+def submission_template_context(request, submission):
+    return submission_template_contexts(request, [submission])[0]
+
+
 class RegistrationController(RegisteredSubclassesBase, ObjectWithMixins):
     def __init__(self, contest):
         self.contest = contest
@@ -331,8 +376,8 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
                     .order_by('-date').select_related()
 
             if submissions.exists():
-                submission_records = [submission_template_context(request, s)
-                        for s in submissions]
+                submission_records = submission_template_contexts(request,
+                        submissions)
                 context = {
                     'submissions': submission_records,
                     'show_scores': True
@@ -353,6 +398,7 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
         """
         return get_user_display_name(user)
 
+    @cached_predicate()
     def get_round_times(self, request, round):
         """Determines the times of the round for the user doing the request.
 
@@ -405,7 +451,7 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
         """
 
         if queryset is None:
-            queryset = Round.objects.filter(contest=self.contest)
+            queryset = contest_rounds(self.contest)
         now = request.timestamp
 
         def sort_key(round):
@@ -433,6 +479,7 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
                     abs(rtimes.get_start() - now))
         return sorted(queryset, key=sort_key)
 
+    @cached_predicate(cross_request=True)
     def can_see_round(self, request_or_context, round):
         """Determines if the current user is allowed to see the given round.
 
@@ -453,6 +500,7 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
          """
         return True
 
+    @cached_predicate(cross_request=True)
     def can_see_problem(self, request_or_context, problem_instance):
         """Determines if the current user is allowed to see the given problem.
 
@@ -469,6 +517,7 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
             return True
         return self.can_see_round(request_or_context, problem_instance.round)
 
+    @cached_predicate(cross_request=True)
     def can_see_statement(self, request_or_context, problem_instance):
         """Determines if the current user is allowed to see the statement for
            the given problem.
@@ -492,6 +541,7 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
     def default_can_see_statement(self, request_or_context, problem_instance):
         return True
 
+    @cached_predicate(cross_request=True)
     def can_submit(self, request, problem_instance, check_round_times=True):
         """Determines if the current user is allowed to submit a solution for
            the given problem.
@@ -628,11 +678,10 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
 
            Saving the ``result`` is a responsibility of the caller.
         """
-        scores = UserResultForProblem.objects \
+        results = UserResultForProblem.objects \
                 .filter(user=result.user) \
-                .filter(problem_instance__round=result.round) \
-                .values_list('score', flat=True)
-        result.score = self._sum_scores(scores)
+                .filter(problem_instance__round=result.round)
+        result.score = sum_scores(results, self._sum_scores)
 
     def update_user_result_for_contest(self, result):
         """Updates a :class:`~oioioi.contests.models.UserResultForContest`.
@@ -643,12 +692,11 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
 
            Saving the ``result`` is a responsibility of the caller.
         """
-        scores = UserResultForRound.objects \
+        results = UserResultForRound.objects \
                 .filter(user=result.user) \
                 .filter(round__contest=result.contest) \
-                .filter(round__is_trial=False) \
-                .values_list('score', flat=True)
-        result.score = self._sum_scores(scores)
+                .filter(round__is_trial=False)
+        result.score = sum_scores(results, self._sum_scores)
 
     def update_user_results(self, user, problem_instance):
         """Updates score for problem instance, round and contest.
@@ -854,6 +902,7 @@ class PastRoundsHiddenContestControllerMixin(object):
        Do not use it with overlapping rounds.
     """
 
+    @cached_predicate()
     def can_see_round(self, request_or_context, round):
         """Decides whether the given round should be shown for the given user.
            The algorithm is as follows:
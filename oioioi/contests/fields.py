@@ -47,3 +47,36 @@ class ScoreField(models.CharField):
             return None
 
         return ScoreValue.deserialize(value)
+
+
+class ScoreKeyField(models.BigIntegerField):
+    """Indexed numeric column kept next to a :class:`ScoreField`, holding
+       :meth:`~oioioi.contests.scores.ScoreValue.to_sort_key` of its score,
+       so that scores can be ordered and aggregated by the database.
+
+       The key is updated whenever the model is saved. Note that
+       ``QuerySet.update`` of the score doesn't update it.
+    """
+
+    description = _("Score sort key")
+
+    def __init__(self, score_field_name='score', *args, **kwargs):
+        self.score_field_name = score_field_name
+        kwargs.setdefault('null', True)
+        kwargs.setdefault('blank', True)
+        kwargs.setdefault('editable', False)
+        kwargs.setdefault('db_index', True)
+        super(ScoreKeyField, self).__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super(ScoreKeyField, self).deconstruct()
+        kwargs['score_field_name'] = self.score_field_name
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        score = getattr(model_instance, self.score_field_name)
+        if isinstance(score, six.string_types):
+            score = ScoreValue.deserialize(score)
+        value = score.to_sort_key() if score is not None else None
+        setattr(model_instance, self.attname, value)
+        return value
@@ -0,0 +1,54 @@
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, make_option
+from django.db import transaction
+
+from oioioi.contests.models import (UserResultForContest, UserResultForProblem,
+                                    UserResultForRound)
+
+
+class Command(BaseCommand):
+    help = "Fill in sort keys of scores of user results saved before " \
+           "the keys were introduced"
+
+    option_list = BaseCommand.option_list + (
+        make_option('-a', '--all',
+                    action='store_true',
+                    dest='all',
+                    help="Recompute keys of all results, not only missing"),
+        make_option('-b', '--batch-size',
+                    action='store',
+                    type='int',
+                    dest='batch_size',
+                    default=1000,
+                    help="Number of results updated in a transaction"),
+    )
+
+    def _backfill(self, model, recompute_all, batch_size):
+        queryset = model.objects.filter(score__isnull=False)
+        if not recompute_all:
+            queryset = queryset.filter(score_key__isnull=True)
+        ids = list(queryset.order_by('id').values_list('id', flat=True))
+        start = time.time()
+        for i in range(0, len(ids), batch_size):
+            batch = model.objects.filter(id__in=ids[i:i + batch_size]) \
+                    .values_list('id', 'score')
+            # Scores are usually repeated, so results with the same key are
+            # updated together.
+            ids_by_key = defaultdict(list)
+            for result_id, score in batch:
+                ids_by_key[score.to_sort_key()].append(result_id)
+            with transaction.atomic():
+                for key, key_ids in ids_by_key.items():
+                    model.objects.filter(id__in=key_ids) \
+                            .update(score_key=key)
+        elapsed = time.time() - start
+        self.stdout.write("%s: %d results updated in %.1fs (%.0f/s)" % (
+            model._meta.object_name, len(ids), elapsed,
+            len(ids) / elapsed if elapsed else 0))
+
+    def handle(self, *args, **options):
+        for model in (UserResultForProblem, UserResultForRound,
+                      UserResultForContest):
+            self._backfill(model, options['all'], options['batch_size'])
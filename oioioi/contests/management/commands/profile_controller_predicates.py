@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError, make_option
+from django.core.urlresolvers import reverse
+from django.test import Client
+
+from oioioi.contests.models import Contest, Submission
+from oioioi.contests.predicates import predicate_cache_stats
+
+
+class Command(BaseCommand):
+    args = "contest_id [username]"
+    help = "Request the problems list and submission pages of the contest " \
+           "and report hit rates of the cache of controller predicates " \
+           "(see oioioi.contests.predicates)"
+
+    option_list = BaseCommand.option_list + (
+        make_option('-n', '--repeat',
+                    action='store',
+                    type='int',
+                    dest='repeat',
+                    default=2,
+                    help="Number of times each page is requested"),
+    )
+
+    def _host(self):
+        for host in settings.ALLOWED_HOSTS:
+            if host != '*':
+                return host.lstrip('.')
+        return 'localhost'
+
+    def _pages(self, contest, user):
+        pages = [reverse('problems_list', kwargs={'contest_id': contest.id}),
+                 reverse('my_submissions', kwargs={'contest_id': contest.id})]
+        submission = Submission.objects.filter(user=user,
+                problem_instance__contest=contest).order_by('-date').first()
+        if submission is not None:
+            pages.append(reverse('submission',
+                    kwargs={'contest_id': contest.id,
+                            'submission_id': submission.id}))
+        return pages
+
+    def _report(self, url, response):
+        self.stdout.write("%s (%d)" % (url, response.status_code))
+        stats = predicate_cache_stats(response.wsgi_request)
+        total_hits = total_calls = 0
+        for name, (hits, shared_hits, misses) in sorted(stats.items()):
+            calls = hits + shared_hits + misses
+            total_hits += hits + shared_hits
+            total_calls += calls
+            self.stdout.write("  %-24s %6d calls %6d hits %6d shared hits"
+                              " %5.1f%%" % (name, calls, hits, shared_hits,
+                                            100.0 * (hits + shared_hits)
+                                            / calls))
+        if total_calls:
+            self.stdout.write("  %-24s %6d calls %5.1f%% hit rate" % ("total",
+                    total_calls, 100.0 * total_hits / total_calls))
+
+    def handle(self, *args, **options):
+        if not 1 <= len(args) <= 2:
+            raise CommandError("Expected a contest id and an optional "
+                               "username")
+        try:
+            contest = Contest.objects.get(id=args[0])
+        except Contest.DoesNotExist:
+            raise CommandError("Contest %s does not exist" % (args[0],))
+
+        client = Client(HTTP_HOST=self._host())
+        if len(args) == 2:
+            try:
+                user = User.objects.get(username=args[1])
+            except User.DoesNotExist:
+                raise CommandError("User %s does not exist" % (args[1],))
+            client.force_login(user)
+            pages = self._pages(contest, user)
+        else:
+            pages = [reverse('problems_list',
+                             kwargs={'contest_id': contest.id})]
+
+        for url in pages:
+            for _i in range(options['repeat']):
+                self._report(url, client.get(url))
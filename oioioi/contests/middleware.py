@@ -2,10 +2,10 @@ from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import NoReverseMatch, resolve, reverse
 from django.http import Http404, HttpResponseRedirect
-from django.shortcuts import get_object_or_404
 
 from oioioi.contests.current_contest import ContestMode, contest_re, set_cc_id
-from oioioi.contests.models import Contest, ContestView
+from oioioi.contests.models import ContestView
+from oioioi.contests.structure import get_contest
 from oioioi.contests.utils import visible_contests
 
 
@@ -78,10 +78,7 @@ class CurrentContestMiddleware(object):
        unless one is a superuser.
     """
     def _get_contest(self, contest_id):
-        try:
-            return Contest.objects.get(id=contest_id)
-        except Contest.DoesNotExist:
-            return None
+        return get_contest(contest_id)
 
     def process_request(self, request):
         contest = None
@@ -89,7 +86,9 @@ class CurrentContestMiddleware(object):
 
         if m is not None:
             contest_id = m.group(1)
-            contest = get_object_or_404(Contest, id=contest_id)
+            contest = get_contest(contest_id)
+            if contest is None:
+                raise Http404
 
         activate_contest(request, contest)
 
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contests', '0010_auto_20181205_1802'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='submissionreport',
+            index_together=set([('submission', 'creation_date'), ('creation_date', 'id')]),
+        ),
+    ]
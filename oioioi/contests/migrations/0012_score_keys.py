@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations
+import oioioi.contests.fields
+
+
+class Migration(migrations.Migration):
+
+    # The keys of existing results are filled in by the backfill_score_keys
+    # management command, as results tables may be large.
+
+    dependencies = [
+        ('contests', '0011_submissionreport_creation_date_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userresultforcontest',
+            name='score_key',
+            field=oioioi.contests.fields.ScoreKeyField(blank=True, db_index=True, editable=False, null=True, score_field_name='score'),
+        ),
+        migrations.AddField(
+            model_name='userresultforproblem',
+            name='score_key',
+            field=oioioi.contests.fields.ScoreKeyField(blank=True, db_index=True, editable=False, null=True, score_field_name='score'),
+        ),
+        migrations.AddField(
+            model_name='userresultforround',
+            name='score_key',
+            field=oioioi.contests.fields.ScoreKeyField(blank=True, db_index=True, editable=False, null=True, score_field_name='score'),
+        ),
+    ]
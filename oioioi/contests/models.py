@@ -8,7 +8,7 @@ from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.db import models
 from django.db.models import Max
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.module_loading import import_string
@@ -16,13 +16,15 @@ from django.utils.text import get_valid_filename
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ungettext
 
+from oioioi.base.cached_processors import (invalidate_processors,
+                                           user_actions_key)
 from oioioi.base.fields import DottedNameField, EnumField, EnumRegistry
-from oioioi.base.menu import MenuItem, menu_registry
+from oioioi.base.menu import MenuItem, menu_registry, menus_invalidation_key
 from oioioi.base.utils import strip_num_or_hash
 from oioioi.base.utils.validators import (validate_db_string_id,
                                           validate_whitespaces)
 from oioioi.contests.date_registration import date_registry
-from oioioi.contests.fields import ScoreField
+from oioioi.contests.fields import ScoreField, ScoreKeyField
 from oioioi.contests.problem_instance_controller import \
     ProblemInstanceController
 from oioioi.filetracker.fields import FileField
@@ -400,7 +402,8 @@ class SubmissionReport(models.Model):
     class Meta(object):
         get_latest_by = 'creation_date'
         ordering = ('-creation_date',)
-        index_together = (('submission', 'creation_date'),)
+        index_together = (('submission', 'creation_date'),
+                          ('creation_date', 'id'))
 
 
 class ScoreReport(models.Model):
@@ -436,6 +439,7 @@ class UserResultForProblem(models.Model):
     user = models.ForeignKey(User)
     problem_instance = models.ForeignKey(ProblemInstance)
     score = ScoreField(blank=True, null=True)
+    score_key = ScoreKeyField('score')
     status = EnumField(submission_statuses, blank=True, null=True)
     submission_report = models.ForeignKey(SubmissionReport, blank=True,
             null=True)
@@ -452,6 +456,7 @@ class UserResultForRound(models.Model):
     user = models.ForeignKey(User)
     round = models.ForeignKey(Round)
     score = ScoreField(blank=True, null=True)
+    score_key = ScoreKeyField('score')
 
     class Meta(object):
         unique_together = ('user', 'round')
@@ -466,6 +471,7 @@ class UserResultForContest(models.Model):
     user = models.ForeignKey(User)
     contest = models.ForeignKey(Contest)
     score = ScoreField(blank=True, null=True)
+    score_key = ScoreKeyField('score')
 
     class Meta(object):
         unique_together = ('user', 'contest')
@@ -551,3 +557,15 @@ def contest_links_generator(request):
         )
         yield item
 menu_registry.register_generator('contest_links', contest_links_generator)
+
+
+@receiver(post_save, sender=ContestLink)
+@receiver(post_delete, sender=ContestLink)
+def _invalidate_contest_menus(sender, instance, **kwargs):
+    invalidate_processors(menus_invalidation_key(instance.contest_id))
+
+
+@receiver(post_save, sender=ContestPermission)
+@receiver(post_delete, sender=ContestPermission)
+def _invalidate_user_processors(sender, instance, **kwargs):
+    invalidate_processors(user_actions_key(instance.user_id))
@@ -0,0 +1,179 @@
+"""Memoization of permission predicates of contest controllers.
+
+   Predicates like ``can_see_problem`` or ``can_submit`` of
+   :class:`~oioioi.contests.controllers.ContestController` are called many
+   times during a single request, often with the same arguments (e.g. for
+   every problem instance by
+   :func:`~oioioi.contests.utils.submittable_problem_instances`, and then
+   again by the views). Controller methods decorated with
+   :func:`cached_predicate` remember their results for the duration of the
+   request.
+
+   Results of predicates decorated with ``cross_request=True``, computed
+   for anonymous users and users who are neither admins nor observers of
+   the contest, are also kept in the cache for
+   ``settings.CONTROLLER_PREDICATES_CACHE_TIMEOUT`` seconds, if it's
+   positive. Such a result is reused only between the same two dates of
+   rounds of the contest (so not after a round starts, ends or has its
+   results published), and all results for a contest are dropped along
+   with the cached structure of the contest (see
+   :mod:`oioioi.contests.structure`), e.g. when its rounds, problem
+   instances or round time extensions change. Results for a user are also
+   dropped along with other cached values depending on the user's actions
+   (see :func:`~oioioi.base.cached_processors.user_actions_key`), e.g. when
+   their participation changes. Other changes may take up to the timeout
+   to be noticed.
+"""
+import functools
+import hashlib
+from collections import Counter
+from datetime import timedelta  # pylint: disable=E0611
+
+import six
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Model
+from django.http import HttpRequest
+
+from oioioi.base.cached_processors import (invalidation_version,
+                                           user_actions_key)
+from oioioi.base.utils import request_cached
+from oioioi.contests.structure import contest_version
+from oioioi.contests.utils import (is_contest_admin, is_contest_observer,
+                                   rounds_times)
+
+
+@request_cached
+def _round_dates_interval(request):
+    """Returns the pair of the last date of a round of the current contest
+       before the request's timestamp and the first one after it (``None``
+       if there's no such date), or ``None`` if the timestamp is exactly
+       one of the dates.
+    """
+    dates = set()
+    for rtimes in rounds_times(request).values():
+        dates.update([rtimes.get_start(), rtimes.get_end(),
+                      rtimes.show_results, rtimes.show_public_results])
+        if rtimes.show_results is not None:
+            dates.add(rtimes.show_results
+                      + timedelta(minutes=rtimes.extra_time))
+    dates.discard(None)
+    if request.timestamp in dates:
+        return None
+    return (max([d for d in dates if d < request.timestamp] or [None]),
+            min([d for d in dates if d > request.timestamp] or [None]))
+
+
+def _in_interval(timestamp, interval):
+    since, until = interval
+    return (since is None or since < timestamp) and \
+           (until is None or timestamp < until)
+
+
+def _shared_key_part(arg):
+    if isinstance(arg, Model):
+        if arg.pk is None:
+            raise TypeError
+        return '%s:%s' % (arg._meta.label_lower, arg.pk)
+    if arg is None or isinstance(arg, (bool, six.integer_types,
+                                       six.string_types)):
+        return repr(arg)
+    raise TypeError
+
+
+def _shared_key(fn, controller, request, args, kwargs):
+    """Returns the cache key of the result of the predicate shared between
+       requests, or ``None`` if it mustn't be shared.
+    """
+    if settings.CONTROLLER_PREDICATES_CACHE_TIMEOUT <= 0 \
+            or getattr(request, 'contest', None) is None \
+            or request.contest.id != controller.contest.id \
+            or not hasattr(request, 'timestamp') \
+            or not hasattr(request, 'user') \
+            or is_contest_admin(request) or is_contest_observer(request):
+        return None
+    try:
+        parts = [_shared_key_part(arg) for arg in args] + \
+                ['%s=%s' % (name, _shared_key_part(value))
+                 for name, value in sorted(kwargs.items())]
+    except TypeError:
+        return None
+    key = '|'.join([type(controller).__module__, type(controller).__name__,
+                    fn.__module__, fn.__name__,
+                    str(fn.__code__.co_firstlineno),
+                    str(request.user.id),
+                    str(invalidation_version(
+                        user_actions_key(request.user.id)))] + parts)
+    return 'controller_predicate/%s/%s/%s' % (controller.contest.id,
+            contest_version(controller.contest.id),
+            hashlib.md5(key.encode('utf-8')).hexdigest())
+
+
+def _stats(request):
+    if not hasattr(request, '_predicates_stats'):
+        request._predicates_stats = Counter()
+    return request._predicates_stats
+
+
+def predicate_cache_stats(request):
+    """Returns a dictionary mapping names of the cached predicates called
+       during ``request`` into triples ``(hits, shared_hits, misses)``.
+       Shared hits are results found in the cache shared between requests.
+    """
+    stats = _stats(request)
+    return dict((name, (stats[name, 'hit'], stats[name, 'shared_hit'],
+                        stats[name, 'miss']))
+                for name in set(name for name, _kind in stats))
+
+
+def cached_predicate(cross_request=False):
+    """Decorator of methods of contest controllers, which take a request
+       (or a :class:`~oioioi.contests.controllers.ContestControllerContext`,
+       for which results are not cached) and hashable arguments.
+
+       Overrides of decorated methods in subclasses and mixins should be
+       decorated too, so that their results are cached as well.
+
+       :param cross_request: whether results may be shared between requests
+                             of the same user, see
+                             :mod:`oioioi.contests.predicates`
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(self, request, *args, **kwargs):
+            if not isinstance(request, HttpRequest):
+                return fn(self, request, *args, **kwargs)
+            key = (fn, type(self), self.contest.id, args,
+                   tuple(sorted(kwargs.items())))
+            if not hasattr(request, '_predicates_cache'):
+                request._predicates_cache = {}
+            results = request._predicates_cache
+            try:
+                if key in results:
+                    _stats(request)[fn.__name__, 'hit'] += 1
+                    return results[key]
+            except TypeError:
+                # Unhashable arguments
+                return fn(self, request, *args, **kwargs)
+
+            shared_key = cross_request and \
+                    _shared_key(fn, self, request, args, kwargs)
+            interval = shared_key and _round_dates_interval(request)
+            if interval:
+                shared = cache.get(shared_key)
+                if shared is not None and \
+                        _in_interval(request.timestamp, shared[0]):
+                    _stats(request)[fn.__name__, 'shared_hit'] += 1
+                    results[key] = shared[1]
+                    return shared[1]
+
+            _stats(request)[fn.__name__, 'miss'] += 1
+            result = fn(self, request, *args, **kwargs)
+            results[key] = result
+            if interval:
+                cache.set(shared_key, (interval, result),
+                          settings.CONTROLLER_PREDICATES_CACHE_TIMEOUT)
+            return result
+        return wrapper
+    return decorator
+
@@ -0,0 +1,68 @@
+"""Aggregation of scores of user results by the database.
+
+   Results have their scores' sort keys stored next to the scores (see
+   :class:`~oioioi.contests.fields.ScoreKeyField`). When the keys of all
+   the scores being aggregated are known and meaningful for the
+   aggregation, it's done with SQL, without deserializing the scores.
+   Otherwise, the scores are loaded and aggregated in Python.
+
+   Keys of results saved before the keys were introduced are filled in by
+   the ``backfill_score_keys`` management command.
+"""
+import operator
+from collections import Counter, defaultdict
+from functools import reduce
+
+from django.db.models import Case, Count, Q, Sum, Value, When
+
+from oioioi.contests.scores import IntegerScore, ScoreValue
+
+
+def _symbol_q(symbols):
+    return reduce(operator.or_,
+                  [Q(score__startswith=symbol + ':') for symbol in symbols])
+
+
+def sum_scores(queryset, sum_function):
+    """Returns the sum of the scores of results in ``queryset``, or
+       ``None`` if there are no scores.
+
+       Sums of :class:`~oioioi.contests.scores.IntegerScore`\\ s are
+       computed by the database. Other scores are summed by
+       ``sum_function``, called with the list of the scores.
+    """
+    stats = queryset.aggregate(
+            total=Sum('score_key'),
+            scores=Count('score'),
+            keys=Count(Case(When(_symbol_q([IntegerScore.symbol])
+                                 & Q(score_key__isnull=False),
+                                 then=Value(1)))))
+    if stats['scores'] != stats['keys']:
+        return sum_function(list(queryset.values_list('score', flat=True)))
+    if not stats['scores']:
+        return None
+    return IntegerScore(int(stats['total']))
+
+
+def int_score_counts(queryset):
+    """Returns a dictionary mapping ``to_int()`` of the scores of results in
+       ``queryset`` to the numbers of results with them. Results without
+       scores are counted as 0.
+
+       The results are grouped by the database if the keys of all the
+       scores equal ``to_int()`` (see
+       :attr:`~oioioi.contests.scores.ScoreValue.int_sort_key`).
+    """
+    symbols = [symbol for symbol, cls in ScoreValue._subclasses.items()
+               if cls.int_sort_key]
+    keyed = Q(score__isnull=True) | \
+            (_symbol_q(symbols) & Q(score_key__isnull=False))
+    if queryset.exclude(keyed).exists():
+        return Counter(score.to_int() if score is not None else 0
+                       for score in queryset.values_list('score', flat=True))
+
+    counts = defaultdict(int)
+    for key, count in queryset.order_by().values_list('score_key') \
+            .annotate(count=Count('pk')):
+        counts[key or 0] += count
+    return dict(counts)
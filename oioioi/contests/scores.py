@@ -35,6 +35,9 @@ class ScoreValue(ClassInitBase):
     #: representation of the value. This must be overridden in all subclasses.
     symbol = '__override_in_subclasses__'
 
+    #: Whether :meth:`to_sort_key` returns the same value as ``to_int``.
+    int_sort_key = False
+
     _subclasses = dict()
 
     @classmethod
@@ -133,6 +136,16 @@ class ScoreValue(ClassInitBase):
         """
         raise NotImplementedError
 
+    def to_sort_key(self):
+        """Returns an integer stored next to the score in the database (see
+           :class:`~oioioi.contests.fields.ScoreKeyField`), which allows
+           sorting and aggregating scores with SQL.
+
+           Greater scores must have greater or equal keys. Returns ``None``
+           if the class has no such key, which is the default.
+        """
+        return None
+
 
 @total_ordering
 class IntegerScore(ScoreValue):
@@ -144,6 +157,7 @@ class IntegerScore(ScoreValue):
     """
 
     symbol = 'int'
+    int_sort_key = True
 
     def __init__(self, value=0):
         assert isinstance(value, six.integer_types)
@@ -175,5 +189,8 @@ class IntegerScore(ScoreValue):
     def _to_repr(self):
         return '%019d' % self.value
 
+    def to_sort_key(self):
+        return self.value
+
     def to_int(self):
         return self.value
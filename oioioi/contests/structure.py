@@ -0,0 +1,146 @@
+"""Shared cache of the structure of contests.
+
+   Contests, their rounds, problem instances and round time extensions are
+   needed on nearly every contest page, but they rarely change. Functions
+   of this module read them from the cache, where they're kept for
+   ``settings.CONTEST_STRUCTURE_CACHE_TIMEOUT`` seconds, if it's positive.
+   The cache must be shared by all the web servers, as invalidation
+   reaches only the cache of the host where the data are changed.
+
+   The cached data are versioned per contest, and the version is changed
+   whenever any of these objects is saved or deleted (also after the
+   transaction is committed, so that data read by concurrent requests
+   before the commit are not reused). Changes made without sending model
+   signals (e.g. with ``bulk_create`` or
+   :meth:`~django.db.models.query.QuerySet.update`) must be followed by
+   a call to :func:`invalidate_contest_structure`.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from oioioi.base.cached_processors import invalidate_processors
+from oioioi.base.menu import menus_invalidation_key
+from oioioi.contests.models import (Contest, ProblemInstance,
+                                    ProblemStatementConfig, Round,
+                                    RoundTimeExtension)
+from oioioi.problems.models import Problem
+
+
+def _version_key(contest_id):
+    return 'contest_structure_version/%s' % (contest_id,)
+
+
+def contest_version(contest_id):
+    """Returns the current version of the cached data of the contest."""
+    key = _version_key(contest_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_contest_structure(contest_id):
+    """Drops the cached data of the contest with the given id, and the
+       cached menus of the contest, which depend on it.
+    """
+    cache.delete(_version_key(contest_id))
+    transaction.on_commit(lambda: cache.delete(_version_key(contest_id)))
+    invalidate_processors(menus_invalidation_key(contest_id))
+
+
+def _cached(contest_id, name, compute):
+    if settings.CONTEST_STRUCTURE_CACHE_TIMEOUT <= 0:
+        return compute()
+    key = 'contest_structure/%s/%s/%s' % (contest_id,
+                                          contest_version(contest_id), name)
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value, settings.CONTEST_STRUCTURE_CACHE_TIMEOUT)
+    return value
+
+
+def get_contest(contest_id):
+    """Returns the contest with the given id, or ``None`` if there's no
+       such contest.
+    """
+    contest = _cached(contest_id, 'contest',
+            lambda: Contest.objects.filter(id=contest_id).first() or False)
+    return contest or None
+
+
+def contest_rounds(contest):
+    """Returns the list of rounds of the contest, in the default order."""
+    rounds = _cached(contest.id, 'rounds',
+            lambda: list(Round.objects.filter(contest=contest)))
+    for round in rounds:
+        round.contest = contest
+    return rounds
+
+
+def contest_problem_instances(contest):
+    """Returns the list of problem instances of the contest, in the default
+       order, with their problems and rounds.
+    """
+    problem_instances = _cached(contest.id, 'problem_instances',
+            lambda: list(ProblemInstance.objects.filter(contest=contest)
+                         .select_related('problem')))
+    rounds = dict((round.id, round) for round in contest_rounds(contest))
+    for pi in problem_instances:
+        pi.contest = contest
+        if pi.round_id is not None:
+            pi.round = rounds[pi.round_id]
+    return problem_instances
+
+
+def round_time_extensions(contest, user):
+    """Returns a dictionary mapping ids of rounds of the contest into
+       the numbers of minutes by which they're extended for the user.
+    """
+    if user.is_anonymous():
+        return {}
+    return _cached(contest.id, 'round_time_extensions/%s' % (user.id,),
+            lambda: dict(RoundTimeExtension.objects
+                         .filter(user=user, round__contest=contest)
+                         .values_list('round_id', 'extra_time')))
+
+
+def _invalidate_for_contest(sender, instance, **kwargs):
+    invalidate_contest_structure(instance.id)
+
+
+def _invalidate_for_contest_of(sender, instance, **kwargs):
+    if instance.contest_id is not None:
+        invalidate_contest_structure(instance.contest_id)
+
+
+def _invalidate_for_round_of(sender, instance, **kwargs):
+    try:
+        invalidate_contest_structure(instance.round.contest_id)
+    except Round.DoesNotExist:
+        pass
+
+
+def _invalidate_for_problem(sender, instance, **kwargs):
+    for contest_id in set(ProblemInstance.objects
+            .filter(problem=instance, contest__isnull=False)
+            .values_list('contest_id', flat=True)):
+        invalidate_contest_structure(contest_id)
+
+
+# Statement configs are not cached here, but cached controller predicates
+# (see oioioi.contests.predicates), versioned along with the structure,
+# depend on them.
+for _sender, _receiver in [(Contest, _invalidate_for_contest),
+                           (Round, _invalidate_for_contest_of),
+                           (ProblemInstance, _invalidate_for_contest_of),
+                           (ProblemStatementConfig, _invalidate_for_contest_of),
+                           (RoundTimeExtension, _invalidate_for_round_of),
+                           (Problem, _invalidate_for_problem)]:
+    post_save.connect(_receiver, sender=_sender)
+    post_delete.connect(_receiver, sender=_sender)
@@ -9,13 +9,16 @@ from django.conf import settings
 from django.contrib.admin.utils import quote
 from django.contrib.auth.models import AnonymousUser, User
 from django.core import mail
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
+from django.core.management import call_command
 from django.core.urlresolvers import NoReverseMatch, reverse
+from django.db import connection
 from django.http import HttpResponse
 from django.template import RequestContext, Template
 from django.test import RequestFactory
-from django.test.utils import override_settings
+from django.test.utils import CaptureQueriesContext, override_settings
 from django.utils.timezone import LocalTimezone, utc
 import six
 from six.moves import zip
@@ -29,7 +32,12 @@ from oioioi.contests.models import (Contest, ContestAttachment, ContestLink,
                                     ProblemInstance, ProblemStatementConfig,
                                     Round, RoundTimeExtension, Submission,
                                     UserResultForContest, UserResultForProblem)
+from oioioi.contests.controllers import ContestController
+from oioioi.contests.predicates import predicate_cache_stats
+from oioioi.contests.score_keys import int_score_counts, sum_scores
 from oioioi.contests.scores import IntegerScore, ScoreValue
+from oioioi.contests.structure import (contest_problem_instances,
+                                       contest_rounds, round_time_extensions)
 from oioioi.contests.tests import make_empty_contest_formset
 from oioioi.contests.utils import (administered_contests,
                                    all_non_trial_public_results_visible,
@@ -111,6 +119,34 @@ class TestScores(TestCase):
 
         instance = UserResultForContest.objects.get(user=user)
         self.assertIsNone(instance.score)
+        self.assertIsNone(instance.score_key)
+
+    def test_score_keys(self):
+        contest = Contest.objects.get()
+        user = User.objects.get(username='test_admin')
+        instance = UserResultForContest(user=user, contest=contest,
+                score=IntegerScore(42))
+        instance.save()
+        self.assertEqual(UserResultForContest.objects.get(user=user)
+                         .score_key, 42)
+
+        # Keys of results from fixtures are missing until they're backfilled.
+        results = UserResultForProblem.objects.all()
+        self.assertTrue(results.filter(score_key__isnull=True,
+                                       score__isnull=False).exists())
+        python_sum = sum_scores(results, ContestController(contest)
+                                ._sum_scores)
+        python_counts = int_score_counts(results)
+
+        call_command('backfill_score_keys', stdout=six.StringIO())
+        self.assertFalse(results.filter(score_key__isnull=True,
+                                        score__isnull=False).exists())
+        for result in results:
+            self.assertEqual(result.score_key, result.score.to_sort_key())
+        with self.assertNumQueries(1):
+            self.assertEqual(sum_scores(results, None), python_sum)
+        with self.assertNumQueries(2):
+            self.assertEqual(int_score_counts(results), python_counts)
 
     def test_db_order(self):
         # Importing module-wide seems to break sinolpack tests.
@@ -575,6 +611,50 @@ class TestMySubmissions(TestCase):
         self.assertEqual(len(ini_ok), 1)
         self.assertEqual(len(ini_err), 1)
 
+    @override_settings(SUBMISSIONS_ON_PAGE=2)
+    def test_keyset_pagination(self):
+        contest = Contest.objects.get()
+        pi = ProblemInstance.objects.get()
+        user = User.objects.get(username='test_user')
+        date = datetime(2012, 6, 4, tzinfo=utc)
+        for _ in range(3):
+            Submission.objects.create(problem_instance=pi, user=user,
+                                      date=date, kind='NORMAL')
+        expected = list(Submission.objects.filter(user=user)
+                        .order_by('-date', '-id').values_list('id', flat=True))
+        self.assertEqual(len(expected), 5)
+
+        self.client.login(username='test_user')
+        url = reverse('my_submissions', kwargs={'contest_id': contest.id})
+
+        def get_page(params):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            return ([s['submission'].id
+                     for s in response.context['submissions']],
+                    response.context['newer_cursor'],
+                    response.context['older_cursor'])
+
+        pages = []
+        page, newer, older = get_page({})
+        self.assertIsNone(newer)
+        pages.append(page)
+        while older:
+            page, newer, older = get_page({'after': older})
+            self.assertIsNotNone(newer)
+            pages.append(page)
+        self.assertEqual([len(p) for p in pages], [2, 2, 1])
+        self.assertEqual(sum(pages, []), expected)
+
+        page, newer, older = get_page({'before': newer})
+        self.assertEqual(page, pages[1])
+        page, newer, older = get_page({'before': newer})
+        self.assertEqual(page, pages[0])
+        self.assertIsNone(newer)
+
+        response = self.client.get(url, {'after': 'invalid'})
+        self.assertEqual(response.status_code, 400)
+
 
 class TestManyRounds(TestsUtilsMixin, TestCase):
     fixtures = ['test_users', 'test_contest', 'test_full_package',
@@ -1305,6 +1385,115 @@ class TestRoundExtension(TestCase, SubmitFileMixin):
         self.assertEqual(rext.extra_time, 27182818)
 
 
+class TestCachedPredicates(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+                'test_problem_instance']
+
+    def _request(self, user, timestamp):
+        request = RequestFactory().request()
+        request.contest = Contest.objects.get()
+        request.user = user
+        request.timestamp = timestamp
+        return request
+
+    def test_request_cache(self):
+        request = self._request(User.objects.get(username='test_user'),
+                                datetime(2012, 8, 5, tzinfo=utc))
+        controller = request.contest.controller
+        pi = ProblemInstance.objects.get()
+        self.assertTrue(controller.can_see_problem(request, pi))
+        self.assertTrue(controller.can_see_problem(request, pi))
+        self.assertTrue(controller.can_see_round(request, pi.round))
+        stats = predicate_cache_stats(request)
+        self.assertEqual(stats['can_see_problem'], (1, 0, 1))
+        self.assertEqual(stats['can_see_round'], (1, 0, 1))
+
+    @override_settings(CONTROLLER_PREDICATES_CACHE_TIMEOUT=60)
+    def test_shared_cache(self):
+        contest = Contest.objects.get()
+        round = Round.objects.get()
+
+        def can_see_round(user, timestamp):
+            request = self._request(user, timestamp)
+            result = contest.controller.can_see_round(request, round)
+            return result, predicate_cache_stats(request)['can_see_round']
+
+        anonymous = AnonymousUser()
+        after_start = datetime(2012, 8, 5, tzinfo=utc)
+        self.assertEqual(can_see_round(anonymous, after_start),
+                         (True, (0, 0, 1)))
+        self.assertEqual(can_see_round(anonymous, after_start),
+                         (True, (0, 1, 0)))
+        self.assertEqual(can_see_round(anonymous,
+                                       datetime(2015, 1, 1, tzinfo=utc)),
+                         (True, (0, 1, 0)))
+
+        # The round starts in between
+        before_start = datetime(2011, 7, 1, tzinfo=utc)
+        self.assertEqual(can_see_round(anonymous, before_start),
+                         (False, (0, 0, 1)))
+
+        round.start_date = datetime(2013, 1, 1, tzinfo=utc)
+        round.save()
+        self.assertEqual(can_see_round(anonymous, after_start),
+                         (False, (0, 0, 1)))
+
+        admin = User.objects.get(username='test_admin')
+        self.assertEqual(can_see_round(admin, after_start),
+                         (True, (0, 0, 1)))
+        self.assertEqual(can_see_round(admin, after_start),
+                         (True, (0, 0, 1)))
+
+
+@override_settings(CONTEST_STRUCTURE_CACHE_TIMEOUT=3600)
+class TestContestStructureCache(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+                'test_problem_instance', 'test_submission']
+
+    def test_invalidation(self):
+        contest = Contest.objects.get()
+        user = User.objects.get(username='test_user')
+        round = Round.objects.get()
+        problem = Problem.objects.get()
+
+        def structure():
+            return ([r.name for r in contest_rounds(contest)],
+                    [pi.problem.name for pi
+                     in contest_problem_instances(contest)],
+                    round_time_extensions(contest, user))
+
+        self.assertEqual(structure(),
+                         ([round.name], [problem.name], {}))
+        with self.assertNumQueries(0):
+            structure()
+            pi = contest_problem_instances(contest)[0]
+            self.assertEqual(pi.round.id, round.id)
+            self.assertEqual(pi.contest, contest)
+
+        round.name = 'Changed round'
+        round.save()
+        problem.name = 'Changed problem'
+        problem.save()
+        RoundTimeExtension.objects.create(user=user, round=round,
+                                          extra_time=10)
+        self.assertEqual(structure(), (['Changed round'],
+                                       ['Changed problem'],
+                                       {round.id: 10}))
+
+    def test_queries(self):
+        contest = Contest.objects.get()
+        self.client.login(username='test_user')
+        for name in ['problems_list', 'my_submissions', 'contest_files']:
+            url = reverse(name, kwargs={'contest_id': contest.id})
+            cache.clear()
+            with CaptureQueriesContext(connection) as cold:
+                self.client.get(url)
+            with CaptureQueriesContext(connection) as warm:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLess(len(warm), len(cold))
+
+
 class TestPermissions(TestCase):
     fixtures = ['test_users', 'test_contest', 'test_full_package',
             'test_problem_instance', 'test_submission', 'test_permissions']
@@ -8,8 +8,9 @@ from django.shortcuts import get_object_or_404
 
 from oioioi.base.permissions import make_request_condition
 from oioioi.base.utils import request_cached
-from oioioi.contests.models import (Contest, ProblemInstance, Round,
-                                    RoundTimeExtension, Submission)
+from oioioi.contests.models import Contest, Submission
+from oioioi.contests.structure import (contest_problem_instances,
+                                       contest_rounds, round_time_extensions)
 
 
 class RoundTimes(object):
@@ -90,19 +91,15 @@ def generic_rounds_times(request=None, contest=None):
         return {}
     contest = contest or request.contest
 
-    rounds = [r for r in Round.objects.filter(contest=contest)
-              .select_related('contest')]
-    rids = [r.id for r in rounds]
-    if not request or not hasattr(request, 'user') or \
-            request.user.is_anonymous():
+    rounds = contest_rounds(contest)
+    if not request or not hasattr(request, 'user'):
         rtexts = {}
     else:
-        rtexts = dict((x['round_id'], x) for x in RoundTimeExtension.objects
-                      .filter(user=request.user, round__id__in=rids).values())
+        rtexts = round_time_extensions(contest, request.user)
 
     return dict((r, RoundTimes(r.start_date, r.end_date, r.contest,
-        r.results_date, r.public_results_date,
-        rtexts[r.id]['extra_time'] if r.id in rtexts else 0)) for r in rounds)
+        r.results_date, r.public_results_date, rtexts.get(r.id, 0)))
+        for r in rounds)
 
 
 @request_cached
@@ -117,23 +114,25 @@ def contest_exists(request):
 
 @make_request_condition
 def has_any_rounds(request_or_context):
-    return Round.objects.filter(contest=request_or_context.contest).exists()
+    return bool(contest_rounds(request_or_context.contest))
 
 
 @make_request_condition
 @request_cached
 def has_any_active_round(request):
     controller = request.contest.controller
-    for round in Round.objects.filter(contest=request.contest):
+    for round in contest_rounds(request.contest):
         rtimes = controller.get_round_times(request, round)
         if rtimes.is_active(request.timestamp):
             return True
     return False
 
 
-def _public_results_visible(request, **kwargs):
+def _public_results_visible(request, trial_rounds=True):
     controller = request.contest.controller
-    for round in Round.objects.filter(contest=request.contest, **kwargs):
+    for round in contest_rounds(request.contest):
+        if round.is_trial and not trial_rounds:
+            continue
         rtimes = controller.get_round_times(request, round)
         if not rtimes.public_results_visible(request.timestamp):
             return False
@@ -155,7 +154,7 @@ def all_non_trial_public_results_visible(request):
     """Checks if results of all non-trial rounds of the current contest are
        visible to public.
     """
-    return _public_results_visible(request, is_trial=False)
+    return _public_results_visible(request, trial_rounds=False)
 
 
 @make_request_condition
@@ -173,24 +172,22 @@ def has_any_visible_problem_instance(request):
 @request_cached
 def submittable_problem_instances(request):
     controller = request.contest.controller
-    queryset = ProblemInstance.objects.filter(contest=request.contest) \
-            .select_related('problem').prefetch_related('round')
-    return [pi for pi in queryset if controller.can_submit(request, pi)]
+    return [pi for pi in contest_problem_instances(request.contest)
+            if controller.can_submit(request, pi)]
 
 
 @request_cached
 def visible_problem_instances(request):
     controller = request.contest.controller
-    queryset = ProblemInstance.objects.filter(contest=request.contest) \
-            .select_related('problem').prefetch_related('round')
-    return [pi for pi in queryset if controller.can_see_problem(request, pi)]
+    return [pi for pi in contest_problem_instances(request.contest)
+            if controller.can_see_problem(request, pi)]
 
 
 @request_cached
 def visible_rounds(request):
     controller = request.contest.controller
-    queryset = Round.objects.filter(contest=request.contest)
-    return [r for r in queryset if controller.can_see_round(request, r)]
+    return [r for r in contest_rounds(request.contest)
+            if controller.can_see_round(request, r)]
 
 
 def aggregate_statuses(statuses):
@@ -334,7 +331,7 @@ def best_round_to_display(request, allow_past_rounds=False):
     if timestamp and contest:
         rtimes = dict(
                 (round, contest.controller.get_round_times(request, round))
-                for round in Round.objects.filter(contest=contest))
+                for round in contest_rounds(contest))
         next_rtimes = [(r, rt) for r, rt in six.iteritems(rtimes)
                 if rt.is_future(timestamp)]
         next_rtimes.sort(key=lambda r_rt: r_rt[1].get_start())
@@ -1,3 +1,5 @@
+import datetime
+import uuid
 from operator import itemgetter  # pylint: disable=E0611
 
 from django.conf import settings
@@ -10,6 +12,7 @@ from django.http import HttpResponse, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, redirect
 from django.template.response import TemplateResponse
 from django.utils.safestring import mark_safe
+from django.utils.timezone import utc
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import ungettext_lazy
 from django.views.decorators.http import require_POST
@@ -19,7 +22,7 @@ from oioioi.base.menu import menu_registry
 from oioioi.base.permissions import enforce_condition, not_anonymous
 from oioioi.base.utils.redirect import safe_redirect
 from oioioi.base.utils.user_selection import get_user_hints_view
-from oioioi.contests.controllers import submission_template_context
+from oioioi.contests.controllers import submission_template_contexts
 from oioioi.contests.forms import GetUserInfoForm, SubmissionForm
 from oioioi.contests.models import (Contest, ContestAttachment,
                                     ProblemInstance, Submission, ScoreReport,
@@ -32,13 +35,17 @@ from oioioi.contests.utils import (can_admin_contest, can_enter_contest,
                                    is_contest_admin, is_contest_observer,
                                    visible_contests, visible_problem_instances,
                                    visible_rounds)
+from oioioi.evalmgr.tasks import batched_evaluation
 from oioioi.filetracker.utils import stream_file
 from oioioi.problems.models import ProblemAttachment, ProblemStatement
 from oioioi.problems.utils import (can_admin_problem_instance,
                                    get_new_problem_instance, query_statement,
                                    query_zip, update_tests_from_main_pi)
+from oioioi.programs import test_result_cache
 from oioioi.status.registry import status_registry
 
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=utc)
+
 
 @register_main_page_view(order=900)
 def main_page_view(request):
@@ -200,7 +207,6 @@ def submit_view(request, problem_instance_id=None):
 def my_submissions_view(request):
     queryset = Submission.objects \
             .filter(problem_instance__contest=request.contest) \
-            .order_by('-date') \
             .select_related('user', 'problem_instance',
                             'problem_instance__contest',
                             'problem_instance__round',
@@ -208,13 +214,74 @@ def my_submissions_view(request):
     controller = request.contest.controller
     queryset = controller.filter_my_visible_submissions(request, queryset)
     header = controller.render_my_submissions_header(request, queryset.all())
-    submissions = [submission_template_context(request, s) for s in queryset]
+    page, newer_cursor, older_cursor = _submissions_page(request, queryset,
+            getattr(settings, 'SUBMISSIONS_ON_PAGE', 100))
+    submissions = submission_template_contexts(request, page)
     show_scores = any(s['can_see_score'] for s in submissions)
 
     return TemplateResponse(request, 'contests/my_submissions.html',
         {'header': header,
          'submissions': submissions, 'show_scores': show_scores,
-         'submissions_on_page': getattr(settings, 'SUBMISSIONS_ON_PAGE', 100)})
+         'newer_cursor': newer_cursor, 'older_cursor': older_cursor})
+
+
+def _make_submission_cursor(submission):
+    delta = submission.date - _EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 10 ** 6 \
+        + delta.microseconds
+    return '%d_%d' % (microseconds, submission.id)
+
+
+def _parse_submission_cursor(cursor):
+    """Returns the pair ``(date, id)`` of the submission encoded in the
+       cursor by :func:`_make_submission_cursor`.
+    """
+    try:
+        microseconds, submission_id = cursor.split('_')
+        return (_EPOCH + datetime.timedelta(microseconds=int(microseconds)),
+                int(submission_id))
+    except (ValueError, OverflowError):
+        raise SuspiciousOperation
+
+
+def _submissions_page(request, queryset, page_size):
+    """Returns a page of submissions from ``queryset``, from the newest,
+       and the cursors of the newer and the older pages (or ``None`` if
+       there are no such pages).
+
+       The page is selected by the ``after`` (older than the cursor) or
+       ``before`` (newer than the cursor) GET parameter, using the
+       ``(date, id)`` ordering, so the database doesn't have to count or
+       skip the preceding submissions.
+    """
+    if 'before' in request.GET:
+        date, submission_id = \
+                _parse_submission_cursor(request.GET['before'])
+        newer = list(queryset
+                .filter(Q(date__gt=date) | Q(date=date, id__gt=submission_id))
+                .order_by('date', 'id')[:page_size + 1])
+        if len(newer) > page_size:
+            page = newer[page_size - 1::-1]
+            return (page, _make_submission_cursor(page[0]),
+                    _make_submission_cursor(page[-1]))
+        # Close to the newest submissions, the first page is shown in full.
+        has_newer = False
+    elif 'after' in request.GET:
+        date, submission_id = _parse_submission_cursor(request.GET['after'])
+        queryset = queryset.filter(Q(date__lt=date) |
+                                   Q(date=date, id__lt=submission_id))
+        has_newer = True
+    else:
+        has_newer = False
+
+    page = list(queryset.order_by('-date', '-id')[:page_size + 1])
+    has_older = len(page) > page_size
+    page = page[:page_size]
+    if not page:
+        return page, None, None
+    return (page,
+            _make_submission_cursor(page[0]) if has_newer else None,
+            _make_submission_cursor(page[-1]) if has_older else None)
 
 
 @enforce_condition(~contest_exists | can_enter_contest)
@@ -411,13 +478,19 @@ def rejudge_all_submissions_for_problem_view(request, problem_instance_id):
                                          id=problem_instance_id)
     count = problem_instance.submission_set.count()
     if request.POST:
-        for submission in problem_instance.submission_set.all():
-            problem_instance.controller.judge(submission, request.GET.dict(),
-                                              is_rejudge=True)
+        extra_args = request.GET.dict()
+        extra_args['rejudge_id'] = uuid.uuid4().hex
+        with batched_evaluation():
+            for submission in problem_instance.submission_set.all():
+                problem_instance.controller.judge(submission,
+                        extra_args.copy(), is_rejudge=True)
         messages.info(request,
                       ungettext_lazy("%(count)d rejudge request received.",
                       "%(count)d rejudge requests reveived.",
                       count) % {'count': count})
+        if test_result_cache.is_enabled():
+            messages.info(request,
+                          _("Rejudge id: %s") % extra_args['rejudge_id'])
         problem_instance.needs_rejudge = False
         problem_instance.save()
         return safe_redirect(request, reverse(
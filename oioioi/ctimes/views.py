@@ -4,7 +4,7 @@ from datetime import timedelta  # pylint: disable=E0611
 from django.utils import timezone
 
 from oioioi.base.utils import allow_cross_origin, jsonify
-from oioioi.contests.models import Round
+from oioioi.contests.structure import contest_rounds
 
 
 @allow_cross_origin
@@ -24,7 +24,7 @@ def ctimes_view(request):
 
     ccontroller = contest.controller
     rounds = [(ccontroller.get_round_times(request, round), round)
-              for round in Round.objects.filter(contest=request.contest)]
+              for round in contest_rounds(request.contest)]
     rounds = [(rtime, round) for (rtime, round) in rounds
               if end_le(now - timedelta(minutes=30), rtime.get_end())]
 
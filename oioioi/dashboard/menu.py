@@ -5,4 +5,4 @@ from oioioi.base.permissions import not_anonymous
 from oioioi.contests.utils import contest_exists
 
 top_links_registry = MenuRegistry(_("Top Links Menu"),
-    contest_exists & not_anonymous)
+    contest_exists & not_anonymous, name='top_links')
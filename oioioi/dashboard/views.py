@@ -10,7 +10,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from oioioi.base.menu import menu_registry
 from oioioi.base.permissions import enforce_condition
-from oioioi.contests.controllers import submission_template_context
+from oioioi.contests.controllers import submission_template_contexts
 from oioioi.contests.models import Submission
 from oioioi.contests.utils import (can_enter_contest, contest_exists,
                                    has_any_submittable_problem,
@@ -107,8 +107,7 @@ def submissions_fragment(request):
             submissions[:getattr(settings, 'NUM_DASHBOARD_SUBMISSIONS', 8)]
     if not submissions:
         return None
-    submissions = [submission_template_context(request, s)
-                   for s in submissions]
+    submissions = submission_template_contexts(request, submissions)
     show_scores = any(s['can_see_score'] for s in submissions)
     context = {
         'submissions': submissions,
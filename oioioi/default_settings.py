@@ -159,6 +159,7 @@ MIDDLEWARE_CLASSES = (
     'oioioi.base.middleware.AnnotateUserBackendMiddleware',
     'oioioi.su.middleware.SuAuthenticationMiddleware',
     'oioioi.su.middleware.SuFirstTimeRedirectionMiddleware',
+    'oioioi.base.middleware.InvalidateUserProcessorsMiddleware',
     'oioioi.base.middleware.UserInfoInErrorMessage',
     'django.contrib.messages.middleware.MessageMiddleware',
     'dj_pagination.middleware.PaginationMiddleware',
@@ -174,6 +175,22 @@ DEBUG_TOOLBAR_CONFIG = {
     'INTERCEPT_REDIRECTS': False,
 }
 
+DEBUG_TOOLBAR_PANELS = [
+    'debug_toolbar.panels.versions.VersionsPanel',
+    'debug_toolbar.panels.timer.TimerPanel',
+    'debug_toolbar.panels.settings.SettingsPanel',
+    'debug_toolbar.panels.headers.HeadersPanel',
+    'debug_toolbar.panels.request.RequestPanel',
+    'debug_toolbar.panels.sql.SQLPanel',
+    'debug_toolbar.panels.staticfiles.StaticFilesPanel',
+    'debug_toolbar.panels.templates.TemplatesPanel',
+    'oioioi.base.panels.ContextProcessorsPanel',
+    'debug_toolbar.panels.cache.CachePanel',
+    'debug_toolbar.panels.signals.SignalsPanel',
+    'debug_toolbar.panels.logging.LoggingPanel',
+    'debug_toolbar.panels.redirects.RedirectsPanel',
+]
+
 COMMON_MEDIA_PREFIX = 'common/'
 
 ROOT_URLCONF = 'oioioi.urls'
@@ -253,6 +270,11 @@ AUTHENTICATION_BACKENDS = (
 ACCOUNT_ACTIVATION_DAYS = 7
 
 SIOWORKERS_BACKEND = 'oioioi.sioworkers.backends.SioworkersdBackend'
+# Number of processes in which LocalBackend runs independent jobs (e.g.
+# tests of a submission) in parallel. With 1, they are run one by one in
+# the calling process. Daemonic processes (e.g. of a multiprocessing pool)
+# can't start the pool and run the jobs one by one, too.
+SIOWORKERS_LOCAL_PROCESSES = 1
 FILETRACKER_CLIENT_FACTORY = 'oioioi.filetracker.client.remote_storage_factory'
 DEFAULT_FILE_STORAGE = 'oioioi.filetracker.storage.FiletrackerStorage'
 
@@ -269,6 +291,31 @@ PARTICIPANTS_ON_PAGE = 100
 TESTS_ON_PAGE = 100
 PRIZES_ON_PAGE = 100
 
+# For how long (in seconds) contests, their rounds, problem instances and
+# round time extensions are kept in the cache (see
+# oioioi.contests.structure). They're dropped from the cache when they
+# change, but only from the cache of the host where the change is made, so
+# enable this only with a cache shared by all the web servers (e.g.
+# memcached), not with the default per-host FileBasedCache. 0 disables it.
+CONTEST_STRUCTURE_CACHE_TIMEOUT = 0
+
+# For how long (in seconds) results of permission checks of contest
+# controllers, like visibility of problems, are shared between requests of
+# the same user (see oioioi.contests.predicates). 0 disables sharing, but
+# the results are still remembered for the duration of a request.
+CONTROLLER_PREDICATES_CACHE_TIMEOUT = 0
+
+# For how long (in seconds) values of cached context processors, like
+# counts in the badges of the navbar, are kept in the cache (see
+# oioioi.base.cached_processors), unless the processors set their own
+# timeouts. Most of them are also dropped from the cache when they change.
+CACHED_PROCESSORS_TIMEOUT = 300
+
+# For how long (in seconds) lists of items of menus are kept in the cache
+# for a user. Items may depend on time (e.g. on rounds being started), so
+# this bounds the delay of their changes. 0 disables caching of menus.
+MENU_CACHE_TIMEOUT = 60
+
 NUM_DASHBOARD_SUBMISSIONS = 8
 NUM_DASHBOARD_MESSAGES = 8
 
@@ -307,6 +354,23 @@ USE_UNSAFE_CHECKER = True
 # execution (in a sandboxed environment, if USE_UNSAFE_EXEC is set to False).
 USE_SINOLPACK_MAKEFILES = True
 
+# Number of threads saving test files of a sinol package to filetracker.
+SINOLPACK_UPLOAD_THREADS = 8
+
+# When True and makefiles are not used, test files of sinol packages are read
+# straight from the archive instead of being extracted with the rest of it.
+SINOLPACK_STREAMING_EXTRACTION = True
+
+# Number of users whose results are fetched together when generating
+# a PDF or XML report, and of threads reading their source files.
+OIREPORTS_BATCH_SIZE = 200
+OIREPORTS_SOURCE_THREADS = 8
+
+# Number of threads downloading sources of exported submissions, and the
+# maximum number of sources downloaded ahead of the archive being written.
+EXPORTSZU_FETCH_THREADS = 8
+EXPORTSZU_FETCH_WINDOW = 32
+
 # Scorers below are used for judging submissions without contests,
 # eg. submitting to problems from problemset.
 DEFAULT_TEST_SCORER = \
@@ -326,6 +390,20 @@ FILETRACKER_LISTEN_PORT = 9999
 
 FILETRACKER_URL = 'http://127.0.0.1:9999'
 
+# Directory in which files read from filetracker by the web server are
+# cached (None disables the cache), and the maximum total size of the
+# cached files in bytes. The directory may be shared by all processes on
+# a machine.
+FILETRACKER_LOCAL_CACHE_ROOT = None
+FILETRACKER_LOCAL_CACHE_SIZE = 1024 * 1024 * 1024
+
+# Header with which the front web server is asked to send files from the
+# local cache ('X-Accel-Redirect' for nginx, 'X-Sendfile' for Apache with
+# mod_xsendfile), or None to stream them through Django. With nginx,
+# FILETRACKER_SENDFILE_PREFIX is the internal location of the cache.
+FILETRACKER_SENDFILE_HEADER = None
+FILETRACKER_SENDFILE_PREFIX = '/filetracker-cache/'
+
 RUN_SIOWORKERSD = True
 
 DEFAULT_CONTEST = None
@@ -400,17 +478,60 @@ CELERY_IMPORTS += [
 
 CELERY_ROUTES.update({
     'oioioi.evalmgr.tasks.evalmgr_job': dict(queue='evalmgr'),
+    'oioioi.evalmgr.tasks.evalmgr_batch_job': dict(queue='evalmgr'),
     'oioioi.problems.unpackmgr.unpackmgr_job': dict(queue='unpackmgr'),
 })
 
 # Number of concurrently evaluated submissions
 EVALMGR_CONCURRENCY = 1
 
+# Maximum number of submissions evaluated together by a single evalmgr task
+# during rejudges. Setting it to 1 disables batching.
+EVALMGR_BATCH_SIZE = 20
+
+# Maximum time (in seconds) a rejudged submission may wait for its batch
+# to fill up before it's queued.
+EVALMGR_BATCH_MAX_LATENCY = 5
+
+# Executables of identical sources are compiled once and kept in
+# filetracker, up to COMPILATION_CACHE_MAX_SIZE bytes. Executables used
+# within the last COMPILATION_CACHE_MIN_AGE seconds are never removed.
+# A compilation not finished within COMPILATION_CACHE_PENDING_TIMEOUT seconds
+# may be repeated by another job, and the jobs waiting for it compile their
+# sources themselves. Run the release_stale_compilations management command
+# periodically, so that they're resumed even if no other job does it.
+COMPILATION_CACHE_ENABLED = True
+COMPILATION_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+COMPILATION_CACHE_MIN_AGE = 3600
+COMPILATION_CACHE_PENDING_TIMEOUT = 600
+
+# Reuse results of tests run earlier on identical executables, with the
+# same test files, limits and checker. Most useful for rejudges after
+# changing some of the tests. Results are kept for
+# TEST_RESULT_CACHE_MAX_AGE seconds; they're removed whenever new results
+# are stored, and by the evict_test_results management command.
+TEST_RESULT_CACHE_ENABLED = False
+TEST_RESULT_CACHE_MAX_AGE = 30 * 24 * 3600
+
 # Number of concurrently processed problem packages
 UNPACKMGR_CONCURRENCY = 1
 
 SIOWORKERSD_URL = 'http://localhost:7889/'
 
+# Number of keep-alive connections to sioworkersd kept by each process.
+SIOWORKERSD_POOL_SIZE = 8
+
+# Timeout (in seconds) of calls to sioworkersd. Jobs run synchronously
+# (e.g. during package upload) are waited for, so it should be longer than
+# the longest of them.
+SIOWORKERSD_TIMEOUT = 600
+
+# Calls to sioworkersd failing with a connection error are retried this many
+# times, after randomized, exponentially growing delays starting from
+# SIOWORKERSD_RETRY_DELAY seconds.
+SIOWORKERSD_RETRIES = 3
+SIOWORKERSD_RETRY_DELAY = 0.5
+
 # ID of JotForm account for "Send Feedback" link.
 JOTFORM_ID = None
 
@@ -460,9 +581,18 @@ CACHES = {
 
 # Ranking
 RANKINGSD_POLLING_INTERVAL = 0.5  # seconds
+# Number of rankingsd worker processes (can be overridden with --workers).
+RANKINGSD_WORKERS = 1
+# A worker which hasn't renewed its lease for this long is considered dead
+# and its ranking recalculation is taken over by another worker.
+RANKINGSD_LEASE_DURATION = 120  # seconds
+RANKINGSD_HEARTBEAT_INTERVAL = 20  # seconds
 RANKING_COOLDOWN_FACTOR = 2  # seconds
 RANKING_MIN_COOLDOWN = 5  # seconds
 RANKING_MAX_COOLDOWN = 100  # seconds
+# Apply changes of single users' results to the already generated rankings
+# instead of rebuilding them from scratch.
+RANKING_INCREMENTAL_UPDATES = True
 
 # Notifications configuration (client)
 # This one is for JavaScript socket.io client.
@@ -481,14 +611,34 @@ NOTIFICATIONS_RABBITMQ_URL = 'amqp://localhost'
 # Port that the Notifications Server listens on
 NOTIFICATIONS_SERVER_PORT = 7887
 
+# Maximum number of notification messages published to RabbitMQ in a single
+# transaction
+NOTIFICATIONS_PUBLISH_BATCH_SIZE = 500
+
 # Balloons
 BALLOON_ACCESS_COOKIE_EXPIRES_DAYS = 7
 
 # Cache timeout (in seconds) for livedata stream (used in some onsite
-# competitions to show results online). Does not influence the data for
-# admins or observers.
+# competitions to show results online). Shared snapshots of the data are
+# rebuilt when submissions are judged, or when they get older than this.
+# Does not influence the data for admins or observers.
 LIVEDATA_CACHE_TIMEOUT = 30
 
+# Maximum number of livedata events returned for a single request with the
+# ``since`` parameter.
+LIVEDATA_EVENTS_PAGE_SIZE = 1000
+
+# Livedata events of reports created less than this number of seconds ago
+# are held back, as their transactions may still be uncommitted, and they
+# could be missed by clients which have already received later events.
+LIVEDATA_EVENTS_SAFETY_LAG = 10
+
+# How long (in seconds) a server-sent events stream of livedata is kept open
+# and how often it checks for new events. Every open stream occupies a web
+# server worker.
+LIVEDATA_STREAM_TIMEOUT = 60
+LIVEDATA_STREAM_POLL_INTERVAL = 2
+
 # Submissions by (snail) mail
 MAILSUBMIT_CONFIRMATION_HASH_LENGTH = 5
 
@@ -501,6 +651,20 @@ SIOWORKERS_LISTEN_PORT = 7890
 # http://$SIOWORKERS_LISTEN_ADDR:$SIOWORKERS_LISTEN_PORT
 SIOWORKERS_LISTEN_URL = None
 
+# Number of threads of the sioworkers receiver which queue received results
+# in evalmgr (can be overridden with --workers).
+SIOWORKERS_RECEIVER_WORKERS = 4
+
+# Maximum number of received results taken from the queue at once by
+# a receiver thread. Each of them is queued in evalmgr in its own transaction.
+SIOWORKERS_RECEIVER_BATCH_SIZE = 20
+
+# Maximum number of received results waiting to be queued in evalmgr. When
+# it's reached, new results wait up to SIOWORKERS_RECEIVER_QUEUE_TIMEOUT
+# seconds and are then rejected with HTTP 503.
+SIOWORKERS_RECEIVER_QUEUE_SIZE = 200
+SIOWORKERS_RECEIVER_QUEUE_TIMEOUT = 30
+
 # Maintenance mode settings
 CONTEST_PREFIX_RE = '^(/c/[a-z0-9_-]+)?'
 MAINTENANCE_MODE_REDIRECT_URL = '/maintenance/'
@@ -285,13 +285,21 @@ class WithDisqualificationRankingControllerMixin(object):
             return data
         return self._annotate_disqualified(key, data)
 
+    def update_serialized_ranking(self, key, data, user_ids):
+        data = super(WithDisqualificationRankingControllerMixin, self) \
+            .update_serialized_ranking(key, data, user_ids)
+        if data is None or not self._show_disqualified(key):
+            return data
+        return self._annotate_disqualified(key, data)
+
     def _annotate_disqualified(self, key, data):
-        users_ids = [row['user'].id for row in data['rows']]
-        not_disqualified = self.contest.controller \
+        users_ids = [row['user_id'] for row in data['rows']]
+        not_disqualified = set(self.contest.controller
             .exclude_disqualified_users(User.objects.filter(id__in=users_ids))
+            .values_list('id', flat=True))
 
         for row in data['rows']:
-            row['disqualified'] = row['user'] not in not_disqualified
+            row['disqualified'] = row['user_id'] not in not_disqualified
         return data
 
     def _ignore_in_ranking_places(self, data_row):
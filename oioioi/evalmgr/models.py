@@ -21,8 +21,10 @@ class QueuedJob(models.Model):
 
     # Optional information about queued jobs.
     submission = models.ForeignKey(Submission, null=True)
-    celery_task_id = models.CharField(max_length=50, unique=True, null=True,
-                                      blank=True)
+    # Jobs queued in a batch (see
+    # :func:`oioioi.evalmgr.tasks.batched_evaluation`) share the task.
+    celery_task_id = models.CharField(max_length=50, db_index=True,
+                                      null=True, blank=True)
 
     class Meta(object):
         verbose_name = _("Queued job")
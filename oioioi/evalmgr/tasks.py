@@ -1,11 +1,15 @@
 import copy
 import pprint
 import sys
+import threading
+import time
+from contextlib import contextmanager
 from uuid import uuid4
 
 import six
 from celery.exceptions import Ignore
 from celery.task import task
+from django.conf import settings
 from django.db import transaction
 from django.utils.module_loading import import_string
 
@@ -13,9 +17,10 @@ from oioioi.base.utils.db import require_transaction
 from oioioi.base.utils.loaders import load_modules
 from oioioi.evalmgr import logger
 from oioioi.evalmgr.models import QueuedJob, SavedEnviron
-from oioioi.evalmgr.utils import mark_job_state
+from oioioi.evalmgr.utils import mark_job_state, mark_jobs_state
 
 loaded_controllers = False
+_batching = threading.local()
 
 
 def _placeholder(environ, **kwargs):
@@ -80,7 +85,9 @@ def transfer_job(environ, transfer_func, restore_func, transfer_kwargs=None):
        If it doesn't find any, job is considered already resumed and is
        ignored.
 
-       For details see ``evalmgr_job`` and ``delay_environ``.
+       For details see ``evalmgr_job`` and ``delay_environ``. See
+       ``_call_transfer_funcs`` for how ``evalmgr_batch_job`` may transfer
+       many jobs at once.
     """
     if 'transfer' in environ:
         raise RuntimeError(
@@ -212,7 +219,7 @@ def _mark_job_state(environ, state):
         raise Ignore
 
 
-def _run_error_handlers(env, exc_info):
+def _call_error_handlers(env, exc_info):
     logger.debug("Handling exception '%s' in job:\n%s",
             exc_info[0], pprint.pformat(env, indent=4))
     error_handlers = env.get('error_handlers', [])
@@ -223,6 +230,11 @@ def _run_error_handlers(env, exc_info):
     except Exception:
         logger.error("Exception occured in job's error handlers:\n%s",
                 pprint.pformat(env, indent=4), exc_info=True)
+    return env
+
+
+def _run_error_handlers(env, exc_info):
+    env = _call_error_handlers(env, exc_info)
     if not env.get('ignore_errors'):
         logger.error("Exception occured in job:\n%s",
                 pprint.pformat(env, indent=4), exc_info=exc_info)
@@ -230,11 +242,81 @@ def _run_error_handlers(env, exc_info):
     return env
 
 
+class _EnvironBatcher(object):
+    """Groups environs passed to ``delay_environ`` by their
+       ``evalmgr_extra_args`` and sends them to ``evalmgr_batch_job`` in
+       batches.
+
+       A batch is sent when it is full, when its oldest environ has waited
+       longer than ``max_latency`` seconds, or on :meth:`flush`.
+    """
+
+    def __init__(self, size, max_latency):
+        self.size = size
+        self.max_latency = max_latency
+        self.pending = {}
+
+    def add(self, environ, evalmgr_extra_args):
+        key = tuple(sorted(six.iteritems(evalmgr_extra_args)))
+        _added, environs = self.pending.setdefault(key, (time.time(), []))
+        environs.append(environ)
+        if len(environs) >= self.size:
+            self._send(key)
+        deadline = time.time() - self.max_latency
+        for key, (added, _environs) in list(six.iteritems(self.pending)):
+            if added <= deadline:
+                self._send(key)
+
+    def flush(self):
+        for key in list(self.pending):
+            self._send(key)
+
+    def _send(self, key):
+        _added, environs = self.pending.pop(key)
+        # All jobs of the batch are evaluated by the same task.
+        task_id = six.text_type(uuid4())
+        with transaction.atomic():
+            environs = mark_jobs_state(environs, 'QUEUED')
+            QueuedJob.objects.filter(job_id__in=[env['job_id']
+                                                 for env in environs]) \
+                .update(celery_task_id=task_id)
+        if environs:
+            evalmgr_batch_job.apply_async((environs,), task_id=task_id,
+                                          **dict(key))
+
+
+@contextmanager
+def batched_evaluation():
+    """Makes ``delay_environ`` calls in this context queue new jobs in
+       batches of ``settings.EVALMGR_BATCH_SIZE``, each evaluated by a single
+       ``evalmgr_batch_job`` task. This is meant for mass rejudges, where
+       handling every job in a separate task and separate transactions is
+       costly.
+
+       Jobs wait for their batch to fill up for at most
+       ``settings.EVALMGR_BATCH_MAX_LATENCY`` seconds, and the remaining
+       ones are sent when the context is left.
+    """
+    if getattr(_batching, 'batcher', None) is not None or \
+            settings.EVALMGR_BATCH_SIZE <= 1:
+        yield
+        return
+    batcher = _EnvironBatcher(settings.EVALMGR_BATCH_SIZE,
+                              settings.EVALMGR_BATCH_MAX_LATENCY)
+    _batching.batcher = batcher
+    try:
+        yield
+    finally:
+        _batching.batcher = None
+    batcher.flush()
+
+
 @require_transaction
 def delay_environ(environ, **evalmgr_extra_args):
     """Inserts environ into evalmgr queue with marking it as queued, resuming
        it if it should be. Returns associated async result, or None when job
-       was already resumed before (or was cancelled).
+       was already resumed before (or was cancelled), or when it was added
+       to a batch (see ``batched_evaluation``).
 
        Requires to be called from transaction.
     """
@@ -242,6 +324,10 @@ def delay_environ(environ, **evalmgr_extra_args):
         environ = _resume_job(environ)
         if environ is None:
             return None
+    batcher = getattr(_batching, 'batcher', None)
+    if batcher is not None:
+        batcher.add(environ, evalmgr_extra_args)
+        return None
     if not mark_job_state(environ, 'QUEUED'):
         return None
     async_result = evalmgr_job.apply_async((environ,), **evalmgr_extra_args)
@@ -250,6 +336,27 @@ def delay_environ(environ, **evalmgr_extra_args):
     return async_result
 
 
+def _load_controllers():
+    # pylint: disable=global-statement
+    global loaded_controllers
+
+    # load controllers to avoid late mix-ins to them
+    if not loaded_controllers:
+        load_modules('controllers')
+        loaded_controllers = True
+
+
+def _check_environ(env):
+    if 'job_id' not in env:
+        raise RuntimeError('No job_id found in environ')
+    if 'recipe' not in env:
+        raise RuntimeError('No recipe found in job environment. '
+                'Did you forget to set environ["run_externally"]?')
+    if 'error' in env:
+        raise RuntimeError('Error from workers:\n%s\nTB:\n%s' %
+            (env['error']['message'], env['error']['traceback']))
+
+
 @task
 def evalmgr_job(env):
     r"""Takes environment and evaluates it according to its recipe.
@@ -300,25 +407,11 @@ def evalmgr_job(env):
         Returns environment (a processed copy of given environment).
     """
 
-    # pylint: disable=global-statement,broad-except
-    global loaded_controllers
-
-    # load controllers to avoid late mix-ins to them
-    if not loaded_controllers:
-        load_modules('controllers')
-        loaded_controllers = True
-
+    _load_controllers()
     env = copy.deepcopy(env)
 
     try:
-        if 'job_id' not in env:
-            raise RuntimeError('No job_id found in environ')
-        if 'recipe' not in env:
-            raise RuntimeError('No recipe found in job environment. '
-                    'Did you forget to set environ["run_externally"]?')
-        if 'error' in env:
-            raise RuntimeError('Error from workers:\n%s\nTB:\n%s' %
-                (env['error']['message'], env['error']['traceback']))
+        _check_environ(env)
         _mark_job_state(env, 'PROGRESS')
         while True:
             recipe = env.get('recipe')
@@ -342,3 +435,156 @@ def evalmgr_job(env):
     # pylint: disable=broad-except
     except Exception:
         return _run_error_handlers(env, sys.exc_info())
+
+
+def _handle_batched_job_error(env, exc_info):
+    """Runs error handlers of a failed job from a batch. Unlike
+       ``_run_error_handlers``, it doesn't reraise the exception, so that
+       other jobs are not affected. Returns the environ, or ``None`` if the
+       error was not handled.
+    """
+    try:
+        with transaction.atomic():
+            env = _call_error_handlers(env, exc_info)
+    # pylint: disable=broad-except
+    except Exception:
+        logger.error("Exception occured in job's error handlers:\n%s",
+                pprint.pformat(env, indent=4), exc_info=True)
+    else:
+        if env.get('ignore_errors'):
+            return env
+    logger.error("Exception occured in job:\n%s",
+            pprint.pformat(env, indent=4), exc_info=exc_info)
+    return None
+
+
+def _run_batched_job(env):
+    """Runs the recipe of a job from a batch until it ends or the job is
+       transferred. Changes made by a failing job are rolled back.
+
+       Returns a pair ``(env, finished)``, where ``env`` is ``None`` if the
+       job should be ignored from now on.
+    """
+    try:
+        with transaction.atomic():
+            try:
+                while env['recipe'] and 'transfer' not in env:
+                    recipe = env['recipe']
+                    env['recipe'] = recipe[1:]
+                    env = _run_phase(env, recipe[0])
+            except Ignore:
+                return None, False
+        return env, 'transfer' not in env
+    # pylint: disable=broad-except
+    except Exception:
+        return _handle_batched_job_error(env, sys.exc_info()), False
+
+
+def _call_transfer_funcs(transfers):
+    """Calls the transfer functions of ``(env, transfer)`` pairs. Returns
+       a list with the ``exc_info`` of every failed transfer, and ``None``
+       for the successful ones.
+
+       A transfer function with a ``transfer_many`` attribute is called once
+       for all environs it should transfer: ``transfer_many`` gets a list of
+       ``(environ, transfer_kwargs)`` pairs and returns a list with an
+       exception or ``None`` for each of them.
+    """
+    errors = [None] * len(transfers)
+    grouped = {}
+    for i, (env, transfer) in enumerate(transfers):
+        try:
+            transfer_func = import_string(transfer['transfer_func'])
+            transfer_many = getattr(transfer_func, 'transfer_many', None)
+            if transfer_many is None:
+                transfer_func(env, **transfer['transfer_kwargs'])
+            else:
+                grouped.setdefault(transfer_many, []).append(i)
+        # pylint: disable=broad-except
+        except Exception:
+            errors[i] = sys.exc_info()
+
+    for transfer_many, indices in six.iteritems(grouped):
+        try:
+            results = transfer_many([(transfers[i][0],
+                                      transfers[i][1]['transfer_kwargs'])
+                                     for i in indices])
+        # pylint: disable=broad-except
+        except Exception:
+            exc_info = sys.exc_info()
+            results = [exc_info[1]] * len(indices)
+        for i, error in zip(indices, results):
+            if error is not None:
+                errors[i] = (type(error), error,
+                             getattr(error, '__traceback__', None))
+    return errors
+
+
+@task
+def evalmgr_batch_job(environs):
+    """Evaluates a batch of environs, each like ``evalmgr_job`` does, but
+       with the database work of the whole batch done in one transaction and
+       with ``QueuedJob`` updates done in bulk.
+
+       Each job runs in its own savepoint, so that an error in one of them
+       doesn't affect the others -- its changes are rolled back and its
+       error handlers are run. Jobs are transferred to external evaluation
+       systems after the transaction is committed.
+
+       To queue environments in batches, call ``delay_environ`` within
+       ``batched_evaluation``.
+
+       Returns the list of processed environments, without the ones which
+       were ignored or failed.
+    """
+    _load_controllers()
+    environs = copy.deepcopy(environs)
+    results = []
+
+    runnable = []
+    for env in environs:
+        try:
+            _check_environ(env)
+            runnable.append(env)
+        # pylint: disable=broad-except
+        except Exception:
+            results.append(_handle_batched_job_error(env, sys.exc_info()))
+    with transaction.atomic():
+        runnable = mark_jobs_state(runnable, 'PROGRESS')
+
+    finished = []
+    transfers = []
+    with transaction.atomic():
+        for env in runnable:
+            env, job_finished = _run_batched_job(env)
+            if env is None:
+                continue
+            if job_finished:
+                finished.append(env['job_id'])
+            if 'transfer' in env:
+                transfers.append((env, env.pop('transfer')))
+            else:
+                results.append(env)
+        QueuedJob.objects.filter(job_id__in=finished).delete()
+
+        transferred = mark_jobs_state([env for env, _t in transfers],
+                                      'WAITING')
+        transferred_ids = set(env['job_id'] for env in transferred)
+        transfers = [(env, transfer) for env, transfer in transfers
+                     if env['job_id'] in transferred_ids]
+        for env, _transfer in transfers:
+            # Save without ``environ['transfer']`` or
+            # ``environ['saved_environ_id']``.
+            env['saved_environ_id'] = SavedEnviron.save_environ(env).id
+
+    errors = _call_transfer_funcs(transfers)
+    for (env, _transfer), exc_info in zip(transfers, errors):
+        if exc_info is None:
+            results.append(env)
+            continue
+        with transaction.atomic():
+            SavedEnviron.objects.filter(
+                    id=env.pop('saved_environ_id')).delete()
+        results.append(_handle_batched_job_error(env, exc_info))
+
+    return [env for env in results if env is not None]
@@ -10,7 +10,8 @@ from six.moves import range
 from oioioi.base.tests import TestCase
 from oioioi.contests.models import Contest, Submission
 from oioioi.evalmgr.models import QueuedJob, SavedEnviron
-from oioioi.evalmgr.tasks import create_environ, delay_environ, transfer_job
+from oioioi.evalmgr.tasks import (batched_evaluation, create_environ,
+                                  delay_environ, transfer_job)
 from oioioi.evalmgr.utils import mark_job_state
 from oioioi.filetracker.client import get_client
 from oioioi.programs.controllers import ProgrammingContestController
@@ -382,6 +383,99 @@ def _transfer(environ, transfer_magic=None):
         raise RuntimeError('Transfer failed')
 
 
+batch_results = {}
+
+
+def record_result(env, **kwargs):
+    batch_results[env['job_id']] = env['output']
+    return env
+
+
+class TestBatchedJobs(TestCase):
+    recipe = hunting + [('Record',
+                         'oioioi.evalmgr.tests.tests.record_result')]
+
+    @override_settings(EVALMGR_BATCH_SIZE=2, EVALMGR_BATCH_MAX_LATENCY=60)
+    def test_batched_jobs(self):
+        batch_results.clear()
+        police_files.clear()
+        with transaction.atomic():
+            with batched_evaluation():
+                for job_id, area in enumerate(['city', 'forest', 'jungle']):
+                    self.assertIsNone(delay_environ(
+                            dict(job_id=job_id, recipe=self.recipe,
+                                 area=area)))
+                # The first two jobs have been sent as a full batch.
+                self.assertEqual(len(batch_results), 2)
+            self.assertEqual(len(batch_results), 3)
+        self.assertEqual('Epic fail.', batch_results[0])
+        self.assertEqual('Hedgehog hunted.', batch_results[1])
+        self.assertEqual('Epic fail.', batch_results[2])
+        self.assertFalse(QueuedJob.objects.exists())
+
+    @override_settings(EVALMGR_BATCH_SIZE=3)
+    def test_error_isolation(self):
+        batch_results.clear()
+        police_files.clear()
+        with transaction.atomic():
+            with batched_evaluation():
+                delay_environ(dict(job_id=1, recipe=self.recipe,
+                                   area='forest'))
+                delay_environ(dict(job_id=2, case=2, recipe=self.recipe,
+                                   area='elevator',
+                                   error_handlers=[
+                                       ('Call police',
+                                        'oioioi.evalmgr.tests.tests'
+                                        '.police_handler'),
+                                       ('Handled',
+                                        'oioioi.evalmgr.handlers'
+                                        '.error_handled')]))
+                delay_environ(dict(job_id=3, recipe=self.recipe,
+                                   area='city'))
+        self.assertEqual({1: 'Hedgehog hunted.', 3: 'Epic fail.'},
+                         batch_results)
+        self.assertEqual('ARRESTED', police_files[2]['suspect_status'])
+
+    @override_settings(EVALMGR_BATCH_SIZE=2)
+    def test_cancelled_job(self):
+        batch_results.clear()
+        QueuedJob.objects.create(job_id='1', state='CANCELLED')
+        with transaction.atomic():
+            with batched_evaluation():
+                delay_environ(dict(job_id=1, recipe=self.recipe,
+                                   area='forest'))
+                delay_environ(dict(job_id=2, recipe=self.recipe,
+                                   area='forest'))
+        self.assertEqual({2: 'Hedgehog hunted.'}, batch_results)
+        self.assertFalse(QueuedJob.objects.exists())
+
+    @override_settings(EVALMGR_BATCH_SIZE=2)
+    def test_batched_transfer(self):
+        SavedEnviron.objects.all().delete()
+        TestAsyncJobs.transferred_environs = []
+        with transaction.atomic():
+            with batched_evaluation():
+                for _i in range(2):
+                    env = create_environ()
+                    env['recipe'] = [('transfer',
+                            'oioioi.evalmgr.tests.tests._call_transfer')]
+                    env['resumed'] = False
+                    delay_environ(env)
+        self.assertEqual(SavedEnviron.objects.count(), 2)
+        self.assertEqual(QueuedJob.objects.filter(state='WAITING').count(),
+                         2)
+        # Jobs of the batch are evaluated by the same task.
+        task_ids = set(QueuedJob.objects.values_list('celery_task_id',
+                                                     flat=True))
+        self.assertEqual(len(task_ids), 1)
+        self.assertIsNotNone(task_ids.pop())
+        for res in TestAsyncJobs.transferred_environs:
+            env = delay_environ_wrapper(res).get()
+            self.assertTrue(env['resumed'])
+        self.assertEqual(SavedEnviron.objects.count(), 0)
+        self.assertFalse(QueuedJob.objects.exists())
+
+
 class TestViews(TestCase):
     fixtures = ['test_users', 'test_contest', 'test_full_package',
                 'test_problem_instance', 'test_submission']
@@ -34,3 +34,52 @@ def mark_job_state(environ, state, **kwargs):
                 setattr(qj, k, v)
             qj.save()
     return True
+
+
+@require_transaction
+def mark_jobs_state(environs, state):
+    """Sets status of many environs in job queue, like
+       :func:`mark_job_state` does, but with a few bulk queries. Returns the
+       list of environs which should be continued.
+    """
+    job_ids = [six.text_type(env['job_id']) for env in environs]
+    existing = {job_id: (job_state, submission_id) for
+                job_id, job_state, submission_id in
+                QueuedJob.objects.filter(job_id__in=job_ids)
+                .values_list('job_id', 'state', 'submission_id')}
+    submission_ids = set(Submission.objects.filter(
+            id__in=[env['submission_id'] for env in environs
+                    if 'submission_id' in env])
+            .values_list('id', flat=True))
+
+    cancelled = [job_id for job_id, (job_state, _s) in six.iteritems(existing)
+                 if job_state == 'CANCELLED']
+    if cancelled:
+        QueuedJob.objects.filter(job_id__in=cancelled).delete()
+        for job_id in cancelled:
+            logger.info('Job %s cancelled.', job_id)
+
+    to_continue = []
+    to_update = []
+    to_create = []
+    for job_id, env in zip(job_ids, environs):
+        submission_id = env.get('submission_id')
+        if submission_id not in submission_ids:
+            submission_id = None
+        if job_id not in existing:
+            to_create.append(QueuedJob(job_id=job_id, state=state,
+                                       submission_id=submission_id))
+            existing[job_id] = (state, submission_id)
+        elif job_id in cancelled:
+            continue
+        elif submission_id is not None and \
+                existing[job_id][1] != submission_id:
+            QueuedJob.objects.filter(job_id=job_id) \
+                .update(state=state, submission=submission_id)
+        else:
+            to_update.append(job_id)
+        to_continue.append(env)
+
+    QueuedJob.objects.bulk_create(to_create)
+    QueuedJob.objects.filter(job_id__in=to_update).update(state=state)
+    return to_continue
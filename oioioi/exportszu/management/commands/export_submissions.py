@@ -1,5 +1,7 @@
 # ~*~ encoding: utf-8 ~*~
 
+import os.path
+import shutil
 from optparse import make_option
 
 from django.core.management.base import BaseCommand, CommandError
@@ -27,8 +29,21 @@ class Command(BaseCommand):
                     action='store_true',
                     dest='all',
                     help="Export all scored submissions, not only final."),
+        make_option('--resume',
+                    action='store_true',
+                    dest='resume',
+                    help="Resume an interrupted export, without downloading "
+                         "the sources it has downloaded again"),
+        make_option('-q', '--quiet',
+                    action='store_true',
+                    dest='quiet',
+                    help="Don't report progress"),
         )
 
+    def _progress(self, done, total):
+        if done == total or done % 100 == 0:
+            self.stdout.write("Exported %d/%d submissions" % (done, total))
+
     def handle(self, *args, **options):
         if len(args) != 2:
             raise CommandError("Exactly two arguments are required.")
@@ -49,5 +64,16 @@ class Command(BaseCommand):
 
         collector = SubmissionsWithUserDataCollector(contest, round=round,
             only_final=not options.get('all'))
-        with open(out_file, 'w') as f:
-            build_submissions_archive(f, collector)
+        # Downloaded sources are kept next to the archive until it's
+        # complete, so that an interrupted export can be resumed.
+        sources_dir = out_file + '.sources'
+        if os.path.isdir(sources_dir) and not options.get('resume'):
+            shutil.rmtree(sources_dir)
+        if not os.path.isdir(sources_dir):
+            os.mkdir(sources_dir, 0o700)
+
+        progress = None if options.get('quiet') else self._progress
+        with open(out_file, 'wb') as f:
+            build_submissions_archive(f, collector, sources_dir=sources_dir,
+                    progress=progress)
+        shutil.rmtree(sources_dir)
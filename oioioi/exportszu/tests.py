@@ -96,7 +96,10 @@ class TestExportCommand(TestCase):
         tmpdir = tempfile.mkdtemp()
         try:
             archive_path = os.path.join(tmpdir, 'archive.tgz')
-            call_command('export_submissions', 'c', archive_path)
+            out = StringIO()
+            call_command('export_submissions', 'c', archive_path, stdout=out)
+            self.assertIn("Exported 1/1 submissions", out.getvalue())
+            self.assertFalse(os.path.exists(archive_path + '.sources'))
             archive = tarfile.open(archive_path, 'r:gz')
             index = archive.extractfile('c/INDEX').read()
             self.assertEqual(index, INDEX_HEADER +
@@ -106,6 +109,32 @@ class TestExportCommand(TestCase):
         finally:
             shutil.rmtree(tmpdir)
 
+    def test_resume(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            archive_path = os.path.join(tmpdir, 'archive.tgz')
+            sources_dir = archive_path + '.sources'
+            os.mkdir(sources_dir)
+            # A source downloaded by the interrupted export.
+            with open(os.path.join(sources_dir, '1'), 'w') as f:
+                f.write('downloaded before')
+
+            call_command('export_submissions', 'c', archive_path,
+                    resume=True, quiet=True)
+            archive = tarfile.open(archive_path, 'r:gz')
+            source = archive.extractfile('c/1:test_user:zad1.cpp').read()
+            self.assertEqual(source, 'downloaded before')
+
+            os.mkdir(sources_dir)
+            with open(os.path.join(sources_dir, '1'), 'w') as f:
+                f.write('downloaded before')
+            call_command('export_submissions', 'c', archive_path, quiet=True)
+            archive = tarfile.open(archive_path, 'r:gz')
+            source = archive.extractfile('c/1:test_user:zad1.cpp').read()
+            self.assertRegexpMatches(source, '.*int main.*')
+        finally:
+            shutil.rmtree(tmpdir)
+
 
 class TestExportSubmissionsView(TestCase):
     fixtures = ['test_users', 'test_contest', 'test_full_package',
@@ -3,14 +3,17 @@ import os
 import shutil
 import tarfile
 import tempfile
+import threading
+import time
+from collections import deque
+from multiprocessing.pool import ThreadPool
 
-from django.core.exceptions import ObjectDoesNotExist
+from django.conf import settings
 from django.db.models import Q
 from django.utils.encoding import force_text
 
-from oioioi.filetracker.client import get_client
+from oioioi.filetracker.client import get_client, new_client
 from oioioi.filetracker.utils import django_to_filetracker_path
-from oioioi.participants.models import Participant
 from oioioi.programs.models import ProgramSubmission
 
 
@@ -44,12 +47,15 @@ class SubmissionsWithUserDataCollector(object):
         self.round = round
         self.only_final = only_final
         self.filetracker = get_client()
+        # Sources may be fetched by many threads, each of which needs its
+        # own Filetracker client.
+        self._thread = threading.current_thread()
+        self._thread_data = threading.local()
 
     def get_contest_id(self):
         return self.contest.id
 
-    def collect_list(self):
-        ccontroller = self.contest.controller
+    def _get_queryset(self):
         q_expressions = Q(user__isnull=False)
 
         if self.round:
@@ -63,11 +69,37 @@ class SubmissionsWithUserDataCollector(object):
             q_expressions = q_expressions & Q(
                     submissionreport__userresultforproblem__isnull=False)
 
-        submissions_list = []
-        psubmissions = ProgramSubmission.objects.filter(q_expressions) \
-                .select_related()
+        return ProgramSubmission.objects.filter(q_expressions) \
+                .select_related('user', 'problem_instance__problem')
+
+    def _get_registrations(self):
+        """Returns a dictionary mapping ids of the contest's participants
+           to their registration data, fetched with a single query.
+        """
+        rcontroller = self.contest.controller.registration_controller()
+        if not hasattr(rcontroller, 'get_model_class'):
+            return {}
+        model_class = rcontroller.get_model_class()
+        if model_class is None:
+            return {}
+        related = [f.name for f in model_class._meta.fields
+                   if f.is_relation]
+        registrations = model_class.objects \
+                .filter(participant__contest=self.contest) \
+                .select_related(*related)
+        return dict((r.participant.user_id, r) for r in registrations)
+
+    def count(self):
+        return self._get_queryset().count()
+
+    def iter_submissions(self):
+        """Generates :class:`SubmissionData` objects of the submissions,
+           fetching them with a constant number of queries.
+        """
+        ccontroller = self.contest.controller
+        registrations = self._get_registrations()
 
-        for s in psubmissions:
+        for s in self._get_queryset().iterator():
             data = SubmissionData()
             data.submission_id = s.id
             data.user_id = s.user_id
@@ -82,69 +114,188 @@ class SubmissionsWithUserDataCollector(object):
 
             # here we try to get some optional data, it just may not be there
             # and it's ok
+            registration = registrations.get(s.user_id)
             try:
-                registration = Participant.objects.select_related() \
-                    .get(contest_id=self.contest.id, user=s.user) \
-                    .registration_model
-                try:
-                    data.city = registration.city
-                except AttributeError:
-                    pass
-                try:
-                    data.school = registration.school.name
-                    data.school_city = registration.school.city
-                except AttributeError:
-                    pass
-            except (Participant.DoesNotExist, ObjectDoesNotExist):
+                data.city = registration.city
+            except AttributeError:
                 pass
+            try:
+                data.school = registration.school.name
+                data.school_city = registration.school.city
+            except AttributeError:
+                pass
+
+            yield data
 
-            submissions_list.append(data)
-        return submissions_list
+    def collect_list(self):
+        return list(self.iter_submissions())
+
+    def _get_filetracker(self):
+        if threading.current_thread() is self._thread:
+            return self.filetracker
+        if not hasattr(self._thread_data, 'client'):
+            self._thread_data.client = new_client()
+        return self._thread_data.client
 
     def get_submission_source(self, out_file_path, source):
+        """Downloads the source to ``out_file_path``. May be called from
+           many threads at once.
+        """
         ft_file = django_to_filetracker_path(source)
-        self.filetracker.get_file(ft_file, out_file_path, add_to_cache=False)
+        self._get_filetracker().get_file(ft_file, out_file_path,
+                                         add_to_cache=False)
+
+
+INDEX_HEADER = ['submission_id', 'user_id', 'username', 'first_name',
+    'last_name', 'city', 'school', 'school_city', 'problem_short_name',
+    'score']
+
+
+def _encode(obj):
+    if obj is None:
+        return 'NULL'
+    else:
+        return force_text(obj).encode('utf8')
+
+
+def _source_path(sources_dir, submission):
+    return os.path.join(sources_dir, str(submission.submission_id))
+
+
+def _fetch_source(submission_collector, sources_dir, submission):
+    path = _source_path(sources_dir, submission)
+    if os.path.exists(path):
+        return path
+    # The source is renamed when complete, so that an interrupted download
+    # isn't taken for a downloaded source when resuming.
+    tmp_path = path + '.part'
+    submission_collector.get_submission_source(tmp_path,
+            submission.source_file)
+    os.rename(tmp_path, path)
+    return path
+
+
+def _fetch_sources(submission_collector, submissions, sources_dir):
+    """Downloads sources of ``submissions`` concurrently to ``sources_dir``
+       and generates pairs of submissions and paths of their sources,
+       in order. Sources already present in ``sources_dir`` are not
+       downloaded again.
+
+       At most ``settings.EXPORTSZU_FETCH_WINDOW`` sources are downloaded
+       ahead of the consumer.
+    """
+    pool = ThreadPool(settings.EXPORTSZU_FETCH_THREADS)
+    pending = deque()
+    try:
+        for s in submissions:
+            pending.append((s, pool.apply_async(_fetch_source,
+                    (submission_collector, sources_dir, s))))
+            if len(pending) >= settings.EXPORTSZU_FETCH_WINDOW:
+                s, result = pending.popleft()
+                yield s, result.get()
+        while pending:
+            s, result = pending.popleft()
+            yield s, result.get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def _write_archive(out_file, submission_collector, sources_dir,
+        keep_sources, progress):
+    """Writes the archive to ``out_file``, yielding after each file added
+       to it.
+    """
+    contest_id = submission_collector.get_contest_id()
+    total = submission_collector.count() if progress else None
+    with tarfile.open(fileobj=out_file, mode='w|gz') as tar:
+        info = tarfile.TarInfo(contest_id)
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o700
+        info.mtime = time.time()
+        tar.addfile(info)
+
+        index_path = os.path.join(sources_dir, 'INDEX')
+        with open(index_path, 'w') as f:
+            index_csv = csv.writer(f)
+            index_csv.writerow(INDEX_HEADER)
 
+            done = 0
+            for s, path in _fetch_sources(submission_collector,
+                    submission_collector.iter_submissions(), sources_dir):
+                index_entry = [s.submission_id, s.user_id, s.username,
+                    s.first_name, s.last_name, s.city, s.school,
+                    s.school_city, s.problem_short_name, s.score]
+                index_csv.writerow([_encode(col) for col in index_entry])
+
+                filename = '%s:%s:%s.%s' % (
+                        s.submission_id, s.username, s.problem_short_name,
+                        s.solution_language)
+                tar.add(path, arcname=os.path.join(contest_id, filename))
+                if not keep_sources:
+                    os.unlink(path)
+                done += 1
+                if progress:
+                    progress(done, total)
+                yield
+
+        tar.add(index_path, arcname=os.path.join(contest_id, 'INDEX'))
+        os.unlink(index_path)
+    yield
 
-def build_submissions_archive(out_file, submission_collector):
+
+def build_submissions_archive(out_file, submission_collector,
+        sources_dir=None, progress=None):
     """
     Builds submissions archive, in szubrawcy format, in out_file from data
     provided by submission_collector. Argument out_file should be a file-like
-    object.
+    object, which is written sequentially.
+
+    Sources are downloaded concurrently to sources_dir, or to a temporary
+    directory if it's not given. Sources are kept in sources_dir and those
+    already there are not downloaded again, so an interrupted export may be
+    resumed by passing the same directory.
+
+    If progress is given, it's called with the numbers of exported and all
+    submissions after each submission.
     """
-    submission_list = submission_collector.collect_list()
-    tmpdir = tempfile.mkdtemp()
+    keep_sources = sources_dir is not None
+    if not keep_sources:
+        sources_dir = tempfile.mkdtemp()
     try:
-        contest_id = submission_collector.get_contest_id()
-        files_dir = os.path.join(tmpdir, contest_id)
-        os.mkdir(files_dir, 0o700)
-        with open(os.path.join(files_dir, 'INDEX'), 'w') as f:
-            index_csv = csv.writer(f)
-            header = ['submission_id', 'user_id', 'username', 'first_name',
-                'last_name', 'city', 'school', 'school_city',
-                'problem_short_name', 'score']
-            index_csv.writerow(header)
-            for s in submission_list:
-                index_entry = [s.submission_id, s.user_id, s.username,
-                    s.first_name, s.last_name, s.city, s.school, s.school_city,
-                    s.problem_short_name, s.score]
-
-                def encode(obj):
-                    if obj is None:
-                        return 'NULL'
-                    else:
-                        return force_text(obj).encode('utf8')
-
-                index_csv.writerow([encode(col) for col in index_entry])
-
-        for s in submission_list:
-            filename = '%s:%s:%s.%s' % (
-                    s.submission_id, s.username, s.problem_short_name,
-                    s.solution_language)
-            dest = os.path.join(files_dir, filename)
-            submission_collector.get_submission_source(dest, s.source_file)
-
-        with tarfile.open(fileobj=out_file, mode='w:gz') as tar:
-            tar.add(files_dir, arcname=contest_id)
+        for _step in _write_archive(out_file, submission_collector,
+                sources_dir, keep_sources, progress):
+            pass
+    finally:
+        if not keep_sources:
+            shutil.rmtree(sources_dir)
+
+
+class _ChunkBuffer(object):
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_submissions_archive(submission_collector):
+    """
+    Generates chunks of the archive built by
+    :func:`build_submissions_archive`, as it's being built.
+    """
+    sources_dir = tempfile.mkdtemp()
+    buf = _ChunkBuffer()
+    try:
+        for _step in _write_archive(buf, submission_collector, sources_dir,
+                False, None):
+            data = buf.pop()
+            if data:
+                yield data
     finally:
-        shutil.rmtree(tmpdir)
+        shutil.rmtree(sources_dir)
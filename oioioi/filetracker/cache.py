@@ -0,0 +1,245 @@
+"""Local cache of files read through
+   :class:`~oioioi.filetracker.storage.FiletrackerStorage`.
+
+   A version of a file in Filetracker never changes, so files are cached
+   under their versioned names and need no invalidation. The cache is a
+   directory which may be shared by many processes (e.g. gunicorn workers):
+   files are added to it atomically, and the least recently used ones are
+   removed when their total size exceeds the limit.
+"""
+import errno
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import receiver
+from django.test.signals import setting_changed
+from filetracker.utils import split_name
+
+from oioioi.base.utils import memoized, reset_memoized
+
+logger = logging.getLogger(__name__)
+
+_TEMP_PREFIX = '.tmp'
+# Temporary files older than this (in seconds) are left by crashed
+# processes.
+_STALE_TEMP_AGE = 3600
+
+_STATS_FIELDS = ('hits', 'misses', 'bytes_saved')
+
+
+def _stats_key(field):
+    return 'filetracker_cache:%s' % field
+
+
+class CacheStats(object):
+    """Counts hits and misses of the cache. The counters are shared between
+       processes through the Django cache, to which they are added every
+       ``flush_interval`` seconds.
+    """
+
+    def __init__(self, flush_interval=60):
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.counters = dict((field, 0) for field in _STATS_FIELDS)
+        self.last_flush = time.time()
+
+    def add(self, **counts):
+        with self.lock:
+            for field, count in counts.items():
+                self.counters[field] += count
+            if time.time() - self.last_flush < self.flush_interval:
+                return
+            counters = self.counters
+            self._reset()
+        self._flush(counters)
+
+    def _flush(self, counters):
+        for field, count in counters.items():
+            if not count:
+                continue
+            key = _stats_key(field)
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                # Removed from the cache in the meantime.
+                cache.set(key, count, None)
+
+    def flush(self):
+        with self.lock:
+            counters = self.counters
+            self._reset()
+        self._flush(counters)
+
+
+def get_stats():
+    """Returns the numbers of ``hits`` and ``misses`` of the caches of all
+       processes, ``bytes_saved`` by the hits, and the ``hit_ratio``.
+    """
+    stats = dict((field, cache.get(_stats_key(field), 0))
+                 for field in _STATS_FIELDS)
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = float(stats['hits']) / total if total else 0.
+    return stats
+
+
+class LocalFileCache(object):
+    """Cache of Filetracker files in the local directory ``root``, holding
+       at most ``max_size`` bytes. Files larger than ``max_file_size`` are
+       not cached.
+    """
+
+    def __init__(self, root, max_size, max_file_size=None):
+        self.root = root
+        self.max_size = max_size
+        self.max_file_size = max_file_size or max_size // 4
+        self.stats = CacheStats()
+        if not os.path.isdir(root):
+            try:
+                os.makedirs(root)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+
+    def _cache_file_name(self, versioned_path):
+        return os.path.join(self.root, hashlib.sha1(
+            versioned_path.encode('utf-8')).hexdigest())
+
+    def _versioned_path(self, client, path):
+        name, version = split_name(path)
+        if version is None:
+            version = client.file_version(path)
+        return '%s@%s' % (name, version)
+
+    def open(self, client, path):
+        """Returns a file object open for reading the Filetracker file
+           ``path``, using ``client`` if it's not cached.
+
+           If ``path`` is not versioned, its latest version is looked up.
+        """
+        path = self._versioned_path(client, path)
+        filename = self._cache_file_name(path)
+        try:
+            f = open(filename, 'rb')
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+        else:
+            # Eviction removes files by their modification times.
+            try:
+                os.utime(filename, None)
+            except OSError:
+                pass
+            self.stats.add(hits=1,
+                           bytes_saved=os.fstat(f.fileno()).st_size)
+            return f
+        self.stats.add(misses=1)
+        return self._fetch(client, path, filename)
+
+    def get_local_file(self, client, path):
+        """Returns the name of the local file in the cache with the contents
+           of the Filetracker file ``path``, which is downloaded if needed,
+           or ``None`` if the file is too large to be cached.
+        """
+        path = self._versioned_path(client, path)
+        filename = self._cache_file_name(path)
+        try:
+            size = os.path.getsize(filename)
+            os.utime(filename, None)
+        except OSError:
+            pass
+        else:
+            self.stats.add(hits=1, bytes_saved=size)
+            return filename
+        if client.file_size(path) > self.max_file_size:
+            return None
+        self.stats.add(misses=1)
+        self._fetch(client, path, filename).close()
+        return filename
+
+    def _fetch(self, client, path, filename):
+        reader, _version = client.get_stream(path)
+        tmp = tempfile.NamedTemporaryFile(dir=self.root, prefix=_TEMP_PREFIX,
+                                          delete=False)
+        try:
+            try:
+                shutil.copyfileobj(reader, tmp)
+            finally:
+                reader.close()
+                tmp.close()
+            if os.path.getsize(tmp.name) > self.max_file_size:
+                f = open(tmp.name, 'rb')
+                os.unlink(tmp.name)
+                return f
+            os.rename(tmp.name, filename)
+        # pylint: disable=broad-except
+        except Exception:
+            if os.path.exists(tmp.name):
+                os.unlink(tmp.name)
+            raise
+        f = open(filename, 'rb')
+        self.evict()
+        return f
+
+    def evict(self):
+        """Removes the least recently used files until the cache holds at
+           most ``max_size`` bytes.
+        """
+        entries = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                st = os.stat(path)
+                if name.startswith(_TEMP_PREFIX):
+                    if st.st_mtime < now - _STALE_TEMP_AGE:
+                        os.unlink(path)
+                    continue
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+        if total <= self.max_size:
+            return
+        entries.sort()
+        for _mtime, size, path in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError as e:
+                # Another process could have removed it.
+                if e.errno != errno.ENOENT:
+                    logger.warning("Failed to remove %s from the cache", path,
+                                   exc_info=True)
+                    continue
+            total -= size
+
+
+@memoized
+def get_local_cache():
+    """Returns the cache configured with ``FILETRACKER_LOCAL_CACHE_ROOT``
+       and ``FILETRACKER_LOCAL_CACHE_SIZE``, or ``None`` if it's disabled.
+    """
+    root = getattr(settings, 'FILETRACKER_LOCAL_CACHE_ROOT', None)
+    if not root:
+        return None
+    return LocalFileCache(root, settings.FILETRACKER_LOCAL_CACHE_SIZE)
+
+
+@receiver(setting_changed)
+def _on_setting_changed(sender, setting, **kwargs):
+    if setting in ('FILETRACKER_LOCAL_CACHE_ROOT',
+                   'FILETRACKER_LOCAL_CACHE_SIZE'):
+        reset_memoized(get_local_cache)
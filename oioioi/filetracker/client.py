@@ -6,20 +6,18 @@ from django.test.signals import setting_changed
 from django.utils.module_loading import import_string
 
 from filetracker.client import Client as FiletrackerClient
+from filetracker.client.dummy import DummyClient
 
 from oioioi.base.utils import memoized, reset_memoized
 
 
-@memoized
-def get_client():
-    """Constructs a Filetracker client.
-
-       Needs a ``FILETRACKER_CLIENT_FACTORY`` entry in ``settings.py``, which
-       should contain a :term:`dotted name` of a function which returns a
-       :class:`filetracker.client.Client` instance. A good candidate is
-       :func:`~oioioi.filetracker.client.remote_storage_factory`.
+def new_client():
+    """Constructs a new Filetracker client with
+       ``settings.FILETRACKER_CLIENT_FACTORY``.
 
-       The constructed client is cached.
+       Clients shouldn't be shared between threads, so threads other than
+       the main one should use their own clients made by this function,
+       instead of the one of :func:`get_client`.
     """
     factory = settings.FILETRACKER_CLIENT_FACTORY
     if isinstance(factory, six.string_types):
@@ -32,6 +30,21 @@ def get_client():
         raise ImproperlyConfigured('The factory pointed by '
                 'FILETRACKER_CLIENT_FACTORY returned non-FiletrackerClient: '
                 '%r' % (client,))
+    return client
+
+
+@memoized
+def get_client():
+    """Constructs a Filetracker client.
+
+       Needs a ``FILETRACKER_CLIENT_FACTORY`` entry in ``settings.py``, which
+       should contain a :term:`dotted name` of a function which returns a
+       :class:`filetracker.client.Client` instance. A good candidate is
+       :func:`~oioioi.filetracker.client.remote_storage_factory`.
+
+       The constructed client is cached.
+    """
+    client = new_client()
 
     # Needed for oioioi.sioworkers.backends.LocalBackend so that both Django
     # and sioworkers use the same Filetracker client
@@ -54,3 +67,12 @@ def remote_storage_factory():
     """
     return FiletrackerClient(remote_url=settings.FILETRACKER_URL,
             cache_dir=settings.FILETRACKER_CACHE_ROOT)
+
+
+@memoized
+def shared_dummy_factory():
+    """A filetracker factory for tests, which always returns the same
+       in-memory client, so that clients made for threads (see
+       :func:`new_client`) see the same files.
+    """
+    return DummyClient()
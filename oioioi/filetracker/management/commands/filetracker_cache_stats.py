@@ -0,0 +1,18 @@
+from __future__ import print_function
+
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext as _
+
+from oioioi.filetracker.cache import get_stats
+
+
+class Command(BaseCommand):
+    help = _("Display the hit ratio of the local cache of files read from "
+             "Filetracker")
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        print(_("Hits: %d") % stats['hits'])
+        print(_("Misses: %d") % stats['misses'])
+        print(_("Hit ratio: %.1f%%") % (100. * stats['hit_ratio']))
+        print(_("Bytes saved: %d") % stats['bytes_saved'])
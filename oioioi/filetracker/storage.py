@@ -7,6 +7,7 @@ from django.core.files import File
 from django.core.files.storage import Storage
 from django.core.urlresolvers import reverse
 
+from oioioi.filetracker.cache import get_local_cache
 from oioioi.filetracker.client import get_client
 from oioioi.filetracker.filename import FiletrackerFilename
 from oioioi.filetracker.utils import FileInFiletracker
@@ -43,6 +44,10 @@ class FiletrackerStorage(Storage):
             raise ValueError('FiletrackerStorage.open does not support '
                     'writing. Use FiletrackerStorage.save.')
         path = self._make_filetracker_path(name)
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            return File(local_cache.open(self.client, path),
+                        FiletrackerFilename(name))
         reader, _version = self.client.get_stream(path)
         return File(reader, FiletrackerFilename(name))
 
@@ -1,6 +1,7 @@
 # coding: utf-8
 
 import datetime
+import os
 import shutil
 import tempfile
 
@@ -8,11 +9,13 @@ from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django.core.urlresolvers import reverse
 from django.db.models.fields.files import FieldFile, FileField
+from django.test.utils import override_settings
 
 from filetracker.client import Client as FiletrackerClient
 from filetracker.client.dummy import DummyClient
 
 from oioioi.base.tests import TestCase
+from oioioi.filetracker.cache import LocalFileCache
 from oioioi.filetracker.models import FileTestModel
 from oioioi.filetracker.storage import FiletrackerStorage
 from oioioi.filetracker.utils import (django_to_filetracker_path,
@@ -121,6 +124,69 @@ class TestFileStorage(TestCase):
             shutil.rmtree(dir)
 
 
+class TestLocalFileCache(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.client = DummyClient()
+        self.storage = FiletrackerStorage(client=self.client)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _put(self, name, data):
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(data)
+            f.flush()
+            self.client.put_file(name, f.name)
+
+    def _cached_files(self):
+        return [name for name in os.listdir(self.dir)
+                if not name.startswith('.')]
+
+    def test_storage_uses_cache(self):
+        with override_settings(FILETRACKER_LOCAL_CACHE_ROOT=self.dir):
+            name = self.storage.save('my/path', ContentFile('eloziom'))
+            self.assertEqual(self.storage.open(name, 'rb').read(), 'eloziom')
+            self.assertEqual(len(self._cached_files()), 1)
+            self.assertEqual(self.storage.open(name, 'rb').read(), 'eloziom')
+            self.assertEqual(self.storage.open('my/path', 'rb').read(),
+                             'eloziom')
+            self.assertEqual(len(self._cached_files()), 1)
+
+            self.storage.delete('my/path')
+            with self.assertRaises(Exception):
+                self.storage.open('my/path', 'rb')
+
+    def test_versions(self):
+        cache = LocalFileCache(self.dir, 1000)
+        self._put('/a@1', b'old')
+        self.assertEqual(cache.open(self.client, '/a@1').read(), 'old')
+        self._put('/a@2', b'new')
+        self.assertEqual(cache.open(self.client, '/a@2').read(), 'new')
+        self.assertEqual(cache.open(self.client, '/a@1').read(), 'old')
+        self.assertEqual(cache.stats.counters['hits'], 1)
+        self.assertEqual(cache.stats.counters['misses'], 2)
+        self.assertEqual(cache.stats.counters['bytes_saved'], 3)
+
+    def test_eviction(self):
+        cache = LocalFileCache(self.dir, 250, max_file_size=200)
+        for name in ('/a@1', '/b@1', '/c@1'):
+            self._put(name, b'x' * 100)
+        cache.open(self.client, '/a@1')
+        cache.open(self.client, '/b@1')
+        # Make '/a' the most recently used.
+        os.utime(cache._cache_file_name('/b@1'), (0, 0))
+        cache.open(self.client, '/a@1')
+        cache.open(self.client, '/c@1')
+        self.assertEqual(sorted(self._cached_files()),
+                         sorted([os.path.basename(cache._cache_file_name(n))
+                                 for n in ('/a@1', '/c@1')]))
+
+        self._put('/big@1', b'x' * 201)
+        self.assertEqual(len(cache.open(self.client, '/big@1').read()), 201)
+        self.assertEqual(len(self._cached_files()), 2)
+
+
 class TestStreamingMixin(object):
     def assertStreamingEqual(self, response, content):
         self.assertEqual(self.streamingContent(response), content)
@@ -151,6 +217,38 @@ class TestFileStorageViews(TestCase, TestStreamingMixin):
         finally:
             default_storage.delete(filename)
 
+    def test_sendfile(self):
+        filename = 'tests/test_sendfile.txt'
+        default_storage.save(filename, ContentFile('foo'))
+        cache_dir = tempfile.mkdtemp()
+        url = reverse('oioioi.filetracker.views.raw_file_view',
+                kwargs={'filename': filename})
+        self.client.login(username='test_admin')
+        try:
+            with override_settings(FILETRACKER_LOCAL_CACHE_ROOT=cache_dir,
+                    FILETRACKER_SENDFILE_HEADER='X-Accel-Redirect'):
+                response = self.client.get(url)
+                self.assertFalse(response.streaming)
+                self.assertEqual(response['Content-Type'], 'text/plain')
+                location = response['X-Accel-Redirect']
+                self.assertTrue(location.startswith('/filetracker-cache/'))
+                cached = os.path.join(cache_dir,
+                                      location[len('/filetracker-cache/'):])
+                with open(cached, 'rb') as f:
+                    self.assertEqual(f.read(), b'foo')
+
+            with override_settings(FILETRACKER_LOCAL_CACHE_ROOT=cache_dir,
+                    FILETRACKER_SENDFILE_HEADER='X-Sendfile'):
+                response = self.client.get(url)
+                self.assertEqual(response['X-Sendfile'], cached)
+
+            with override_settings(FILETRACKER_SENDFILE_HEADER='X-Sendfile'):
+                response = self.client.get(url)
+                self.assertStreamingEqual(response, 'foo')
+        finally:
+            shutil.rmtree(cache_dir)
+            default_storage.delete(filename)
+
 
 class TestFileFixtures(TestCase):
     fixtures = ['test_file_field']
@@ -1,13 +1,17 @@
 import mimetypes
+import os.path
 import urllib
 from wsgiref.util import FileWrapper
 
 import six
 import six.moves.urllib.parse
+from django.conf import settings
 from django.core.files import File
 from django.core.files.storage import default_storage
-from django.http import StreamingHttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 
+from oioioi.filetracker.cache import get_local_cache
+from oioioi.filetracker.client import get_client
 from oioioi.filetracker.filename import FiletrackerFilename
 
 
@@ -90,6 +94,36 @@ def make_content_disposition_header(disposition, filename):
     return header
 
 
+def sendfile_response(path, content_type):
+    """Returns a response which makes the front web server send the
+       Filetracker file ``path`` from the local cache (see
+       :mod:`oioioi.filetracker.cache`), using the header set in
+       ``settings.FILETRACKER_SENDFILE_HEADER``.
+
+       Returns ``None`` if the file should be streamed by Django instead,
+       because the header or the cache is not configured, or the file is too
+       large to be cached.
+
+       ``X-Sendfile`` gets the absolute path of the cached file, while
+       ``X-Accel-Redirect`` gets its path relative to the cache directory
+       appended to ``settings.FILETRACKER_SENDFILE_PREFIX``, which should be
+       an internal location of nginx pointing to the cache directory.
+    """
+    header = getattr(settings, 'FILETRACKER_SENDFILE_HEADER', None)
+    local_cache = get_local_cache()
+    if not header or local_cache is None:
+        return None
+    filename = local_cache.get_local_file(get_client(), path)
+    if filename is None:
+        return None
+    if header == 'X-Accel-Redirect':
+        filename = settings.FILETRACKER_SENDFILE_PREFIX.rstrip('/') + '/' + \
+            os.path.relpath(filename, local_cache.root)
+    response = HttpResponse(content_type=content_type)
+    response[header] = filename
+    return response
+
+
 def stream_file(django_file, name=None, showable=None):
     """Returns a :class:`HttpResponse` representing a file download.
 
@@ -100,14 +134,23 @@ def stream_file(django_file, name=None, showable=None):
        by default be displayed in browser. Other are forced to be downloaded.
        Using ``showable`` flag, default behaviour may be overriden in both
        directions.
+
+       The file is sent by the front web server if possible, see
+       :func:`sendfile_response`.
     """
     if name is None:
         name = six.text_type(django_file.name.rsplit('/', 1)[-1])
     content_type = mimetypes.guess_type(name)[0] or \
         'application/octet-stream'
-    response = StreamingHttpResponse(FileWrapper(django_file),
-        content_type=content_type)
-    response['Content-Length'] = django_file.size
+    try:
+        response = sendfile_response(django_to_filetracker_path(django_file),
+                                     content_type)
+    except ValueError:
+        response = None
+    if response is None:
+        response = StreamingHttpResponse(FileWrapper(django_file),
+            content_type=content_type)
+        response['Content-Length'] = django_file.size
     showable_exts = ['pdf', 'ps', 'txt']
     if showable is None:
         extension = name.rsplit('.')[-1]
@@ -1,10 +1,15 @@
 import mimetypes
 from wsgiref.util import FileWrapper
 
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.core.files.storage import default_storage
 from django.http import Http404, StreamingHttpResponse
 
+from oioioi.filetracker.utils import (FileInFiletracker,
+                                     django_to_filetracker_path,
+                                     sendfile_response)
+
 
 def raw_file_view(request, filename):
     if not filename or filename.startswith('/'):
@@ -14,9 +19,18 @@ def raw_file_view(request, filename):
     if not default_storage.exists(filename):
         raise Http404
 
-    file = default_storage.open(filename, 'rb')
-    content_type = mimetypes.guess_type(file.name)[0] or \
+    content_type = mimetypes.guess_type(filename)[0] or \
         'application/octet-stream'
+    if getattr(settings, 'FILETRACKER_SENDFILE_HEADER', None):
+        try:
+            response = sendfile_response(django_to_filetracker_path(
+                FileInFiletracker(default_storage, filename)), content_type)
+        except ValueError:
+            response = None
+        if response is not None:
+            return response
+
+    file = default_storage.open(filename, 'rb')
     response = StreamingHttpResponse(FileWrapper(file),
                                      content_type=content_type)
     response['Content-Length'] = file.size
@@ -0,0 +1 @@
+default_app_config = 'oioioi.livedata.apps.LivedataAppConfig'
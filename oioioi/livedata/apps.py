@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class LivedataAppConfig(AppConfig):
     name = "oioioi.livedata"
+
+    def ready(self):
+        from oioioi.livedata.models import connect_snapshots_invalidation
+        connect_snapshots_invalidation()
@@ -1,3 +1,39 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+
 from oioioi.base.utils.deps import check_django_app_dependencies
+from oioioi.contests.models import ProblemInstance, Submission
+from oioioi.livedata.snapshots import invalidate
+from oioioi.participants.models import Participant
 
 check_django_app_dependencies(__name__, ['oioioi.participants'])
+
+
+def _invalidate_snapshots(sender, instance, **kwargs):
+    if isinstance(instance, Submission):
+        # The problem instance is usually loaded already by the code
+        # judging the submission.
+        contest_id = instance.problem_instance.contest_id
+    else:
+        contest_id = instance.contest_id
+    if contest_id is not None:
+        invalidate(contest_id)
+
+
+def connect_snapshots_invalidation():
+    """Connects the invalidation of livedata snapshots to changes of
+       submissions (which are saved when they're judged), participants and
+       problem instances.
+
+       Subclasses of :class:`~oioioi.contests.models.Submission` are
+       senders of their own signals, so this is called once all models are
+       loaded.
+    """
+    senders = [Participant, ProblemInstance] + \
+        [model for model in apps.get_models()
+         if issubclass(model, Submission)]
+    for sender in senders:
+        post_save.connect(_invalidate_snapshots, sender=sender,
+                          dispatch_uid='livedata_snapshots')
+        post_delete.connect(_invalidate_snapshots, sender=sender,
+                            dispatch_uid='livedata_snapshots')
@@ -0,0 +1,132 @@
+"""Snapshots of livedata responses, shared by all processes through the
+   Django cache.
+
+   A snapshot holds the serialized response of a livedata view for
+   a round, along with its gzipped version and ETag. It's rebuilt when
+   the contest's data changes (see :func:`invalidate`), e.g. when
+   a submission is judged, or when it's older than
+   ``settings.LIVEDATA_CACHE_TIMEOUT`` seconds. Only one process rebuilds
+   a snapshot at a time; the others serve the previous one meanwhile, or
+   wait for it if there's none.
+
+   The lock relies on ``cache.add`` being atomic, which it is for memcached
+   or Redis, but not for ``FileBasedCache`` or a cache per process. There
+   a few processes may occasionally rebuild the same snapshot at once,
+   which costs some time, but gives the same result.
+"""
+import gzip
+import hashlib
+import time
+import uuid
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+
+_LOCK_TIMEOUT = 60
+_WAIT_INTERVAL = 0.1
+
+
+def _generation_key(contest_id):
+    return 'livedata_generation/%s' % contest_id
+
+
+def _get_generation(contest_id):
+    key = _generation_key(contest_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        generation = cache.get(key)
+    return generation
+
+
+def invalidate(contest_id):
+    """Makes the snapshots of the contest's livedata out of date.
+
+       Snapshots built from the data before the current transaction commits
+       are invalidated again once it does.
+    """
+    cache.set(_generation_key(contest_id), uuid.uuid4().hex, None)
+    transaction.on_commit(lambda: cache.set(_generation_key(contest_id),
+                                            uuid.uuid4().hex, None))
+
+
+def _is_fresh(snapshot, generation):
+    return snapshot is not None and snapshot['generation'] == generation \
+        and snapshot['created'] > time.time() - settings.LIVEDATA_CACHE_TIMEOUT
+
+
+def _gzip(content):
+    buf = BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb', mtime=0) as f:
+        f.write(content)
+    return buf.getvalue()
+
+
+def _build(view, request, round_id, generation):
+    response = view(request, round_id)
+    assert isinstance(response, HttpResponse)
+    content = response.content
+    return {
+        'generation': generation,
+        'created': time.time(),
+        'content': content,
+        'gzipped': _gzip(content),
+        'etag': '"%s"' % hashlib.sha1(content).hexdigest(),
+        'headers': dict(response.items()),
+    }
+
+
+def get_snapshot(view, request, round_id):
+    """Returns the current snapshot of the response of ``view`` for
+       the round, building it if needed.
+    """
+    key = 'livedata_snapshot/%s/%s/%s' % (view.__name__, request.contest.id,
+                                          round_id)
+    lock_key = key + '/lock'
+    generation = _get_generation(request.contest.id)
+    snapshot = cache.get(key)
+    if _is_fresh(snapshot, generation):
+        return snapshot
+
+    if cache.add(lock_key, True, _LOCK_TIMEOUT):
+        try:
+            snapshot = _build(view, request, round_id, generation)
+            cache.set(key, snapshot, None)
+        finally:
+            cache.delete(lock_key)
+        return snapshot
+
+    # Another process is building the snapshot.
+    if snapshot is not None:
+        return snapshot
+    deadline = time.time() + _LOCK_TIMEOUT
+    while time.time() < deadline and cache.get(lock_key) is not None:
+        time.sleep(_WAIT_INTERVAL)
+        snapshot = cache.get(key)
+        if snapshot is not None:
+            return snapshot
+    return _build(view, request, round_id, generation)
+
+
+def snapshot_response(request, snapshot):
+    """Returns the response with the snapshot, compressed if the client
+       accepts it.
+    """
+    if request.META.get('HTTP_IF_NONE_MATCH') == snapshot['etag']:
+        response = HttpResponseNotModified()
+    else:
+        if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+            response = HttpResponse(snapshot['gzipped'])
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(snapshot['content'])
+        for header, value in snapshot['headers'].items():
+            if header.lower() not in ('content-length', 'content-encoding'):
+                response[header] = value
+    response['ETag'] = snapshot['etag']
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -1,7 +1,21 @@
+import gzip
+from datetime import datetime, timedelta  # pylint: disable=E0611
+from io import BytesIO
+
 from django.contrib.auth.models import User
+from django.core.exceptions import SuspiciousOperation
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.utils.timezone import utc
 
 from oioioi.base.tests import TestCase
+from oioioi.contests.models import (Contest, Round, ScoreReport,
+                                    Submission, SubmissionReport)
+from oioioi.livedata.snapshots import (_get_generation, get_snapshot,
+                                       invalidate, snapshot_response)
 from oioioi.livedata.utils import get_display_name
+from oioioi.livedata.views import _get_events, _make_cursor, _parse_cursor
+from oioioi.participants.models import Participant
 
 # TODO
 
@@ -16,3 +30,98 @@ class TestLivedata(TestCase):
         for username, display in cases:
             user = User.objects.get(username=username)
             self.assertEqual(get_display_name(user), display or username)
+
+    def test_cursor(self):
+        date = datetime(2012, 7, 31, 20, 27, 58, 123456, tzinfo=utc)
+        cursor = _make_cursor(SubmissionReport(id=17, creation_date=date))
+        self.assertEqual(_parse_cursor(cursor), (date, 17))
+        for cursor in ['', '12', 'a_b', '1_2_3']:
+            with self.assertRaises(SuspiciousOperation):
+                _parse_cursor(cursor)
+
+
+class TestLivedataEvents(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+                'test_problem_instance', 'test_submission']
+
+    def setUp(self):
+        contest = Contest.objects.get()
+        Participant.objects.create(contest=contest,
+                user=User.objects.get(username='test_user'))
+        self.date = datetime(2012, 8, 3, 22, 0, tzinfo=utc)
+        SubmissionReport.objects.filter(id=1).update(creation_date=self.date)
+        SubmissionReport.objects.filter(id=2).update(
+                creation_date=self.date + timedelta(seconds=30))
+
+    def _events(self, seconds, since):
+        request = RequestFactory().get('/')
+        request.contest = Contest.objects.get()
+        request.user = User.objects.get(username='test_admin')
+        request.timestamp = self.date + timedelta(seconds=seconds)
+        events, cursor = _get_events(request, Round.objects.get(), since)
+        return [event['reportId'] for event in events], cursor
+
+    def test_safety_lag(self):
+        start = _make_cursor(SubmissionReport(id=0,
+                creation_date=self.date - timedelta(seconds=1)))
+        with self.settings(LIVEDATA_EVENTS_SAFETY_LAG=10):
+            events, cursor = self._events(35, start)
+            self.assertEqual(events, [1])
+            events, cursor = self._events(45, cursor)
+            self.assertEqual(events, [2])
+            self.assertEqual(self._events(100, cursor), ([], cursor))
+
+    def test_reports_without_scores(self):
+        start = _make_cursor(SubmissionReport(id=0,
+                creation_date=self.date - timedelta(seconds=1)))
+        ScoreReport.objects.filter(submission_report_id=2).delete()
+        with self.settings(LIVEDATA_EVENTS_SAFETY_LAG=10):
+            events, cursor = self._events(100, start)
+            self.assertEqual(events, [1])
+            self.assertEqual(_parse_cursor(cursor)[1], 1)
+            # A page of reports without scores only is skipped.
+            events, cursor = self._events(100, cursor)
+            self.assertEqual(events, [])
+            self.assertEqual(_parse_cursor(cursor)[1], 2)
+
+    def test_snapshots_invalidation(self):
+        contest = Contest.objects.get()
+        generation = _get_generation(contest.id)
+        Submission.objects.get(id=1).save()
+        self.assertNotEqual(_get_generation(contest.id), generation)
+        generation = _get_generation(contest.id)
+        Participant.objects.get().delete()
+        self.assertNotEqual(_get_generation(contest.id), generation)
+        generation = _get_generation(contest.id)
+        User.objects.get(username='test_user').save()
+        self.assertEqual(_get_generation(contest.id), generation)
+
+
+class TestLivedataSnapshots(TestCase):
+    def test_snapshots(self):
+        calls = []
+
+        def view(request, round_id):
+            calls.append(round_id)
+            return HttpResponse('[1, 2, 3]', content_type='application/json')
+
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        request.contest = Contest(id='c')
+        snapshot = get_snapshot(view, request, 1)
+        self.assertEqual(get_snapshot(view, request, 1), snapshot)
+        self.assertEqual(len(calls), 1)
+
+        response = snapshot_response(request, snapshot)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(
+            gzip.GzipFile(fileobj=BytesIO(response.content)).read(),
+            b'[1, 2, 3]')
+
+        request.META['HTTP_IF_NONE_MATCH'] = response['ETag']
+        self.assertEqual(snapshot_response(request, snapshot).status_code,
+                         304)
+
+        invalidate('c')
+        get_snapshot(view, request, 1)
+        self.assertEqual(len(calls), 2)
@@ -9,4 +9,7 @@ contest_patterns = [
         name='livedata_tasks_view'),
     url(r'^events/(?P<round_id>\d+)/$', views.livedata_events_view,
         name='livedata_events_view'),
+    url(r'^events/(?P<round_id>\d+)/stream/$',
+        views.livedata_events_stream_view,
+        name='livedata_events_stream_view'),
 ]
@@ -1,26 +1,42 @@
 import datetime
 import functools
+import itertools
+import json
+import time
 
 import six
 from django.conf import settings
 from django.core.cache import cache
+from django.core.exceptions import SuspiciousOperation
 from django.db.models import Q
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import dateformat
 from django.utils.timezone import utc
 
 from oioioi.base.permissions import enforce_condition
-from oioioi.base.utils import allow_cross_origin, jsonify
+from oioioi.base.utils import add_header, allow_cross_origin, jsonify
 from oioioi.contests.models import SubmissionReport
 from oioioi.contests.utils import (contest_exists, is_contest_admin,
                                    is_contest_observer)
+from oioioi.livedata.snapshots import get_snapshot, snapshot_response
 from oioioi.livedata.utils import can_see_livedata, get_display_name
 
 RESULT_FOR_FROZEN_SUBMISSION = 'FROZEN'
 
+# Response header with the cursor to be passed as the ``since`` parameter
+# to get the events which follow the returned ones.
+CURSOR_HEADER = 'X-Livedata-Cursor'
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=utc)
+
 
 def cache_unless_admin_or_observer(view):
+    """Serves the responses of ``view`` from shared snapshots (see
+       :mod:`oioioi.livedata.snapshots`), except for contest admins and
+       observers. Incremental requests, with the ``since`` parameter, are
+       cached for ``settings.LIVEDATA_CACHE_TIMEOUT`` seconds.
+    """
     @functools.wraps(view)
     def inner(request, round_id):
         should_cache = not is_contest_admin(request) and \
@@ -28,22 +44,59 @@ def cache_unless_admin_or_observer(view):
         if not should_cache:
             return view(request, round_id)
 
-        cache_key = '%s/%s/%s' % (view.__name__, request.contest.id, round_id)
+        if 'since' not in request.GET:
+            return snapshot_response(request,
+                    get_snapshot(view, request, round_id))
+
+        cache_key = '%s/%s/%s/%s' % (view.__name__, request.contest.id,
+                                     round_id, request.GET['since'])
         result = cache.get(cache_key)
         if result is None:
             result = view(request, round_id)
             assert isinstance(result, HttpResponse)
             cache.set(cache_key,
                     {'content': six.text_type(result.content),
-                     'content_type': result['Content-Type']},
+                     'content_type': result['Content-Type'],
+                     'cursor': result.get(CURSOR_HEADER)},
                     settings.LIVEDATA_CACHE_TIMEOUT)
         else:
+            cursor = result.get('cursor')
             result = HttpResponse(result['content'],
                     content_type=result['content_type'])
+            if cursor:
+                result[CURSOR_HEADER] = cursor
         return result
     return inner
 
 
+def _make_cursor(report):
+    delta = report.creation_date - _EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 10 ** 6 \
+        + delta.microseconds
+    return '%d_%d' % (microseconds, report.id)
+
+
+def _parse_cursor(cursor):
+    """Returns the pair ``(creation_date, id)`` of the last report
+       returned before, encoded in the cursor by :func:`_make_cursor`.
+    """
+    try:
+        microseconds, report_id = cursor.split('_')
+        return (_EPOCH + datetime.timedelta(microseconds=int(microseconds)),
+                int(report_id))
+    except (ValueError, OverflowError):
+        raise SuspiciousOperation
+
+
+def _events_after(reports, cursor):
+    """Returns the reports which follow the cursor, using the
+       ``(creation_date, id)`` index.
+    """
+    creation_date, report_id = _parse_cursor(cursor)
+    return reports.filter(Q(creation_date__gt=creation_date) |
+                          Q(creation_date=creation_date, id__gt=report_id))
+
+
 @allow_cross_origin
 @enforce_condition(contest_exists & can_see_livedata)
 @cache_unless_admin_or_observer
@@ -71,11 +124,17 @@ def livedata_tasks_view(request, round_id):
     } for pi in pis.order_by('problem__name')]
 
 
-@allow_cross_origin
-@enforce_condition(contest_exists & can_see_livedata)
-@cache_unless_admin_or_observer
-@jsonify
-def livedata_events_view(request, round_id):
+def _get_events(request, round, since=None):
+    """Returns the list of events of the round and the cursor pointing
+       after them.
+
+       If ``since`` is given, only the events following this cursor are
+       returned, at most ``settings.LIVEDATA_EVENTS_PAGE_SIZE`` of them.
+       Otherwise all events are returned, preceded by the ``START`` event.
+       Events of reports created less than
+       ``settings.LIVEDATA_EVENTS_SAFETY_LAG`` seconds before the request
+       are returned only by later requests.
+    """
     user_is_participant = \
         Q(submission__user__participant__contest_id=request.contest.id,
           submission__user__participant__status='ACTIVE')
@@ -94,23 +153,27 @@ def livedata_events_view(request, round_id):
                 int(request.GET['from'])).replace(tzinfo=utc)
         reports = reports.filter(creation_date__gte=start_time)
 
-    round = get_object_or_404(request.contest.round_set.all(), pk=round_id)
-    contest_start = round.start_date
-    reports = reports.filter(submission__problem_instance__round=round)
+    # Reports are ordered by their creation dates, but they become visible
+    # when their transactions are committed, possibly after later ones.
+    # Reports younger than the safety lag are held back until then.
+    settled = request.timestamp - datetime.timedelta(
+            seconds=settings.LIVEDATA_EVENTS_SAFETY_LAG)
+    reports = reports.filter(submission__problem_instance__round=round,
+                             creation_date__lte=settled) \
+        .order_by('creation_date', 'id')
+    if since is not None:
+        reports = _events_after(reports, since)[
+                :settings.LIVEDATA_EVENTS_PAGE_SIZE]
+    reports = list(reports)
+
     if is_contest_admin(request):
         freeze_time = None
     else:
         freeze_time = request.contest.controller.get_round_freeze_time(round)
 
-    return [{
-        'submissionId': 'START',
-        'reportId': 'START',
-        'teamId': 'START',
-        'taskId': 'START',
-        'submissionTimestamp': int(dateformat.format(request.timestamp, 'U')),
-        'judgingTimestamp': int(dateformat.format(contest_start, 'U')),
-        'result': 'CTRL',
-    }] + [{
+    emitted = [report for report in reports
+               if report.score_report is not None]
+    events = [{
         'submissionId': report.submission_id,
         'reportId': report.pk,
         'teamId': report.submission.user_id,
@@ -122,5 +185,99 @@ def livedata_events_view(request, round_id):
             report.score_report.status
             if freeze_time is None or report.submission.date < freeze_time
             else RESULT_FOR_FROZEN_SUBMISSION,
-    } for report in reports.order_by('creation_date')
-        if report.score_report is not None]
+    } for report in emitted]
+
+    # Settled reports without scores (e.g. of failed evaluations) won't get
+    # them, but the cursor is moved past them only when the page has no
+    # other events, so that it never passes a report which wasn't emitted.
+    if emitted:
+        cursor = _make_cursor(emitted[-1])
+    elif reports:
+        cursor = _make_cursor(reports[-1])
+    else:
+        cursor = since
+
+    if since is None:
+        events.insert(0, {
+            'submissionId': 'START',
+            'reportId': 'START',
+            'teamId': 'START',
+            'taskId': 'START',
+            'submissionTimestamp':
+                int(dateformat.format(request.timestamp, 'U')),
+            'judgingTimestamp': int(dateformat.format(round.start_date, 'U')),
+            'result': 'CTRL',
+        })
+        if cursor is None:
+            cursor = _make_cursor(SubmissionReport(id=0,
+                    creation_date=round.start_date))
+    return events, cursor
+
+
+@allow_cross_origin
+@add_header('Access-Control-Expose-Headers', CURSOR_HEADER)
+@enforce_condition(contest_exists & can_see_livedata)
+@cache_unless_admin_or_observer
+def livedata_events_view(request, round_id):
+    """Returns the events of the round.
+
+       If the ``since`` parameter is given, only the events following this
+       cursor are returned. The cursor pointing after the returned events
+       is sent in the ``X-Livedata-Cursor`` header.
+    """
+    round = get_object_or_404(request.contest.round_set.all(), pk=round_id)
+    events, cursor = _get_events(request, round, request.GET.get('since'))
+    response = HttpResponse(json.dumps(events),
+                            content_type='application/json')
+    response[CURSOR_HEADER] = cursor
+    return response
+
+
+def _event_stream(request, round, since):
+    deadline = time.time() + settings.LIVEDATA_STREAM_TIMEOUT
+    # Tells EventSource clients how long to wait before reconnecting.
+    yield 'retry: %d\n\n' % (settings.LIVEDATA_STREAM_POLL_INTERVAL * 1000)
+    while True:
+        events, cursor = _get_events(request, round, since)
+        if cursor != since:
+            if events:
+                yield 'id: %s\ndata: %s\n\n' % (cursor, json.dumps(events))
+            since = cursor
+            # There may be more than a page of new events.
+            continue
+        if time.time() >= deadline:
+            return
+        time.sleep(settings.LIVEDATA_STREAM_POLL_INTERVAL)
+
+
+@allow_cross_origin
+@enforce_condition(contest_exists & can_see_livedata)
+def livedata_events_stream_view(request, round_id):
+    """Server-sent events stream pushing the new events of the round.
+
+       Each message contains a list of events. Its id is the cursor pointing
+       after them, so reconnecting clients, which send it in the
+       ``Last-Event-ID`` header, receive only the events they haven't seen.
+       The starting cursor may also be given as the ``since`` parameter,
+       otherwise the stream starts with all the events, as returned by
+       :func:`livedata_events_view`.
+
+       The stream is closed after ``settings.LIVEDATA_STREAM_TIMEOUT``
+       seconds, and the clients are expected to reconnect.
+    """
+    round = get_object_or_404(request.contest.round_set.all(), pk=round_id)
+    since = request.META.get('HTTP_LAST_EVENT_ID') or \
+        request.GET.get('since')
+    if since is None:
+        events, since = _get_events(request, round)
+        prefix = ['id: %s\ndata: %s\n\n' % (since, json.dumps(events))]
+    else:
+        _parse_cursor(since)
+        prefix = []
+    response = StreamingHttpResponse(
+            itertools.chain(prefix, _event_stream(request, round, since)),
+            content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Disables buffering in nginx.
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,5 +1,6 @@
 from __future__ import print_function
 
+import time
 from optparse import make_option
 
 from django.contrib.auth.models import User
@@ -42,6 +43,7 @@ class Command(BaseCommand):
         self.validate_options(args, options)
 
         message = ' '.join(args)
+        contest = None
         if options['user']:
             try:
                 users = [User.objects.get(username=options['user'])]
@@ -63,7 +65,16 @@ class Command(BaseCommand):
         if options['popup']:
             arguments.update({'popup': True})
 
-        for user in users:
-            NotificationHandler.send_notification(
-                user, 'custom_notification', message, arguments)
-            print("Notification sent to", user.username)
+        if contest is not None:
+            users = list(users)
+            start = time.time()
+            NotificationHandler.broadcast_notification(
+                'contest_%s' % contest.id, users, 'custom_notification',
+                message, arguments)
+            print("Notification sent to %d participants in %.3fs"
+                  % (len(users), time.time() - start))
+        else:
+            for user in users:
+                NotificationHandler.send_notification(
+                    user, 'custom_notification', message, arguments)
+                print("Notification sent to", user.username)
@@ -10,6 +10,7 @@ from oioioi.base.utils.redirect import safe_redirect
 from oioioi.contests.controllers import (PastRoundsHiddenContestControllerMixin,
                                          PublicContestRegistrationController)
 from oioioi.contests.models import Submission, SubmissionReport
+from oioioi.contests.predicates import cached_predicate
 from oioioi.contests.utils import (can_see_personal_data, is_contest_admin,
                                    is_contest_observer)
 from oioioi.oi.models import OIRegistration
@@ -125,6 +126,7 @@ class OIContestController(ProgrammingContestController):
     def registration_controller(self):
         return OIRegistrationController(self.contest)
 
+    @cached_predicate(cross_request=True)
     def can_submit(self, request, problem_instance, check_round_times=True):
         if request.user.is_anonymous():
             return False
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 12:00
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import oioioi.base.fields
+import oioioi.filetracker.fields
+import oioioi.oireports.models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contests', '0011_submissionreport_creation_date_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GeneratedReport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation_date', models.DateTimeField(default=django.utils.timezone.now, verbose_name='creation date')),
+                ('kind', oioioi.base.fields.EnumField(choices=[(b'pdf', 'PDF'), (b'xml', 'XML')], max_length=64, verbose_name='kind')),
+                ('filename', models.CharField(max_length=255, verbose_name='file name')),
+                ('file', oioioi.filetracker.fields.FileField(blank=True, max_length=255, null=True, upload_to=oioioi.oireports.models._make_report_filename, verbose_name='file')),
+                ('status', oioioi.base.fields.EnumField(choices=[(b'?', 'Pending report'), (b'OK', 'Ready'), (b'ERR', 'Failed')], default=b'?', max_length=64, verbose_name='status')),
+                ('info', models.CharField(blank=True, max_length=1000, verbose_name='information')),
+                ('contest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contests.Contest', verbose_name='contest')),
+                ('creator', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='creator')),
+            ],
+            options={
+                'ordering': ['-creation_date'],
+                'verbose_name': 'generated report',
+                'verbose_name_plural': 'generated reports',
+            },
+        ),
+    ]
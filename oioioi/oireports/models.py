@@ -1,3 +1,97 @@
+import logging
+import os.path
+import shutil
+import tempfile
+
+import six
+from celery.task import task
+from django.contrib.auth.models import User
+from django.core.files.base import File
+from django.db import models
+from django.utils import timezone, translation
+from django.utils.text import get_valid_filename
+from django.utils.translation import pgettext_lazy
+from django.utils.translation import ugettext_lazy as _
+
+from oioioi.base.fields import EnumField, EnumRegistry
 from oioioi.base.utils.deps import check_django_app_dependencies
+from oioioi.contests.models import Contest
+from oioioi.filetracker.fields import FileField
+from oioioi.oireports.reports import generate_report
 
 check_django_app_dependencies(__name__, ['oioioi.oi'])
+
+logger = logging.getLogger(__name__)
+
+
+report_kinds = EnumRegistry()
+report_kinds.register('pdf', _("PDF"))
+report_kinds.register('xml', _("XML"))
+
+report_statuses = EnumRegistry()
+report_statuses.register('?', pgettext_lazy("Pending", "Pending report"))
+report_statuses.register('OK', _("Ready"))
+report_statuses.register('ERR', _("Failed"))
+
+
+def _make_report_filename(instance, filename):
+    return 'oireports/%s/%s' % (instance.contest.id,
+            get_valid_filename(os.path.basename(filename)))
+
+
+class GeneratedReport(models.Model):
+    """A PDF or XML report, generated in the background by
+       :func:`oireports_job`.
+    """
+    contest = models.ForeignKey(Contest, verbose_name=_("contest"))
+    creator = models.ForeignKey(User, null=True, blank=True,
+            verbose_name=_("creator"))
+    creation_date = models.DateTimeField(default=timezone.now,
+            verbose_name=_("creation date"))
+    kind = EnumField(report_kinds, verbose_name=_("kind"))
+    filename = models.CharField(max_length=255, verbose_name=_("file name"))
+    file = FileField(upload_to=_make_report_filename, null=True, blank=True,
+            verbose_name=_("file"))
+    status = EnumField(report_statuses, default='?',
+            verbose_name=_("status"))
+    info = models.CharField(max_length=1000, blank=True,
+            verbose_name=_("information"))
+
+    class Meta(object):
+        verbose_name = _("generated report")
+        verbose_name_plural = _("generated reports")
+        ordering = ['-creation_date']
+
+    def __unicode__(self):
+        return self.filename
+
+
+@task(ignore_result=True)
+def oireports_job(report_id, title, user_ids, test_groups, language):
+    """Generates the report with the given id.
+
+       :param test_groups: list of pairs of ids of problem instances and
+                           lists of names of test groups to include
+    """
+    try:
+        report = GeneratedReport.objects.get(id=report_id)
+    except GeneratedReport.DoesNotExist:
+        return logger.info("Report %s doesn't exist", report_id)
+
+    tmp_folder = tempfile.mkdtemp()
+    try:
+        with translation.override(language):
+            path = generate_report(report.kind, tmp_folder, title,
+                    report.creation_date, user_ids, dict(test_groups))
+        with open(path, 'rb') as f:
+            report.file.save(report.filename, File(f), save=False)
+        report.status = 'OK'
+    # pylint: disable=broad-except
+    except Exception as e:
+        logger.error("Generating report %s failed", report_id,
+                     exc_info=True)
+        report.status = 'ERR'
+        report.info = six.text_type(e)[:1000]
+    finally:
+        shutil.rmtree(tmp_folder)
+    report.save()
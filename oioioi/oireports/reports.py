@@ -0,0 +1,222 @@
+"""Generation of PDF and XML reports.
+
+   Reports are generated for batches of users at once, with a few queries
+   per batch, and rendered one user at a time to a file, so that reports
+   for whole regions don't have to be kept in memory.
+"""
+import codecs
+import itertools
+import logging
+import os.path
+import threading
+import time
+from collections import defaultdict
+from multiprocessing.pool import ThreadPool
+from operator import attrgetter  # pylint: disable=E0611
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.template.loader import get_template
+
+from oioioi.base.utils.pdf import compile_pdf
+from oioioi.contests.models import UserResultForProblem
+from oioioi.filetracker.client import new_client
+from oioioi.filetracker.storage import FiletrackerStorage
+from oioioi.programs.models import CompilationReport, GroupReport, TestReport
+
+logger = logging.getLogger(__name__)
+
+# Templates of the reports, rendered in parts: ``begin``, one ``row`` per
+# user and ``end``, or only ``empty`` if there's no one in the report.
+REPORT_TEMPLATES = {
+    'pdf': 'oireports/pdfreport-%s.tex',
+    'xml': 'oireports/xmlreport-%s.xml',
+}
+
+
+# Sources are read by many threads, each of which needs its own Filetracker
+# client.
+_thread_data = threading.local()
+
+
+def _thread_storage(storage):
+    if not isinstance(storage, FiletrackerStorage):
+        return storage
+    if not hasattr(_thread_data, 'client'):
+        _thread_data.client = new_client()
+    return FiletrackerStorage(prefix=storage.prefix,
+                              client=_thread_data.client)
+
+
+def _read_source(source_file):
+    f = _thread_storage(source_file.storage).open(source_file.name, 'rb')
+    try:
+        return f.read(), source_file.name
+    finally:
+        f.close()
+
+
+def _active_reports(model, submission_ids):
+    return model.objects \
+            .filter(submission_report__submission__in=submission_ids) \
+            .filter(submission_report__status='ACTIVE') \
+            .filter(submission_report__kind__in=['INITIAL', 'NORMAL']) \
+            .select_related('submission_report')
+
+
+def _serialize_batch(users, problem_instances, test_groups, pool):
+    """Generates dictionaries representing reports of ``users``, using
+       a constant number of queries. Source files are read concurrently
+       using ``pool``.
+    """
+    results = list(UserResultForProblem.objects
+            .filter(user__in=users,
+                    problem_instance__in=problem_instances,
+                    submission_report__isnull=False)
+            .select_related('problem_instance__problem',
+                    'submission_report__submission__programsubmission'))
+    submission_report_ids = [r.submission_report_id for r in results]
+    submission_ids = [r.submission_report.submission_id for r in results]
+
+    compilation_reports = dict((c.submission_report_id, c)
+            for c in CompilationReport.objects.filter(
+                submission_report__in=submission_report_ids))
+
+    test_reports = defaultdict(list)
+    for test in _active_reports(TestReport, submission_ids) \
+            .order_by('test__kind', 'test__order', 'test_name'):
+        test_reports[test.submission_report.submission_id].append(test)
+
+    group_reports = {}
+    for group in _active_reports(GroupReport, submission_ids):
+        group_reports[group.submission_report.submission_id, group.group] = \
+                group
+
+    sources = pool.map(_read_source,
+            [r.submission_report.submission.programsubmission.source_file
+             for r in results])
+
+    results_by_user = defaultdict(list)
+    for r, source in zip(results, sources):
+        results_by_user[r.user_id].append((r, source))
+
+    for user in users:
+        resultsets = []
+        total_score = None
+        for r, (code, codefile) in results_by_user[user.id]:
+            submission_id = r.submission_report.submission_id
+            group_names = set(test_groups[r.problem_instance_id])
+            tests = [t for t in test_reports[submission_id]
+                     if t.test_group in group_names]
+            groups = []
+            for group_name, group_tests in itertools.groupby(tests,
+                    attrgetter('test_group')):
+                groups.append({'tests': list(group_tests),
+                    'report': group_reports[submission_id, group_name]})
+
+            problem_score = None
+            max_problem_score = None
+            for group in groups:
+                group_score = group['report'].score
+                group_max_score = group['report'].max_score
+
+                if problem_score is None:
+                    problem_score = group_score
+                elif group_score is not None:
+                    problem_score += group_score
+
+                if max_problem_score is None:
+                    max_problem_score = group_max_score
+                elif group_max_score is not None:
+                    max_problem_score += group_max_score
+
+            resultsets.append(dict(
+                result=r,
+                score=problem_score,
+                max_score=max_problem_score,
+                compilation_report=compilation_reports.get(
+                    r.submission_report_id),
+                groups=groups,
+                code=code,
+                codefile=codefile
+            ))
+            if total_score is None:
+                total_score = problem_score
+            elif problem_score is not None:
+                total_score += problem_score
+        yield {
+            'user': user,
+            'resultsets': resultsets,
+            'sum': total_score,
+        }
+
+
+def serialize_reports(users, problem_instances, test_groups):
+    """Generates dictionaries representing reports of users with any
+       results, sorted by user's last name and first name.
+
+       :type users: queryset of :cls:`django.contrib.auth.User`
+       :param users: users to generate the reports for
+       :type problem_instances: list of
+                                 :cls:`oioioi.contests.ProblemInstance`
+       :param problem_instances: problem instances to include in the report
+       :type test_groups: dict(problem instance id -> list of str)
+       :param test_groups: dictionary mapping ids of problem instances into
+                           lists of names of test groups to include
+    """
+    users = list(users.order_by('last_name', 'first_name', 'username'))
+    batch_size = settings.OIREPORTS_BATCH_SIZE
+    pool = ThreadPool(settings.OIREPORTS_SOURCE_THREADS)
+    try:
+        for i in range(0, len(users), batch_size):
+            for row in _serialize_batch(users[i:i + batch_size],
+                    problem_instances, test_groups, pool):
+                if row['resultsets']:
+                    yield row
+    finally:
+        pool.close()
+        pool.join()
+
+
+def write_report(out, kind, context, rows):
+    """Renders the report to the file-like object ``out``, one row at
+       a time. Returns the number of rows.
+    """
+    template_name = REPORT_TEMPLATES[kind]
+    row_template = get_template(template_name % 'row')
+    count = 0
+    for row in rows:
+        if not count:
+            out.write(get_template(template_name % 'begin').render(context))
+        context['row'] = row
+        out.write(row_template.render(context))
+        count += 1
+    if count:
+        out.write(get_template(template_name % 'end').render(context))
+    else:
+        out.write(get_template(template_name % 'empty').render(context))
+    return count
+
+
+def generate_report(kind, tmp_folder, title, timestamp, user_ids,
+        test_groups):
+    """Generates a report of the given ``kind`` in ``tmp_folder`` and
+       returns the path of the file.
+
+       :param test_groups: dictionary mapping ids of problem instances into
+                           lists of names of test groups to include
+    """
+    start = time.time()
+    users = User.objects.filter(id__in=user_ids)
+    rows = serialize_reports(users, list(test_groups.keys()), test_groups)
+    context = {'title': title, 'timestamp': timestamp}
+
+    path = os.path.join(tmp_folder, 'report.tex' if kind == 'pdf'
+                        else 'report.xml')
+    with codecs.open(path, 'w', 'utf-8') as f:
+        count = write_report(f, kind, context, rows)
+    if kind == 'pdf':
+        path = compile_pdf(path)
+    logger.info("Generated %s report \"%s\" for %d users in %.1fs", kind,
+                title, count, time.time() - start)
+    return path
@@ -13,6 +13,7 @@ else:
 from oioioi.base.tests import TestCase, fake_time
 from oioioi.contests.models import Contest
 from oioioi.filetracker.tests import TestStreamingMixin
+from oioioi.oireports.models import GeneratedReport
 from oioioi.oireports.views import CONTEST_REPORT_KEY
 from oioioi.participants.models import Participant
 
@@ -31,6 +32,14 @@ class TestReportViews(TestCase, TestStreamingMixin):
         p = Participant(contest=contest, user=user, status='ACTIVE')
         p.save()
 
+    def _generate_report(self, url, post_vars):
+        response = self.client.post(url, post_vars)
+        self.assertRedirects(response, url)
+        report = GeneratedReport.objects.latest('id')
+        self.assertEqual(report.status, 'OK')
+        return self.client.get(reverse('oireports_download',
+            kwargs={'contest_id': report.contest_id, 'report_id': report.id}))
+
     def test_pdf_report_view(self):
         contest = Contest.objects.get()
         url = reverse('oireports', kwargs={'contest_id': contest.id})
@@ -50,7 +59,7 @@ class TestReportViews(TestCase, TestStreamingMixin):
 
         self.client.login(username='test_admin')
         with fake_time(datetime(2015, 8, 5, tzinfo=utc)):
-            response = self.client.post(url, post_vars)
+            response = self._generate_report(url, post_vars)
             pages = slate.PDF(StringIO(self.streamingContent(response)))
             self.assertIn("test_user", pages[0])
             self.assertIn("Wynik:34", pages[0])
@@ -77,7 +86,7 @@ class TestReportViews(TestCase, TestStreamingMixin):
 
         self.client.login(username='test_admin')
         with fake_time(datetime(2015, 8, 5, tzinfo=utc)):
-            response = self.client.post(url, post_vars)
+            response = self._generate_report(url, post_vars)
             content = self.streamingContent(response)
             self.assertIn("<user>Test User (test_user)", content)
             self.assertIn("<result>34</result>", content)
@@ -86,6 +95,19 @@ class TestReportViews(TestCase, TestStreamingMixin):
             self.assertIn("<testcomment>program exited with", content)
             self.assertNotIn("test_user2", content)
 
+        report = GeneratedReport.objects.get()
+        self.assertEqual(report.kind, 'xml')
+        self.assertEqual(report.filename, '%s-%s-%s.xml' % (contest.id,
+            CONTEST_REPORT_KEY, CONTEST_REPORT_KEY))
+        download_url = reverse('oireports_download',
+            kwargs={'contest_id': contest.id, 'report_id': report.id})
+        response = self.client.get(url)
+        self.assertContains(response, download_url)
+
+        self.client.login(username='test_user')
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, 403)
+
     def test_single_report(self):
         contest = Contest.objects.get()
         url = reverse('oireports', kwargs={'contest_id': contest.id})
@@ -100,7 +122,7 @@ class TestReportViews(TestCase, TestStreamingMixin):
 
         self.client.login(username='test_admin')
         with fake_time(datetime(2015, 8, 5, tzinfo=utc)):
-            response = self.client.post(url, post_vars)
+            response = self._generate_report(url, post_vars)
             content = self.streamingContent(response)
             self.assertNotIn('test_user2', content)
             self.assertIn('Strange, there is no one', content)
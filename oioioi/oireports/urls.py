@@ -4,6 +4,8 @@ from oioioi.oireports import views
 
 contest_patterns = [
     url(r'^oireports/$', views.oireports_view, name='oireports'),
+    url(r'^oireports/report/(?P<report_id>\d+)/$',
+        views.download_report_view, name='oireports_download'),
     url(r'^get_report_users/$', views.get_report_users_view,
         name='get_report_users'),
 ]
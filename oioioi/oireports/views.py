@@ -1,29 +1,30 @@
-import itertools
-from operator import attrgetter  # pylint: disable=E0611
-
+from django.contrib import messages
 from django.contrib.auth.models import User
 from django.core.exceptions import SuspiciousOperation
-from django.core.files.base import ContentFile
 from django.core.urlresolvers import reverse
-from django.template import RequestContext
-from django.template.loader import render_to_string
+from django.db import transaction
+from django.shortcuts import get_object_or_404, redirect
 from django.template.response import TemplateResponse
+from django.utils.translation import get_language
 from django.utils.translation import ugettext_lazy as _
 
 from oioioi.base.permissions import enforce_condition
-from oioioi.base.utils.pdf import generate_pdf
 from oioioi.base.utils.user_selection import get_user_hints_view
 from oioioi.contests.menu import contest_admin_menu_registry
-from oioioi.contests.models import Round, Submission, UserResultForProblem
+from oioioi.contests.models import Round, Submission
 from oioioi.contests.utils import (contest_exists, has_any_rounds,
                                    is_contest_admin)
 from oioioi.filetracker.utils import stream_file
 from oioioi.oireports.forms import CONTEST_REPORT_KEY, OIReportForm
+from oioioi.oireports.models import GeneratedReport, oireports_job
 from oioioi.participants.models import Region
-from oioioi.programs.models import CompilationReport, GroupReport, TestReport
 
 # FIXME conditions for views expressing oi dependence?
 
+# Number of recently generated reports listed on the report page.
+REPORTS_LIST_LENGTH = 10
+
+
 def _users_in_contest(request, region=None):
     queryset = User.objects.filter(participant__contest=request.contest,
         participant__status='ACTIVE')
@@ -39,6 +40,7 @@ def _users_in_contest(request, region=None):
     order=440)
 @enforce_condition(contest_exists & is_contest_admin)
 @enforce_condition(has_any_rounds, 'oireports/no-reports.html')
+@transaction.non_atomic_requests
 def oireports_view(request):
     if request.method == 'POST':
         form = OIReportForm(request, request.POST)
@@ -47,141 +49,26 @@ def oireports_view(request):
             form_type = form.cleaned_data['form_type']
 
             if form_type == 'pdf_report':
-                return generate_pdfreport(request, form)
+                _queue_report(request, form, 'pdf')
             elif form_type == 'xml_report':
-                return generate_xmlreport(request, form)
+                _queue_report(request, form, 'xml')
             else:
                 raise SuspiciousOperation
+            messages.success(request, _("Report queued for generation. "
+                "It will appear below when ready."))
+            return redirect('oireports', contest_id=request.contest.id)
     else:
         form = OIReportForm(request)
+    reports = GeneratedReport.objects.filter(contest=request.contest) \
+            .select_related('creator')[:REPORTS_LIST_LENGTH]
     return TemplateResponse(request, 'oireports/report-options.html', {
             'form': form,
+            'reports': reports,
             'CONTEST_REPORT_KEY': CONTEST_REPORT_KEY
     })
 
 
-def _render_report(request, template_name, title, users,
-        problem_instances, test_groups):
-    rows = _serialize_reports(users, problem_instances, test_groups)
-    return render_to_string(template_name,
-            context_instance=RequestContext(request, {
-                'rows': rows,
-                'title': title,
-            }))
-
-
-def _serialize_report(user, problem_instances, test_groups):
-    """Generates a dictionary representing a single report.
-
-
-       :param request: Django request
-       :type user: :cls:`django.contrib.auth.User`
-       :param user: user to generate the report for
-       :type problem_instances: list of
-                                 :cls:`oioioi.contests.ProblemInstance`
-       :param problem_instances: problem instances to include in the report
-       :type test_groups: dict(:cls:`oioioi.contests.ProblemInstance`
-                           -> list of str)
-       :param test_groups: dictionary mapping problem instances into lists
-                           of names of test groups to include
-    """
-
-    resultsets = []
-    total_score = None
-
-    results = UserResultForProblem.objects.filter(
-            user=user,
-            problem_instance__in=list(problem_instances),
-            submission_report__isnull=False)
-    for r in results:
-        problem_instance = r.problem_instance
-        submission_report = r.submission_report
-        submission = submission_report.submission
-        source_file = submission.programsubmission.source_file
-        groups = list(test_groups[problem_instance])
-
-        try:
-            compilation_report = CompilationReport.objects \
-                    .get(submission_report=submission_report)
-        except CompilationReport.DoesNotExist:
-            compilation_report = None
-
-        try:
-            test_reports = TestReport.objects \
-                    .filter(submission_report__submission=submission) \
-                    .filter(submission_report__status='ACTIVE') \
-                    .filter(submission_report__kind__in=['INITIAL',
-                                                         'NORMAL']) \
-                    .filter(test_group__in=groups) \
-                    .order_by('test__kind', 'test__order', 'test_name')
-        except TestReport.DoesNotExist:
-            test_reports = []
-
-        group_reports = GroupReport.objects \
-                .filter(submission_report__submission=submission) \
-                .filter(submission_report__status='ACTIVE') \
-                .filter(submission_report__kind__in=['INITIAL', 'NORMAL']) \
-                .filter(group__in=groups)
-        group_reports = dict((g.group, g) for g in group_reports)
-        groups = []
-        for group_name, tests in itertools.groupby(test_reports,
-                attrgetter('test_group')):
-            groups.append({'tests': list(tests),
-                'report': group_reports[group_name]})
-
-        problem_score = None
-        max_problem_score = None
-        for group in groups:
-            group_score = group['report'].score
-            group_max_score = group['report'].max_score
-
-            if problem_score is None:
-                problem_score = group_score
-            elif group_score is not None:
-                problem_score += group_score
-
-            if max_problem_score is None:
-                max_problem_score = group_max_score
-            elif group_max_score is not None:
-                max_problem_score += group_max_score
-
-        resultsets.append(dict(
-            result=r,
-            score=problem_score,
-            max_score=max_problem_score,
-            compilation_report=compilation_report,
-            groups=groups,
-            code=source_file.read(),
-            codefile=source_file.file.name
-        ))
-        source_file.close()
-        if total_score is None:
-            total_score = problem_score
-        elif problem_score is not None:
-            total_score += problem_score
-    return {
-        'user': user,
-        'resultsets': resultsets,
-        'sum': total_score,
-    }
-
-
-def _serialize_reports(users, problem_instances, test_groups):
-    """Runs :meth:`serialize_report` for a number of users.
-
-       Returns a list of objects produced by serialize_report, sorted
-       by user's last name and first name.
-    """
-    data = []
-    for user in users.order_by('last_name', 'first_name', 'username'):
-        user_data = _serialize_report(user, problem_instances,
-                test_groups)
-        if user_data['resultsets']:
-            data.append(user_data)
-    return data
-
-
-def _report_text(request, template_file, report_form):
+def _report_params(request, report_form):
     round_key = report_form.cleaned_data['report_round']
     if round_key == CONTEST_REPORT_KEY:
         round = None
@@ -206,33 +93,36 @@ def _report_text(request, template_file, report_form):
     else:
         users = _users_in_contest(request, region)
 
-    # Generate report
     testgroups = report_form.get_testgroups(request)
-    return _render_report(
-        request,
-        template_file,
-        title,
-        users,
-        list(testgroups.keys()),
-        testgroups
-    )
-
-
-def generate_pdfreport(request, report_form):
-    report = _report_text(request, 'oireports/pdfreport.tex', report_form)
-    filename = '%s-%s-%s.pdf' % (request.contest.id,
-            report_form.cleaned_data['report_round'],
-            report_form.cleaned_data['report_region'])
+    return {
+        'title': title,
+        'user_ids': list(users.values_list('id', flat=True)),
+        'test_groups': [(pi.id, groups)
+                        for pi, groups in testgroups.items()],
+        'language': get_language(),
+    }
+
 
-    return generate_pdf(report, filename)
+def _queue_report(request, report_form, kind):
+    filename = '%s-%s-%s.%s' % (request.contest.id,
+            report_form.cleaned_data['report_round'],
+            report_form.cleaned_data['report_region'], kind)
+    # The report must be saved in the database before the Celery task
+    # starts.
+    with transaction.atomic():
+        params = _report_params(request, report_form)
+        report = GeneratedReport.objects.create(contest=request.contest,
+                creator=request.user, creation_date=request.timestamp,
+                kind=kind, filename=filename)
+    oireports_job.delay(report.id, **params)
+    return report
 
 
-def generate_xmlreport(request, report_form):
-    report = _report_text(request, 'oireports/xmlreport.xml', report_form)
-    filename = '%s-%s-%s.xml' % (request.contest.id,
-        report_form.cleaned_data['report_round'],
-        report_form.cleaned_data['report_region'])
-    return stream_file(ContentFile(report.encode('utf-8')), filename)
+@enforce_condition(contest_exists & is_contest_admin)
+def download_report_view(request, report_id):
+    report = get_object_or_404(GeneratedReport, id=report_id,
+            contest=request.contest, status='OK')
+    return stream_file(report.file, report.filename)
 
 
 @enforce_condition(contest_exists & is_contest_admin)
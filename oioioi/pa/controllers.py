@@ -7,6 +7,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from oioioi.acm.controllers import ACMContestController
 from oioioi.base.utils.redirect import safe_redirect
+from oioioi.contests.predicates import cached_predicate
 from oioioi.contests.utils import (all_non_trial_public_results_visible,
                                    is_contest_admin, is_contest_observer)
 from oioioi.pa.models import PAProblemInstanceData, PARegistration
@@ -113,6 +114,7 @@ class PAContestController(ProgrammingContestController):
     def separate_public_results(self):
         return True
 
+    @cached_predicate(cross_request=True)
     def can_submit(self, request, problem_instance, check_round_times=True):
         if request.user.is_anonymous():
             return False
@@ -57,6 +57,7 @@ class PAScore(ScoreValue):
     """
 
     symbol = 'PA'
+    int_sort_key = True
 
     def __init__(self, points=None, distribution=None):
         if points:
@@ -102,5 +103,10 @@ class PAScore(ScoreValue):
     def _to_repr(self):
         return '%s;%s' % (self.points._to_repr(), self.distribution._to_repr())
 
+    def to_sort_key(self):
+        # Ties in points are resolved by distributions, which don't fit in
+        # an integer.
+        return self.points.to_sort_key()
+
     def to_int(self):
         return self.points.to_int()
@@ -14,6 +14,7 @@ from oioioi.contests.admin import (RoundTimeExtensionAdmin, SubmissionAdmin,
                                    contest_site)
 from oioioi.contests.menu import contest_admin_menu_registry
 from oioioi.contests.models import RoundTimeExtension
+from oioioi.contests.structure import invalidate_contest_structure
 from oioioi.contests.utils import is_contest_admin
 from oioioi.participants.forms import (ExtendRoundForm,
                                        ParticipantForm,
@@ -129,6 +130,7 @@ class ParticipantAdmin(admin.ModelAdmin):
                         extra_time=extra_time) for user in users
                         if not existing_extensions.filter(user=user).exists()]
                 RoundTimeExtension.objects.bulk_create(new_extensions)
+                invalidate_contest_structure(request.contest.id)
 
                 if existing_count:
                     if existing_count > 1:
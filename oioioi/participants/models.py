@@ -2,8 +2,12 @@ import six
 from django.contrib.auth.models import User
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.translation import ugettext_lazy as _
 
+from oioioi.base.cached_processors import (invalidate_processors,
+                                           user_actions_key)
 from oioioi.base.fields import EnumField, EnumRegistry
 from oioioi.base.utils.deps import check_django_app_dependencies
 from oioioi.base.utils.validators import validate_db_string_id
@@ -62,6 +66,14 @@ class Participant(models.Model):
         self.save()
 
 
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+def _invalidate_user_processors(sender, instance, **kwargs):
+    # Menus (and other cached values) of the user depend on whether
+    # they're a participant of the contest.
+    invalidate_processors(user_actions_key(instance.user_id))
+
+
 class Region(models.Model):
     short_name = models.CharField(max_length=10,
         validators=[validate_db_string_id])
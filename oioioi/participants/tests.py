@@ -7,6 +7,7 @@ from django.contrib.auth.models import User
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.urlresolvers import reverse
+from django.test import RequestFactory
 from django.test.utils import override_settings
 from django.utils.encoding import force_text
 from django.utils.timezone import utc
@@ -149,6 +150,32 @@ class TestParticipantsSubmit(TestCase, SubmitFileMixin):
             response = self.submit_file(contest, problem_instance)
             self._assertSubmitted(contest, response)
 
+    @override_settings(CONTROLLER_PREDICATES_CACHE_TIMEOUT=60)
+    def test_cached_submit_permissions(self):
+        contest = Contest.objects.get()
+        contest.controller_name = 'oioioi.oi.controllers.OIContestController'
+        contest.save()
+        Round.objects.filter(pk=1).update(
+                start_date=datetime(2012, 7, 31, tzinfo=utc),
+                end_date=datetime(2012, 8, 5, tzinfo=utc))
+        problem_instance = ProblemInstance.objects.get(pk=1)
+        user = User.objects.get(username='test_user')
+
+        def can_submit():
+            request = RequestFactory().request()
+            request.contest = Contest.objects.get()
+            request.user = user
+            request.timestamp = datetime(2012, 8, 4, 0, 5, tzinfo=utc)
+            return request.contest.controller.can_submit(request,
+                                                         problem_instance)
+
+        self.assertFalse(can_submit())
+        self.assertFalse(can_submit())
+        p = Participant.objects.create(contest=contest, user=user)
+        self.assertTrue(can_submit())
+        p.delete()
+        self.assertFalse(can_submit())
+
 
 class TestParticipantsRegistration(TestCase):
     fixtures = ['test_users', 'test_contest']
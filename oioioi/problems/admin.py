@@ -236,7 +236,7 @@ def pending_contest_packages(request):
 
 class ProblemPackageAdmin(admin.ModelAdmin):
     list_display = ['contest', 'problem_name', 'colored_status', 'package',
-            'created_by', 'creation_date', 'celery_task_id', 'info']
+            'created_by', 'creation_date', 'celery_task_id', 'package_info']
     list_filter = ['status', 'problem_name', 'contest', 'created_by']
     actions = ['delete_selected']  # This allows us to override the action
 
@@ -277,6 +277,12 @@ class ProblemPackageAdmin(admin.ModelAdmin):
     colored_status.short_description = _("Status")
     colored_status.admin_order_field = 'status'
 
+    def package_info(self, instance):
+        if instance.status == '?':
+            return instance.progress or instance.info
+        return instance.info
+    package_info.short_description = _("Package information")
+
     def package(self, instance):
         if instance.package_file:
             href = reverse(
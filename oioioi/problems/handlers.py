@@ -23,6 +23,10 @@ def update_problem_instance(env):
          be attached to.
 
          ``is_reupload``: set on True when problem is being reuploaded
+
+         ``needs_rejudge``: (Optional) set on False by the package backend
+         when the reuploaded package doesn't change anything which affects
+         judging
     """
     problem = Problem.objects.get(id=env['problem_id'])
     if env.get('contest_id', None):
@@ -35,16 +39,18 @@ def update_problem_instance(env):
             pi.save()
             env['problem_instance_id'] = pi.id
     if env['is_reupload']:
-        update_all_probleminstances_after_reupload(problem)
+        update_all_probleminstances_after_reupload(problem,
+                env.get('needs_rejudge', True))
 
     return env
 
 
-def update_all_probleminstances_after_reupload(problem):
+def update_all_probleminstances_after_reupload(problem, needs_rejudge=True):
     """Updates test_set for every problem_instance assiged to Problem.
        to main_problem_instance.test_set
     """
     for pi in problem.probleminstance_set.filter(contest__isnull=False):
         update_tests_from_main_pi(pi)
-        pi.needs_rejudge = True
+        if needs_rejudge:
+            pi.needs_rejudge = True
         pi.save()
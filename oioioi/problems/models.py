@@ -7,6 +7,7 @@ from unidecode import unidecode
 import six
 from django.contrib.auth.models import User
 from django.core import validators
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.core.validators import validate_slug
 from django.db import models, transaction
@@ -254,6 +255,21 @@ class ProblemPackage(models.Model):
         verbose_name_plural = _("problem packages")
         ordering = ['-creation_date']
 
+    def _progress_key(self):
+        return 'problem_package_progress:%d' % self.id
+
+    def set_progress(self, progress):
+        """Sets a message describing the progress of processing the
+           package. As the package is processed in a transaction, the message
+           is kept in the cache, so that it's visible before the transaction
+           is committed.
+        """
+        cache.set(self._progress_key(), six.text_type(progress), 24 * 3600)
+
+    @property
+    def progress(self):
+        return cache.get(self._progress_key())
+
     class StatusSaver(object):
         def __init__(self, package):
             self.package_id = package.id
@@ -263,6 +279,7 @@ class ProblemPackage(models.Model):
 
         def __exit__(self, type, value, traceback):
             package = ProblemPackage.objects.get(id=self.package_id)
+            cache.delete(package._progress_key())
             if type:
                 package.status = 'ERR'
                 # Truncate error so it doesn't take up whole page in list
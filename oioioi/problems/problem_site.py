@@ -11,7 +11,7 @@ from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
 
 from oioioi.base.menu import OrderedRegistry
-from oioioi.contests.controllers import submission_template_context
+from oioioi.contests.controllers import submission_template_contexts
 from oioioi.contests.forms import SubmissionFormForProblemInstance
 from oioioi.contests.models import Submission
 from oioioi.problems.models import Problem, ProblemAttachment
@@ -104,7 +104,7 @@ def problem_site_submissions(request, problem):
     else:
         qs = []
 
-    submissions = [submission_template_context(request, s) for s in qs]
+    submissions = submission_template_contexts(request, qs)
     show_scores = any(s['can_see_score'] for s in submissions)
 
     return TemplateResponse(request, 'problems/submissions.html',
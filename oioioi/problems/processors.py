@@ -1,67 +1,76 @@
-import six
 from django.conf import settings
 from django.core.urlresolvers import reverse
-from django.utils.functional import lazy
 from django.utils.translation import ungettext
 
+from oioioi.base.cached_processors import cached_processor
 from oioioi.base.utils import make_navbar_badge
 from oioioi.contests.models import ProblemInstance
+from oioioi.contests.structure import contest_version
 from oioioi.contests.utils import is_contest_admin
 from oioioi.problems.utils import can_add_to_problemset
 
 
+@cached_processor(key=lambda request: (request.contest.id,
+        contest_version(request.contest.id)))
+def _dangling_problem_instances(request):
+    """Returns the number of problem instances of the current contest
+       without rounds, and the id of one of them.
+    """
+    dangling_pis = list(ProblemInstance.objects.filter(
+            contest=request.contest, round__isnull=True)
+            .values_list('id', flat=True))
+    return len(dangling_pis), (dangling_pis[0] if dangling_pis else None)
+
+
 def dangling_problems_processor(request):
     if not getattr(request, 'contest', None):
         return {}
     if not is_contest_admin(request):
         return {}
 
-    def generator():
-        dangling_pis = ProblemInstance.objects.filter(contest=request.contest,
-                round__isnull=True)
-        count = dangling_pis.count()
-        if not count:
-            return ''
-        elif count == 1:
-            pi = dangling_pis.get()
-            link = reverse('oioioiadmin:contests_probleminstance_change',
-                        args=(pi.id,))
-            if request.path == link:
-                return ''
-        else:
-            link = reverse('oioioiadmin:contests_probleminstance_changelist')
-        text = ungettext('%(count)d PROBLEM WITHOUT ROUND',
-                '%(count)d PROBLEMS WITHOUT ROUNDS',
-                count) % {'count': count}
-        return make_navbar_badge(link, text)
-    return {'extra_navbar_right_dangling_problems': lazy(generator,
-            six.text_type)()}
+    count, pi_id = _dangling_problem_instances(request)
+    if not count:
+        return {}
+    elif count == 1:
+        link = reverse('oioioiadmin:contests_probleminstance_change',
+                    args=(pi_id,))
+        if request.path == link:
+            return {}
+    else:
+        link = reverse('oioioiadmin:contests_probleminstance_changelist')
+    text = ungettext('%(count)d PROBLEM WITHOUT ROUND',
+            '%(count)d PROBLEMS WITHOUT ROUNDS',
+            count) % {'count': count}
+    return {'extra_navbar_right_dangling_problems':
+                make_navbar_badge(link, text)}
 
 
 def problemset_link_visible_processor(request):
     return {'is_problemset_link_visible': settings.PROBLEMSET_LINK_VISIBLE}
 
 
+@cached_processor(key=lambda request: (request.contest.id,
+        contest_version(request.contest.id)))
+def _problem_instances_to_rejudge(request):
+    return ProblemInstance.objects.filter(contest=request.contest,
+            needs_rejudge=True).count()
+
+
 def problems_need_rejudge_processor(request):
     if not getattr(request, 'contest', None):
         return {}
     if not is_contest_admin(request):
         return {}
 
-    def generator():
-        pis = ProblemInstance.objects.filter(contest=request.contest,
-                needs_rejudge=True)
-        count = pis.count()
-        if not count:
-            return ''
-        else:
-            link = reverse('oioioiadmin:contests_probleminstance_changelist')
-        text = ungettext("%(count)d PROBLEM NEEDS REJUDGING",
-                "%(count)d PROBLEMS NEED REJUDGING",
-                count) % {'count': count}
-        return make_navbar_badge(link, text)
+    count = _problem_instances_to_rejudge(request)
+    if not count:
+        return {}
+    link = reverse('oioioiadmin:contests_probleminstance_changelist')
+    text = ungettext("%(count)d PROBLEM NEEDS REJUDGING",
+            "%(count)d PROBLEMS NEED REJUDGING",
+            count) % {'count': count}
     return {'extra_navbar_right_not_rejudged_problems':
-                lazy(generator, six.text_type)()}
+                make_navbar_badge(link, text)}
 
 
 def can_add_to_problemset_processor(request):
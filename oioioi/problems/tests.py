@@ -30,6 +30,8 @@ from oioioi.problems.models import (Problem, ProblemAttachment, ProblemPackage,
 from oioioi.problems.package import ProblemPackageBackend
 from oioioi.problems.problem_site import problem_site_tab
 from oioioi.problems.problem_sources import UploadedPackageSource
+from oioioi.problems.utils import (get_new_problem_instance,
+                                   update_tests_from_main_pi)
 from oioioi.programs.controllers import ProgrammingContestController
 
 
@@ -55,6 +57,27 @@ class TestModels(TestCase):
                 'problems/12/hej.txt')
 
 
+class TestUpdateTestsFromMainProblemInstance(TestCase):
+    fixtures = ['test_contest', 'test_full_package',
+                'test_problem_instance']
+
+    def test_tests_kept(self):
+        problem = Problem.objects.get()
+        pi = get_new_problem_instance(problem, Contest.objects.get())
+        test_ids = dict(pi.test_set.values_list('name', 'id'))
+        self.assertEqual(len(test_ids), 6)
+
+        main_tests = Problem.objects.get().main_problem_instance.test_set
+        main_tests.filter(name='0').update(time_limit=1234)
+        main_tests.filter(name='3').delete()
+        update_tests_from_main_pi(pi)
+
+        self.assertEqual(dict(pi.test_set.values_list('name', 'id')),
+                         dict((name, test_id) for name, test_id
+                              in test_ids.items() if name != '3'))
+        self.assertEqual(pi.test_set.get(name='0').time_limit, 1234)
+
+
 class TestProblemViews(TestCase, TestStreamingMixin):
     fixtures = ['test_users', 'test_contest', 'test_full_package',
             'test_problem_instance', 'test_permissions']
@@ -354,6 +377,21 @@ class TestProblemPackageAdminView(TestCase):
         # Not visible, because the problem instances's contest is 'c', not 'c1'
         self.assertNotIn('Model solutions', response.content)
 
+    def test_progress(self):
+        package = ProblemPackage.objects.filter(status='OK').first()
+        package.status = '?'
+        package.save()
+        package.set_progress("Uploaded 3 of 10 test files")
+
+        self.client.login(username='test_admin')
+        url = reverse('oioioiadmin:problems_problempackage_changelist')
+        response = self.client.get(url)
+        self.assertIn("Uploaded 3 of 10 test files", response.content)
+
+        with package.save_operation_status():
+            pass
+        self.assertIsNone(package.progress)
+
 
 class TestProblemPackageViews(TestCase, TestStreamingMixin):
     fixtures = ['test_users', 'test_contest', 'test_problem_packages',
@@ -2067,3 +2105,25 @@ class TestSubmissionLeftWhenNoContest(TestCase):
 
     def test_not_authenticated_user(self):
         assert get_submission_left(None, None) is None
+
+
+class TestNavbarBadges(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+                'test_problem_instance']
+
+    def test_dangling_problems_badge(self):
+        self.assertTrue(self.client.login(username='test_admin'))
+        url = reverse('problems_list', kwargs={'contest_id': 'c'})
+        response = self.client.get(url)
+        self.assertNotIn('PROBLEM WITHOUT ROUND', response.content)
+
+        pi = ProblemInstance.objects.get()
+        pi.round = None
+        pi.save()
+        response = self.client.get(url)
+        self.assertIn('1 PROBLEM WITHOUT ROUND', response.content)
+
+        pi.needs_rejudge = True
+        pi.save()
+        response = self.client.get(url)
+        self.assertIn('1 PROBLEM NEEDS REJUDGING', response.content)
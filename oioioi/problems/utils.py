@@ -117,19 +117,24 @@ def query_zip(statement, path):
 
 
 def update_tests_from_main_pi(problem_instance):
-    """Deletes all tests assigned to problem_instance
-        and replaces them by new ones copied from
-        main_problem_instance of appropiate Problem
+    """Makes the tests assigned to problem_instance copies of the tests of
+        main_problem_instance of appropiate Problem.
+
+        Tests with the same names are updated in place, so that test
+        reports of judged submissions still refer to them.
     """
     if problem_instance == problem_instance.problem.main_problem_instance:
         return
-    for test in problem_instance.test_set.all():
-        test.delete()
+    existing = dict((test.name, test)
+                    for test in problem_instance.test_set.all())
     for test in problem_instance.problem.main_problem_instance.test_set.all():
-        test.id = None
-        test.pk = None
+        old_test = existing.pop(test.name, None)
+        test.id = old_test.id if old_test is not None else None
+        test.pk = test.id
         test.problem_instance = problem_instance
         test.save()
+    for test in existing.values():
+        test.delete()
 
 
 def get_new_problem_instance(problem, contest=None):
@@ -0,0 +1,278 @@
+"""Cache of compiled executables.
+
+   Compiling identical sources with the same compiler, arguments and extra
+   files gives identical executables, so each of them is compiled only once.
+   This matters mostly for rejudges, when every submission of a problem is
+   compiled again.
+
+   Executables are stored in filetracker under :data:`CACHE_DIR`. The least
+   recently used ones are removed when their total size exceeds
+   ``settings.COMPILATION_CACHE_MAX_SIZE``.
+
+   A compilation in progress is represented by an entry which is not
+   ``ready``. Jobs compiling the same source in the meantime wait for it
+   instead of compiling it again (see :func:`wait_for_compilation`).
+   If the compilation doesn't finish within
+   ``settings.COMPILATION_CACHE_PENDING_TIMEOUT`` seconds (e.g. because its
+   job was lost), the waiting jobs are resumed to compile the source
+   themselves, either when the entry is taken over by :func:`claim` or by
+   :func:`release_stale_compilations`.
+"""
+import hashlib
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from oioioi.evalmgr.tasks import delay_environ
+from oioioi.filetracker.client import get_client
+from oioioi.programs.models import CompilationCacheEntry, CompilationWaiter
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = '/compilation-cache'
+
+# Fields of a compile job, other than the source, which affect the
+# executable.
+_KEY_FIELDS = ('compiler', 'language', 'extra_compilation_args',
+               'extra_files')
+
+# Result passed to jobs waiting for a compilation which failed for reasons
+# other than the source, e.g. a system error. They compile the source
+# themselves.
+RETRY_RESULT = {'compilation_cache_retry': True}
+
+_CHUNK_SIZE = 65536
+
+
+def is_enabled():
+    return getattr(settings, 'COMPILATION_CACHE_ENABLED', False)
+
+
+def _hash_stream(stream):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b''):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_local_file(filename):
+    with open(filename, 'rb') as f:
+        return _hash_stream(f)
+
+
+def hash_filetracker_file(path):
+    reader, _version = get_client().get_stream(path)
+    try:
+        return _hash_stream(reader)
+    finally:
+        reader.close()
+
+
+def compilation_key(job, source_hash, archive_hash=None):
+    """Returns the key identifying the executable produced by the compile
+       job ``job``, given the hash of its source and of its
+       ``additional_archive``.
+    """
+    data = dict((field, job.get(field)) for field in _KEY_FIELDS)
+    data['source'] = source_hash
+    data['additional_archive'] = archive_hash
+    return hashlib.sha256(
+        json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def cache_file_name(key):
+    return '%s/%s.e' % (CACHE_DIR, key)
+
+
+def is_cached_file(path):
+    """Checks whether the executable is owned by the cache, in which case it
+       must not be deleted by the job which used it.
+    """
+    return bool(path) and path.startswith(CACHE_DIR + '/')
+
+
+def delete_executable(path):
+    if not is_cached_file(path):
+        get_client().delete_file(path)
+
+
+def _entry_result(entry):
+    return {
+        'result_code': 'OK',
+        'out_file': entry.out_file,
+        'compiler_output': entry.compiler_output,
+        'exec_info': json.loads(entry.exec_info),
+    }
+
+
+def _waiter_result(result):
+    # Compilation errors depend only on the source.
+    if result.get('result_code') in ('OK', 'CE'):
+        return result
+    return RETRY_RESULT
+
+
+def _resume(job_id, saved_environ_id, result):
+    delay_environ({
+        'job_id': job_id,
+        'saved_environ_id': saved_environ_id,
+        'workers_jobs.results': {'compile': result},
+    })
+
+
+def _resume_waiters(entry, result):
+    for waiter in entry.waiters.all():
+        _resume(waiter.job_id, waiter.saved_environ_id, result)
+    entry.waiters.all().delete()
+
+
+def _stale_before():
+    return timezone.now() - \
+        timedelta(seconds=settings.COMPILATION_CACHE_PENDING_TIMEOUT)
+
+
+def claim(key):
+    """Looks up the executable with the given key.
+
+       Returns a pair ``(result, owner)``. If the executable is ready,
+       ``result`` is the result of its compile job. Otherwise it is ``None``
+       and ``owner`` tells whether the caller should compile it to
+       :func:`cache_file_name` and then call :func:`finish`, or whether
+       someone else is compiling it already.
+
+       Compilations which haven't finished within
+       ``settings.COMPILATION_CACHE_PENDING_TIMEOUT`` seconds are taken over,
+       and the jobs waiting for them are resumed to compile their sources
+       themselves.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        entry, created = CompilationCacheEntry.objects \
+            .select_for_update().get_or_create(key=key,
+                    defaults={'out_file': cache_file_name(key)})
+        if created:
+            return None, True
+        if entry.ready:
+            entry.last_used = now
+            entry.save(update_fields=['last_used'])
+            return _entry_result(entry), False
+        if entry.last_used < _stale_before():
+            _resume_waiters(entry, RETRY_RESULT)
+            entry.last_used = now
+            entry.save(update_fields=['last_used'])
+            return None, True
+        return None, False
+
+
+def finish(key, result):
+    """Stores the result of the compilation claimed with :func:`claim` and
+       resumes the jobs waiting for it.
+
+       Executables which failed to compile are not cached.
+    """
+    with transaction.atomic():
+        entry = CompilationCacheEntry.objects.select_for_update() \
+            .filter(key=key).first()
+        if entry is None:
+            return
+        _resume_waiters(entry, _waiter_result(result))
+        if result.get('result_code') == 'OK':
+            try:
+                entry.size = get_client().file_size(entry.out_file)
+            # pylint: disable=broad-except
+            except Exception:
+                logger.warning("Failed to get the size of %s",
+                               entry.out_file, exc_info=True)
+            entry.ready = True
+            entry.compiler_output = result.get('compiler_output', '')
+            entry.exec_info = json.dumps(result.get('exec_info', {}))
+            entry.last_used = timezone.now()
+            entry.save()
+        else:
+            entry.delete()
+    release_stale_compilations()
+    if result.get('result_code') == 'OK':
+        evict()
+
+
+def release_stale_compilations():
+    """Gives up the compilations which haven't finished within
+       ``settings.COMPILATION_CACHE_PENDING_TIMEOUT`` seconds, and resumes
+       the jobs waiting for them, which then compile their sources
+       themselves.
+
+       It's called whenever a compilation finishes, and by the
+       ``release_stale_compilations`` management command.
+    """
+    stale_ids = list(CompilationCacheEntry.objects
+                     .filter(ready=False, last_used__lt=_stale_before())
+                     .values_list('id', flat=True))
+    for entry_id in stale_ids:
+        with transaction.atomic():
+            # The entry could have been taken over since it was read.
+            entry = CompilationCacheEntry.objects.select_for_update() \
+                .filter(id=entry_id, ready=False,
+                        last_used__lt=_stale_before()).first()
+            if entry is None:
+                continue
+            logger.warning("Compilation %s hasn't finished in time, "
+                           "resuming the jobs waiting for it", entry.key)
+            _resume_waiters(entry, RETRY_RESULT)
+            entry.delete()
+
+
+def wait_for_compilation(environ, key):
+    """Transfer function of jobs compiling a source which is being compiled
+       by another job. The job is resumed by :func:`finish`, or right away
+       if the compilation has finished in the meantime.
+
+       The job's ``workers_jobs.results`` are set as if it compiled the
+       source itself. Use with :func:`oioioi.sioworkers.handlers.restore_job`.
+    """
+    with transaction.atomic():
+        entry = CompilationCacheEntry.objects.select_for_update() \
+            .filter(key=key).first()
+        if entry is not None and not entry.ready:
+            CompilationWaiter.objects.create(entry=entry,
+                    job_id=environ['job_id'],
+                    saved_environ_id=environ['saved_environ_id'])
+            return
+        result = _entry_result(entry) if entry is not None else RETRY_RESULT
+        _resume(environ['job_id'], environ['saved_environ_id'], result)
+
+
+def evict():
+    """Removes the least recently used executables until their total size
+       is at most ``settings.COMPILATION_CACHE_MAX_SIZE``.
+
+       Executables used in the last ``settings.COMPILATION_CACHE_MIN_AGE``
+       seconds are kept, as jobs which use them may still be running.
+    """
+    max_size = settings.COMPILATION_CACHE_MAX_SIZE
+    ready = CompilationCacheEntry.objects.filter(ready=True)
+    total = ready.aggregate(total=Sum('size'))['total'] or 0
+    if total <= max_size:
+        return
+    used_after = timezone.now() - \
+        timedelta(seconds=settings.COMPILATION_CACHE_MIN_AGE)
+    candidates = ready.filter(last_used__lt=used_after).order_by('last_used')
+    for entry in candidates.iterator():
+        if total <= max_size:
+            break
+        # The entry could have been used since it was read.
+        deleted, _rows = CompilationCacheEntry.objects.filter(id=entry.id,
+                last_used=entry.last_used).delete()
+        if not deleted:
+            continue
+        total -= entry.size
+        try:
+            get_client().delete_file(entry.out_file)
+        # pylint: disable=broad-except
+        except Exception:
+            logger.warning("Failed to delete %s from the compilation cache",
+                           entry.out_file, exc_info=True)
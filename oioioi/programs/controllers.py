@@ -15,7 +15,8 @@ from django.utils.translation import ugettext_lazy as _
 
 from oioioi.base.utils.inputs import narrow_input_field
 from oioioi.contests.controllers import (ContestController,
-                                         submission_template_context)
+                                         submission_template_context,
+                                         submission_template_contexts)
 from oioioi.contests.models import ScoreReport, SubmissionReport
 from oioioi.contests.utils import is_contest_admin, is_contest_observer
 from oioioi.evalmgr.tasks import (add_before_placeholder,
@@ -91,8 +92,12 @@ class ProgrammingProblemController(ProblemController):
                 ('delete_executable',
                     'oioioi.programs.handlers.delete_executable'),
             ])
-        environ.setdefault('error_handlers', []).append((
-            'delete_executable', 'oioioi.programs.handlers.delete_executable'))
+        environ.setdefault('error_handlers', []).extend([
+            ('delete_executable',
+                'oioioi.programs.handlers.delete_executable'),
+            ('release_compilation_cache',
+                'oioioi.programs.handlers.release_compilation_cache'),
+        ])
 
         if getattr(settings, 'USE_UNSAFE_EXEC', False):
             environ['exec_mode'] = 'unsafe'
@@ -778,8 +783,8 @@ class ProgrammingContestController(ContestController):
         return super_footer + render_to_string(
                 'programs/other_submissions.html',
                 context_instance=RequestContext(request, {
-                        'submissions': [submission_template_context(request, s)
-                                 for s in queryset],
+                        'submissions':
+                            submission_template_contexts(request, queryset),
                         'show_scores': show_scores,
                         'can_admin': can_admin,
                         'main_submission_id': submission.id,
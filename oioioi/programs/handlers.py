@@ -18,6 +18,7 @@ from oioioi.evalmgr.tasks import transfer_job
 from oioioi.filetracker.client import get_client
 from oioioi.filetracker.utils import (django_to_filetracker_path,
                                       filetracker_to_django_file)
+from oioioi.programs import compilation_cache, test_result_cache
 from oioioi.programs.models import (CompilationReport, GroupReport, Test,
                                     TestReport, UserOutGenStatus)
 
@@ -83,6 +84,10 @@ def compile(env, **kwargs):
             binary path
           * env['compilation_message'] - contains compiler stdout and stderr
           * env['exec_info'] - information how to execute the compiled file
+
+       Executables are taken from the compilation cache if possible (see
+       :mod:`oioioi.programs.compilation_cache`), in which case
+       env['compiled_file'] belongs to the cache and is not deleted.
     """
 
     compilation_job = env.copy()
@@ -91,6 +96,24 @@ def compile(env, **kwargs):
     compilation_job['out_file'] = _make_filename(env, 'exe')
     if 'language' in env and 'compiler' not in env:
         compilation_job['compiler'] = 'default-' + env['language']
+    use_compilation_cache = compilation_cache.is_enabled() \
+            and not env.get('compilation_cache_disabled')
+    if use_compilation_cache or test_result_cache.is_enabled():
+        key = compilation_cache.compilation_key(compilation_job,
+                compilation_cache.hash_filetracker_file(env['source_file']))
+        env['compilation_key'] = key
+    if use_compilation_cache:
+        result, owner = compilation_cache.claim(key)
+        if result is not None:
+            env['workers_jobs.results'] = {'compile': result}
+            return env
+        if not owner:
+            return transfer_job(env,
+                    'oioioi.programs.compilation_cache.wait_for_compilation',
+                    'oioioi.sioworkers.handlers.restore_job',
+                    transfer_kwargs={'key': key})
+        env['compilation_cache_key'] = key
+        compilation_job['out_file'] = compilation_cache.cache_file_name(key)
     env['workers_jobs'] = {'compile': compilation_job}
     return transfer_job(env,
             'oioioi.sioworkers.handlers.transfer_job',
@@ -99,6 +122,14 @@ def compile(env, **kwargs):
 
 def compile_end(env, **kwargs):
     new_env = env['workers_jobs.results']['compile']
+    if new_env.get('compilation_cache_retry'):
+        # The job we waited for failed, so compile the source ourselves.
+        env['recipe'].insert(0,
+                ('compile_end', 'oioioi.programs.handlers.compile_end'))
+        env['compilation_cache_disabled'] = True
+        return compile(env)
+    if 'compilation_cache_key' in env:
+        compilation_cache.finish(env.pop('compilation_cache_key'), new_env)
     env['compiled_file'] = new_env.get('out_file')
     env['compilation_message'] = new_env.get('compiler_output', '')
     env['compilation_result'] = new_env.get('result_code', 'CE')
@@ -221,6 +252,11 @@ def run_tests(env, kind=None, **kwargs):
                ``env['save_outputs']`` was set)
 
            If the dictionary already exists, new test results are appended.
+
+       If the test result cache is enabled (see
+       :mod:`oioioi.programs.test_result_cache`), only tests whose results
+       are not cached are run. This requires ``compilation_key`` to be set by
+       :func:`compile`.
     """
     jobs = dict()
     not_to_judge = []
@@ -249,19 +285,52 @@ def run_tests(env, kind=None, **kwargs):
         job['untrusted_checker'] = env['untrusted_checker']
         jobs[test_name] = job
     extra_args = env.get('sioworkers_extra_args', {}).get(kind, {})
+    env['workers_jobs.not_to_judge'] = not_to_judge
+    if test_result_cache.is_enabled() and 'compilation_key' in env \
+            and not env.get('save_outputs'):
+        jobs = _use_cached_test_results(env, jobs, extra_args)
+        if not jobs:
+            env['workers_jobs.results'] = {}
+            return env
     env['workers_jobs'] = jobs
     env['workers_jobs.extra_args'] = extra_args
-    env['workers_jobs.not_to_judge'] = not_to_judge
     return transfer_job(env,
             'oioioi.sioworkers.handlers.transfer_job',
             'oioioi.sioworkers.handlers.restore_job')
 
 
+def _use_cached_test_results(env, jobs, extra_args):
+    """Puts the cached results of ``jobs`` in ``env['test_results']``.
+       Returns the jobs which have to be run.
+    """
+    keys = dict((test_name, test_result_cache.test_key(
+                     env['compilation_key'], job, extra_args))
+                for test_name, job in six.iteritems(jobs))
+    cached = test_result_cache.get_results(keys.values())
+    env.setdefault('test_results', {})
+    for test_name, key in list(keys.items()):
+        if key in cached:
+            result = jobs.pop(test_name)
+            result.update(cached[key])
+            env['test_results'].setdefault(test_name, {}).update(result)
+            del keys[test_name]
+    env['test_result_cache.keys'] = keys
+    rejudge_id = env['extra_args'].get('rejudge_id')
+    if rejudge_id:
+        test_result_cache.record_usage(rejudge_id, len(cached), len(jobs))
+    return jobs
+
+
 @_skip_on_compilation_error
 def run_tests_end(env, **kwargs):
     not_to_judge = env['workers_jobs.not_to_judge']
     del env['workers_jobs.not_to_judge']
     jobs = env['workers_jobs.results']
+    cache_keys = env.pop('test_result_cache.keys', None)
+    if cache_keys:
+        test_result_cache.store_results(dict((cache_keys[test_name], result)
+                for test_name, result in six.iteritems(jobs)
+                if test_name in cache_keys))
     env.setdefault('test_results', {})
     for test_name, result in six.iteritems(jobs):
         env['test_results'].setdefault(test_name, {}).update(result)
@@ -294,6 +363,15 @@ def grade_tests(env, **kwargs):
     fun = import_string(env.get('test_scorer')
             or settings.DEFAULT_TEST_SCORER)
     tests = env['tests']
+    not_judged = [test_name for test_name in env['test_results']
+                  if not tests[test_name]['to_judge']]
+    previous_reports = {}
+    if not_judged:
+        previous_reports = {report.test_name: report for report in
+                TestReport.objects.filter(
+                    submission_report__submission__id=env['submission_id'],
+                    submission_report__status='ACTIVE',
+                    test_name__in=not_judged)}
     for test_name, test_result in six.iteritems(env['test_results']):
         if tests[test_name]['to_judge']:
             score, max_score, status = fun(tests[test_name], test_result)
@@ -303,10 +381,10 @@ def grade_tests(env, **kwargs):
             test_result['max_score'] = max_score and max_score.serialize()
             test_result['status'] = status
         else:
-            report = TestReport.objects.get(
-                submission_report__submission__id=env['submission_id'],
-                submission_report__status='ACTIVE',
-                test_name=test_name)
+            report = previous_reports.get(test_name)
+            if report is None:
+                raise TestReport.DoesNotExist("No active report of test %s"
+                                              % test_name)
             score = report.score
             max_score = IntegerScore(report.test_max_score)
             status = report.status
@@ -460,6 +538,22 @@ def _make_base_report(env, submission, kind):
     return submission, submission_report
 
 
+def _bulk_create_reports(model, submission_report, reports, key_field):
+    """Saves reports of a new ``submission_report`` with a single INSERT.
+
+       Returns a dict mapping values of ``key_field`` to ids of the saved
+       reports. If the database can't return the ids from the INSERT, they
+       are fetched with one more query.
+    """
+    if not reports:
+        return {}
+    model.objects.bulk_create(reports)
+    if all(report.pk is not None for report in reports):
+        return {getattr(report, key_field): report.pk for report in reports}
+    return dict(model.objects.filter(submission_report=submission_report)
+                .values_list(key_field, 'id'))
+
+
 @transaction.atomic
 def make_report(env, kind='NORMAL', save_scores=True, **kwargs):
     """Builds entities for tests results in a database.
@@ -484,6 +578,7 @@ def make_report(env, kind='NORMAL', save_scores=True, **kwargs):
         return env
     tests = env['tests']
     test_results = env.get('test_results', {})
+    test_reports = []
     for test_name, result in six.iteritems(test_results):
         test = tests[test_name]
         if 'report_id' in result:
@@ -505,10 +600,15 @@ def make_report(env, kind='NORMAL', save_scores=True, **kwargs):
         if env.get('save_outputs', False):
             test_report.output_file = filetracker_to_django_file(
                                                             result['out_file'])
-        test_report.save()
-        result['report_id'] = test_report.id
+        test_reports.append(test_report)
+    test_report_ids = _bulk_create_reports(TestReport, submission_report,
+                                           test_reports, 'test_name')
+    for test_report in test_reports:
+        test_results[test_report.test_name]['report_id'] = \
+                test_report_ids[test_report.test_name]
 
     group_results = env.get('group_results', {})
+    group_reports = []
     for group_name, group_result in six.iteritems(group_results):
         if 'report_id' in group_result:
             continue
@@ -518,8 +618,12 @@ def make_report(env, kind='NORMAL', save_scores=True, **kwargs):
         group_report.max_score = \
                 group_result['max_score'] if save_scores else None
         group_report.status = group_result['status']
-        group_report.save()
-        group_result['result_id'] = group_report.id
+        group_reports.append(group_report)
+    group_report_ids = _bulk_create_reports(GroupReport, submission_report,
+                                            group_reports, 'group')
+    for group_report in group_reports:
+        group_results[group_report.group]['result_id'] = \
+                group_report_ids[group_report.group]
 
     if kind == 'INITIAL':
         if submission.user is not None and not env.get('is_rejudge', False):
@@ -539,7 +643,16 @@ def make_report(env, kind='NORMAL', save_scores=True, **kwargs):
 @_skip_on_compilation_error
 def delete_executable(env, **kwargs):
     if 'compiled_file' in env:
-        get_client().delete_file(env['compiled_file'])
+        compilation_cache.delete_executable(env['compiled_file'])
+    return env
+
+
+def release_compilation_cache(env, **kwargs):
+    """Error handler resuming the jobs waiting for the compilation done by
+       the failed job. They compile their sources themselves.
+    """
+    if 'compilation_cache_key' in env:
+        compilation_cache.finish(env.pop('compilation_cache_key'), {})
     return env
 
 
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext as _
+
+from oioioi.programs.test_result_cache import evict
+
+
+class Command(BaseCommand):
+    help = _("Remove the results from the test result cache which are "
+             "older than TEST_RESULT_CACHE_MAX_AGE. May be run "
+             "periodically, e.g. from cron.")
+
+    def handle(self, *args, **options):
+        evict()
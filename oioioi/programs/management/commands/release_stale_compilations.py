@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.utils.translation import ugettext as _
+
+from oioioi.programs.compilation_cache import release_stale_compilations
+
+
+class Command(BaseCommand):
+    help = _("Give up compilations in the compilation cache which haven't "
+             "finished in time, and resume the jobs waiting for them. "
+             "Should be run periodically, e.g. from cron.")
+
+    def handle(self, *args, **options):
+        release_stale_compilations()
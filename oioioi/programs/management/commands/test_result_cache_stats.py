@@ -0,0 +1,22 @@
+from __future__ import print_function
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import ugettext as _
+
+from oioioi.programs.test_result_cache import get_rejudge_stats
+
+
+class Command(BaseCommand):
+    args = "rejudge_id"
+    help = _("Display the numbers of test results taken from the test "
+             "result cache and of tests run during the given rejudge")
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError(_("Expected one argument - rejudge id"))
+        stats = get_rejudge_stats(args[0])
+        total = stats['hits'] + stats['misses']
+        print(_("Results taken from the cache: %d") % stats['hits'])
+        print(_("Tests run: %d") % stats['misses'])
+        if total:
+            print(_("Hit rate: %.1f%%") % (100. * stats['hits'] / total))
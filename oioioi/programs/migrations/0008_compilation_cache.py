@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('programs', '0007_programsconfig'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CompilationCacheEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('ready', models.BooleanField(default=False)),
+                ('out_file', models.CharField(max_length=255)),
+                ('compiler_output', models.TextField(blank=True)),
+                ('exec_info', models.TextField(default='{}')),
+                ('size', models.BigIntegerField(default=0)),
+                ('creation_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_used', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CompilationWaiter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=50)),
+                ('saved_environ_id', models.IntegerField()),
+                ('entry', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='waiters', to='programs.CompilationCacheEntry')),
+            ],
+        ),
+    ]
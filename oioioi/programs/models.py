@@ -5,6 +5,7 @@ from django.core.exceptions import ValidationError
 from django.db import models, transaction
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
 from oioioi.base.fields import EnumField, EnumRegistry
@@ -294,3 +295,37 @@ class UserOutGenStatus(models.Model):
                                       related_name='userout_status')
     status = EnumField(submission_statuses, default='?')
     visible_for_user = models.BooleanField(default=True)
+
+
+class CompilationCacheEntry(models.Model):
+    """An executable stored in the compilation cache, see
+       :mod:`oioioi.programs.compilation_cache`.
+
+       Until the compilation finishes, the entry is not ``ready``, and jobs
+       compiling identical sources wait for it (see
+       :class:`CompilationWaiter`).
+    """
+    key = models.CharField(max_length=64, unique=True)
+    ready = models.BooleanField(default=False)
+    out_file = models.CharField(max_length=255)
+    compiler_output = models.TextField(blank=True)
+    exec_info = models.TextField(default='{}')
+    size = models.BigIntegerField(default=0)
+    creation_date = models.DateTimeField(default=timezone.now)
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class CompilationWaiter(models.Model):
+    """A job waiting for the compilation of an identical source."""
+    entry = models.ForeignKey(CompilationCacheEntry, related_name='waiters')
+    job_id = models.CharField(max_length=50)
+    saved_environ_id = models.IntegerField()
+
+
+class TestResultCacheEntry(models.Model):
+    """A result of running a test, stored in the test result cache, see
+       :mod:`oioioi.programs.test_result_cache`.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    result = models.TextField()
+    creation_date = models.DateTimeField(default=timezone.now, db_index=True)
@@ -0,0 +1,125 @@
+"""Cache of test results.
+
+   Running an executable on a test gives the same result as long as the
+   executable, the test files, the limits and the checker don't change.
+   When ``settings.TEST_RESULT_CACHE_ENABLED`` is set,
+   :func:`~oioioi.programs.handlers.run_tests` runs only the tests whose
+   results are not cached, so e.g. rejudging a problem after changing one
+   of its tests runs only that test.
+
+   Executables are identified by their compilation keys (see
+   :func:`oioioi.programs.compilation_cache.compilation_key`).
+
+   Results older than ``settings.TEST_RESULT_CACHE_MAX_AGE`` seconds are
+   removed by :func:`evict`.
+
+   The numbers of results taken from the cache and of tests which were run
+   are counted for each rejudge, see :func:`get_rejudge_stats`.
+"""
+from datetime import timedelta
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from oioioi.programs.models import TestResultCacheEntry
+
+# Fields of an exec job which affect its result, other than the executable.
+_KEY_FIELDS = ('job_type', 'in_file', 'hint_file', 'exec_time_limit',
+               'exec_mem_limit', 'chk_file', 'check_output',
+               'untrusted_checker', 'exec_info')
+
+_RESULT_FIELDS = ('result_code', 'result_string', 'result_percentage',
+                  'time_used', 'mem_used', 'num_syscalls')
+
+# Results which could be different if the test was run again.
+_UNCACHEABLE_RESULTS = ('SE',)
+
+_STATS_TIMEOUT = 7 * 24 * 3600
+
+
+def is_enabled():
+    return getattr(settings, 'TEST_RESULT_CACHE_ENABLED', False)
+
+
+def test_key(compilation_key, job, extra_args=None):
+    """Returns the key of the result of the exec job ``job`` run on the
+       executable with the given compilation key.
+    """
+    data = dict((field, job.get(field)) for field in _KEY_FIELDS)
+    data['executable'] = compilation_key
+    data['extra_args'] = extra_args or {}
+    return hashlib.sha256(json.dumps(data, sort_keys=True)
+                          .encode('utf-8')).hexdigest()
+
+
+def get_results(keys):
+    """Returns a dictionary mapping those of ``keys`` which are cached to
+       the results, using a single query.
+    """
+    entries = TestResultCacheEntry.objects.filter(key__in=list(keys)) \
+        .values_list('key', 'result')
+    return dict((key, json.loads(result)) for key, result in entries)
+
+
+def store_results(results):
+    """Stores results of exec jobs, given as a dictionary mapping keys to
+       the results.
+    """
+    entries = {}
+    for key, result in results.items():
+        if result.get('result_code') in _UNCACHEABLE_RESULTS:
+            continue
+        entries[key] = json.dumps(dict((field, result[field])
+                for field in _RESULT_FIELDS if field in result))
+    existing = set(TestResultCacheEntry.objects
+                   .filter(key__in=list(entries))
+                   .values_list('key', flat=True))
+    new_entries = [TestResultCacheEntry(key=key, result=result)
+                   for key, result in entries.items() if key not in existing]
+    if not new_entries:
+        return
+    try:
+        with transaction.atomic():
+            TestResultCacheEntry.objects.bulk_create(new_entries)
+    except IntegrityError:
+        # Some of the results were stored by another job in the meantime.
+        pass
+    evict()
+
+
+def evict():
+    """Removes the results stored more than
+       ``settings.TEST_RESULT_CACHE_MAX_AGE`` seconds ago.
+
+       It's called whenever new results are stored, and by the
+       ``evict_test_results`` management command.
+    """
+    created_before = timezone.now() - \
+        timedelta(seconds=settings.TEST_RESULT_CACHE_MAX_AGE)
+    TestResultCacheEntry.objects \
+        .filter(creation_date__lt=created_before).delete()
+
+
+def _stats_key(rejudge_id, name):
+    return 'test_result_cache:%s:%s' % (rejudge_id, name)
+
+
+def record_usage(rejudge_id, hits, misses):
+    for name, count in (('hits', hits), ('misses', misses)):
+        key = _stats_key(rejudge_id, name)
+        cache.add(key, 0, _STATS_TIMEOUT)
+        if count:
+            cache.incr(key, count)
+
+
+def get_rejudge_stats(rejudge_id):
+    """Returns a dictionary with the numbers of ``hits`` (test results taken
+       from the cache) and ``misses`` (tests which were run) in the rejudge
+       with the given id, counted so far.
+    """
+    return dict((name, cache.get(_stats_key(rejudge_id, name), 0))
+                for name in ('hits', 'misses'))
@@ -1,32 +1,41 @@
 import os
 import re
 from collections import defaultdict
-from datetime import datetime  # pylint: disable=E0611
+from datetime import datetime, timedelta  # pylint: disable=E0611
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.files.base import ContentFile
 from django.core.urlresolvers import reverse
+from django.db import connection
 from django.test import RequestFactory
-from django.test.utils import override_settings
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.utils import timezone
 from django.utils.html import escape, strip_tags
 from django.utils.http import urlencode
 from django.utils.timezone import utc
+import mock
+import pytest
 from six import unichr
 from six.moves import map, range, zip
 
 from oioioi.base.notification import NotificationHandler
 from oioioi.base.tests import TestCase, check_not_accessible, fake_time
 from oioioi.base.utils import memoized_property
-from oioioi.contests.models import Contest, ProblemInstance, Round, Submission
+from oioioi.contests.models import (Contest, ProblemInstance, Round,
+                                    Submission, SubmissionReport)
 from oioioi.contests.scores import IntegerScore
 from oioioi.contests.tests import PrivateRegistrationController, SubmitMixin
 from oioioi.filetracker.tests import TestStreamingMixin
-from oioioi.programs import utils
+from oioioi.programs import compilation_cache, test_result_cache, utils
 from oioioi.programs.controllers import ProgrammingContestController
-from oioioi.programs.handlers import make_report
-from oioioi.programs.models import (ModelSolution, ProgramSubmission,
-                                    ReportActionsConfig, Test, TestReport)
+from oioioi.programs.handlers import (grade_tests, make_report, run_tests,
+                                     run_tests_end)
+from oioioi.programs.models import (CompilationCacheEntry,
+                                    CompilationWaiter, GroupReport,
+                                    ModelSolution,
+                                    ProgramSubmission, ReportActionsConfig,
+                                    Test, TestReport, TestResultCacheEntry)
 from oioioi.programs.views import _testreports_to_generate_outs
 from oioioi.sinolpack.tests import get_test_filename
 
@@ -746,6 +755,93 @@ class TestNotifications(TestCase):
         NotificationHandler.send_notification = send_notification_backup
 
 
+class TestMakeReport(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+            'test_problem_instance', 'test_submission']
+
+    def _make_env(self, num_tests, num_groups=10):
+        tests = {}
+        test_results = {}
+        group_results = {}
+        for i in range(num_tests):
+            name = '%d%s' % (i % num_groups, i)
+            tests[name] = {'name': name, 'group': str(i % num_groups),
+                           'exec_time_limit': 1000, 'max_score': 10,
+                           'to_judge': i % 2 == 0}
+            test_results[name] = {'score': IntegerScore(10).serialize(),
+                                  'status': 'OK', 'result_code': 'OK',
+                                  'time_used': i, 'result_string': 'ok'}
+        for i in range(num_groups):
+            group_results[str(i)] = {'score': IntegerScore(100).serialize(),
+                                     'max_score': IntegerScore(100)
+                                     .serialize(),
+                                     'status': 'OK'}
+        return {'compilation_result': 'OK', 'compilation_message': '',
+                'submission_id': 1, 'status': 'OK', 'score': None,
+                'max_score': None, 'tests': tests,
+                'test_results': test_results, 'group_results': group_results,
+                'test_scorer': 'oioioi.programs.utils.discrete_test_scorer'}
+
+    def _count_queries(self, fun, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            fun(*args, **kwargs)
+        return len(context)
+
+    def test_make_report(self):
+        env = self._make_env(300)
+        self.assertLess(self._count_queries(make_report, env), 20)
+        reports = TestReport.objects.filter(
+                submission_report__id=env['report_id'])
+        self.assertEqual(reports.count(), 300)
+        for report in reports:
+            self.assertEqual(env['test_results'][report.test_name]
+                             ['report_id'], report.id)
+            self.assertEqual(report.comment, '')
+        group_reports = GroupReport.objects.filter(
+                submission_report__id=env['report_id'])
+        self.assertEqual(
+                {r.group: r.id for r in group_reports},
+                {group: result['result_id'] for group, result
+                 in env['group_results'].items()})
+
+    def test_grade_tests_with_previous_reports(self):
+        env = self._make_env(300)
+        make_report(env)
+        SubmissionReport.objects.filter(id=env['report_id']) \
+                .update(status='ACTIVE')
+        for result in env['test_results'].values():
+            result.pop('score')
+            result.pop('report_id')
+        env = grade_tests(env)
+        for result in env['test_results'].values():
+            self.assertEqual(result['score'], IntegerScore(10).serialize())
+
+    @pytest.mark.slow
+    def test_benchmark(self):
+        """Compares the number of queries done by ``make_report`` and by
+           saving the same reports one by one, for a problem with 300 tests.
+        """
+        env = self._make_env(300)
+        bulk = self._count_queries(make_report, env)
+
+        old_reports = list(TestReport.objects.filter(
+                submission_report__id=env['report_id'])) + \
+            list(GroupReport.objects.filter(
+                submission_report__id=env['report_id']))
+        for report in old_reports:
+            report.pk = None
+
+        def save_one_by_one():
+            for report in old_reports:
+                report.save()
+        one_by_one = self._count_queries(save_one_by_one)
+
+        print("Reports of 300 tests in 10 groups: %d queries one by one, "
+              "%d queries in make_report" % (one_by_one, bulk))
+        self.assertLess(bulk, 20)
+        self.assertGreaterEqual(one_by_one, 310)
+
+
 class TestScorers(TestCase):
     t_results_ok = (
         ({'exec_time_limit': 100, 'max_score': 100},
@@ -1223,3 +1319,186 @@ class TestLimitsLimits(TestCase):
         response = self.edit_settings()
         self.assertIn("Memory limit mustn&#39;t be greater than %dKiB."
                         % settings.MAX_MEMORY_LIMIT_FOR_TEST, response.content)
+
+
+class TestCompilationCache(TestCase):
+    job = {'compiler': 'default-cpp', 'language': 'cpp',
+           'source_file': '/a.cpp'}
+
+    def _compile(self, key, result_code='OK'):
+        self.assertEqual(compilation_cache.claim(key), (None, True))
+        with mock.patch.object(compilation_cache, 'get_client') as client:
+            client.return_value.file_size.return_value = 100
+            compilation_cache.finish(key, {'result_code': result_code,
+                                           'compiler_output': 'warning',
+                                           'exec_info': {}})
+
+    def test_key(self):
+        key = compilation_cache.compilation_key(self.job, 'abc')
+        self.assertEqual(key, compilation_cache.compilation_key(
+                dict(self.job, source_file='/b.cpp'), 'abc'))
+        self.assertNotEqual(key,
+                compilation_cache.compilation_key(self.job, 'abd'))
+        self.assertNotEqual(key, compilation_cache.compilation_key(
+                dict(self.job, extra_compilation_args=['-O3']), 'abc'))
+        self.assertNotEqual(key,
+                compilation_cache.compilation_key(self.job, 'abc', 'def'))
+
+    def test_claim(self):
+        self.assertEqual(compilation_cache.claim('k'), (None, True))
+        self.assertEqual(compilation_cache.claim('k'), (None, False))
+        with mock.patch.object(compilation_cache, 'get_client') as client:
+            client.return_value.file_size.return_value = 100
+            compilation_cache.finish('k', {'result_code': 'OK',
+                                           'compiler_output': 'warning',
+                                           'exec_info': {}})
+        result, owner = compilation_cache.claim('k')
+        self.assertFalse(owner)
+        self.assertEqual(result['result_code'], 'OK')
+        self.assertEqual(result['compiler_output'], 'warning')
+        self.assertEqual(result['out_file'],
+                         compilation_cache.cache_file_name('k'))
+        self.assertTrue(compilation_cache.is_cached_file(result['out_file']))
+
+    def test_failed_compilation(self):
+        self._compile('k', 'CE')
+        self.assertFalse(CompilationCacheEntry.objects.exists())
+        self.assertEqual(compilation_cache.claim('k'), (None, True))
+
+    def test_waiters(self):
+        self.assertEqual(compilation_cache.claim('k'), (None, True))
+        with mock.patch.object(compilation_cache, '_resume') as resume:
+            compilation_cache.wait_for_compilation(
+                    {'job_id': 'a', 'saved_environ_id': 1}, key='k')
+            compilation_cache.wait_for_compilation(
+                    {'job_id': 'b', 'saved_environ_id': 2}, key='k')
+            self.assertFalse(resume.called)
+            compilation_cache.finish('k', {'result_code': 'SE'})
+            self.assertEqual(resume.call_count, 2)
+            resume.assert_any_call('a', 1, compilation_cache.RETRY_RESULT)
+
+            resume.reset_mock()
+            self._compile('k')
+            compilation_cache.wait_for_compilation(
+                    {'job_id': 'c', 'saved_environ_id': 3}, key='k')
+            self.assertEqual(resume.call_args[0][2]['result_code'], 'OK')
+
+    def _orphan(self, key):
+        self.assertEqual(compilation_cache.claim(key), (None, True))
+        compilation_cache.wait_for_compilation(
+                {'job_id': 'a', 'saved_environ_id': 1}, key=key)
+        # The owner disappears.
+        CompilationCacheEntry.objects.filter(key=key).update(
+                last_used=timezone.now() - timedelta(hours=1))
+
+    @override_settings(COMPILATION_CACHE_PENDING_TIMEOUT=60)
+    def test_takeover_resumes_waiters(self):
+        with mock.patch.object(compilation_cache, '_resume') as resume:
+            self._orphan('k')
+            self.assertFalse(resume.called)
+            self.assertEqual(compilation_cache.claim('k'), (None, True))
+            resume.assert_called_once_with('a', 1,
+                                           compilation_cache.RETRY_RESULT)
+        self.assertFalse(CompilationWaiter.objects.exists())
+
+    @override_settings(COMPILATION_CACHE_PENDING_TIMEOUT=60)
+    def test_release_stale_compilations(self):
+        with mock.patch.object(compilation_cache, '_resume') as resume:
+            self._orphan('k')
+            self.assertEqual(compilation_cache.claim('l'), (None, True))
+            compilation_cache.release_stale_compilations()
+            resume.assert_called_once_with('a', 1,
+                                           compilation_cache.RETRY_RESULT)
+        self.assertEqual(
+                list(CompilationCacheEntry.objects.values_list('key',
+                                                               flat=True)),
+                ['l'])
+        self.assertFalse(CompilationWaiter.objects.exists())
+
+    @override_settings(COMPILATION_CACHE_MAX_SIZE=250,
+                       COMPILATION_CACHE_MIN_AGE=0)
+    def test_eviction(self):
+        self._compile('a')
+        self._compile('b')
+        compilation_cache.claim('a')
+        self.assertEqual(compilation_cache.claim('c'), (None, True))
+        with mock.patch.object(compilation_cache, 'get_client') as client:
+            client.return_value.file_size.return_value = 100
+            compilation_cache.finish('c', {'result_code': 'OK'})
+            client.return_value.delete_file.assert_called_once_with(
+                    compilation_cache.cache_file_name('b'))
+        self.assertEqual(
+                set(CompilationCacheEntry.objects.values_list('key',
+                                                              flat=True)),
+                {'a', 'c'})
+
+
+@override_settings(TEST_RESULT_CACHE_ENABLED=True)
+class TestTestResultCache(TestCase):
+    def _make_env(self):
+        tests = {}
+        for name in ('1a', '1b', '2'):
+            tests[name] = {'name': name, 'kind': 'NORMAL', 'to_judge': True,
+                           'in_file': '/tests/%s.in@1' % name,
+                           'hint_file': '/tests/%s.out@1' % name,
+                           'exec_time_limit': 1000}
+        return {'tests': tests, 'compilation_key': 'exe',
+                'compiled_file': '/exe', 'exec_info': {},
+                'untrusted_checker': False, 'submission_kind': 'NORMAL',
+                'extra_args': {'rejudge_id': 'r'}}
+
+    def test_key(self):
+        job = {'job_type': 'exec', 'in_file': '/1.in@1', 'exe_file': '/a'}
+        key = test_result_cache.test_key('exe', job)
+        self.assertEqual(key, test_result_cache.test_key('exe',
+                dict(job, exe_file='/b', task_priority=10)))
+        self.assertNotEqual(key, test_result_cache.test_key('exe2', job))
+        self.assertNotEqual(key, test_result_cache.test_key('exe',
+                dict(job, in_file='/1.in@2')))
+        self.assertNotEqual(key, test_result_cache.test_key('exe',
+                dict(job, exec_time_limit=2000)))
+
+    def test_run_tests(self):
+        env = run_tests(self._make_env())
+        self.assertEqual(set(env['workers_jobs']), {'1a', '1b', '2'})
+        env['workers_jobs.results'] = dict(
+                (name, dict(job, result_code='OK', time_used=10))
+                for name, job in env['workers_jobs'].items())
+        env['workers_jobs.results']['2']['result_code'] = 'SE'
+        run_tests_end(env)
+
+        env = self._make_env()
+        env['tests']['1b']['exec_time_limit'] = 2000
+        env = run_tests(env)
+        self.assertEqual(set(env['workers_jobs']), {'1b', '2'})
+        self.assertEqual(env['test_results']['1a']['result_code'], 'OK')
+        self.assertEqual(env['test_results']['1a']['time_used'], 10)
+        self.assertEqual(env['test_results']['1a']['name'], '1a')
+        self.assertEqual(test_result_cache.get_rejudge_stats('r'),
+                         {'hits': 1, 'misses': 5})
+
+    def test_all_cached(self):
+        env = self._make_env()
+        keys = dict((name, test_result_cache.test_key('exe', dict(test,
+                             job_type='exec', exec_info={},
+                             check_output=True, untrusted_checker=False)))
+                    for name, test in env['tests'].items())
+        test_result_cache.store_results(dict((key, {'result_code': 'WA'})
+                                             for key in keys.values()))
+        env = run_tests(env)
+        self.assertNotIn('transfer', env)
+        env = run_tests_end(env)
+        self.assertEqual(set(env['test_results']), {'1a', '1b', '2'})
+        for result in env['test_results'].values():
+            self.assertEqual(result['result_code'], 'WA')
+
+    @override_settings(TEST_RESULT_CACHE_MAX_AGE=3600)
+    def test_eviction(self):
+        test_result_cache.store_results({'a': {'result_code': 'OK'}})
+        TestResultCacheEntry.objects.update(
+                creation_date=timezone.now() - timedelta(hours=2))
+        test_result_cache.store_results({'b': {'result_code': 'OK'}})
+        self.assertEqual(
+                list(TestResultCacheEntry.objects.values_list('key',
+                                                              flat=True)),
+                ['b'])
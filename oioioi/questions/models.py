@@ -6,12 +6,13 @@ from django.core.urlresolvers import reverse
 from django.core.validators import MaxLengthValidator
 from django.db import models
 from django.db.models import Q
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.text import Truncator
 from django.utils.translation import ugettext_lazy as _
 
+from oioioi.base.cached_processors import invalidate_processors
 from oioioi.base.fields import EnumField, EnumRegistry
 from oioioi.base.utils.validators import validate_whitespaces
 from oioioi.contests.models import Contest, ProblemInstance, Round
@@ -197,6 +198,35 @@ def send_notification(sender, instance, created, **kwargs):
             )
 
 
+def messages_invalidation_key(contest_id, user_id=None):
+    """Returns the invalidation key of cached processors (see
+       :mod:`oioioi.base.cached_processors`) depending on messages of
+       the contest, or on those read by the user.
+    """
+    if user_id is None:
+        return 'messages/%s' % (contest_id,)
+    return 'messages/%s/%s' % (contest_id, user_id)
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def _invalidate_messages(sender, instance, **kwargs):
+    if instance.contest_id is not None:
+        invalidate_processors(messages_invalidation_key(instance.contest_id))
+
+
+@receiver(post_save, sender=MessageView)
+@receiver(post_delete, sender=MessageView)
+def _invalidate_message_views(sender, instance, **kwargs):
+    try:
+        contest_id = instance.message.contest_id
+    except Message.DoesNotExist:
+        return
+    if contest_id is not None:
+        invalidate_processors(messages_invalidation_key(contest_id,
+                                                        instance.user_id))
+
+
 # an e-mail notification will be spawned for every post
 # with Message.top_reference == EmailSubscription.opening_post
 class QuestionSubscription(models.Model):
@@ -43,8 +43,9 @@ def notification_function_public(arguments):
 
     controller = arguments.contest.controller
 
-    for user in controller.users_to_receive_public_message_notification():
-        NotificationHandler.send_notification(user,
+    NotificationHandler.broadcast_notification(
+            'public_messages_%s' % arguments.contest.id,
+            controller.users_to_receive_public_message_notification(),
             'new_public_message', message, message_arguments)
 
 NotificationHandler.register_notification('new_public_message',
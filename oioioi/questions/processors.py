@@ -1,10 +1,10 @@
-import six
 from django.core.urlresolvers import reverse
-from django.utils.functional import lazy
 from django.utils.translation import ungettext
 
+from oioioi.base.cached_processors import cached_processor
 from oioioi.base.utils import make_navbar_badge
 from oioioi.contests.utils import can_enter_contest, is_contest_admin
+from oioioi.questions.models import messages_invalidation_key
 from oioioi.questions.utils import unanswered_questions
 from oioioi.questions.views import new_messages, visible_messages
 from oioioi.status.registry import status_registry
@@ -18,9 +18,8 @@ def navbar_tip_processor(request):
     if not can_enter_contest(request):
         return {}
 
-    def generator():
-        return make_navbar_badge(**navbar_messages_generator(request))
-    return {'extra_navbar_right_messages': lazy(generator, six.text_type)()}
+    return {'extra_navbar_right_messages':
+                make_navbar_badge(**navbar_messages_generator(request))}
 
 
 @status_registry.register
@@ -29,6 +28,21 @@ def get_messages(request, response):
     return response
 
 
+def _messages_key(request):
+    if request.contest is None:
+        return None
+    return (request.contest.id,)
+
+
+def _messages_invalidated_by(request):
+    return [messages_invalidation_key(request.contest.id),
+            messages_invalidation_key(request.contest.id, request.user.id)]
+
+
+# Visibility of messages depends also on time (e.g. on their publication
+# dates), hence the short timeout.
+@cached_processor(key=_messages_key, per_user=True, timeout=30,
+                  invalidated_by=_messages_invalidated_by)
 def navbar_messages_generator(request):
     if request.contest is None:
         return {}
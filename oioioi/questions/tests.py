@@ -281,15 +281,19 @@ class TestQuestions(TestCase):
         flags['user_1002_got_notification'] = False
 
         @classmethod
-        def fake_send_notification(cls, user, notification_type,
-                    notification_message, notificaion_message_arguments):
-            if user.pk == 1002:
-                flags['user_1002_got_notification'] = True
-            if user.pk == 1001:
-                flags['user_1001_got_notification'] = True
-
-        send_notification_backup = NotificationHandler.send_notification
-        NotificationHandler.send_notification = fake_send_notification
+        def fake_broadcast_notification(cls, audience, users,
+                    notification_type, notification_message,
+                    notificaion_message_arguments):
+            for user in users:
+                if user.pk == 1002:
+                    flags['user_1002_got_notification'] = True
+                if user.pk == 1001:
+                    flags['user_1001_got_notification'] = True
+
+        broadcast_notification_backup = \
+                NotificationHandler.broadcast_notification
+        NotificationHandler.broadcast_notification = \
+                fake_broadcast_notification
 
         # Test user asks a new question
         self.client.login(username='test_user2')
@@ -333,7 +337,8 @@ class TestQuestions(TestCase):
         self.assertTrue(flags['user_1002_got_notification'])
         self.assertTrue(flags['user_1001_got_notification'])
 
-        NotificationHandler.send_notification = send_notification_backup
+        NotificationHandler.broadcast_notification = \
+                broadcast_notification_backup
 
     def test_filtering(self):
         self.client.login(username='test_admin')
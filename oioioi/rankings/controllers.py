@@ -15,7 +15,7 @@ from django.utils import timezone
 from django.utils.encoding import force_text
 from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext_lazy as _
-from six.moves import map, range
+from six.moves import map, range, zip
 
 from oioioi.base.models import PreferencesSaved
 from oioioi.base.utils import ObjectWithMixins, RegisteredSubclassesBase
@@ -26,6 +26,7 @@ from oioioi.contests.models import Contest, ProblemInstance, \
 from oioioi.contests.utils import is_contest_admin, is_contest_observer
 from oioioi.filetracker.utils import make_content_disposition_header
 from oioioi.rankings.models import Ranking, RankingPage
+from oioioi.rankings.serialization import encode_header
 
 CONTEST_RANKING_KEY = 'c'
 
@@ -41,7 +42,8 @@ class RankingMixinForContestController(object):
     def update_user_results(self, user, problem_instance, *args, **kwargs):
         super(RankingMixinForContestController, self) \
             .update_user_results(user, problem_instance, *args, **kwargs)
-        Ranking.invalidate_contest(problem_instance.round.contest)
+        Ranking.invalidate_user_results(problem_instance.round.contest, user,
+                                        problem_instance)
 
 ContestController.mix_in(RankingMixinForContestController)
 
@@ -164,14 +166,62 @@ class RankingController(RegisteredSubclassesBase, ObjectWithMixins):
         """
         data = self.serialize_ranking(key)
         pages = []
-        num_participants = len(data['rows'])
-        on_page = data['participants_on_page']
-        num_pages = (num_participants + on_page - 1) / on_page
-        num_pages = max(num_pages, 1)  # Render at least a single page
-        for i in range(1, num_pages+1):
+        num_pages = self._num_pages(len(data['rows']),
+                                    data['participants_on_page'])
+        for i in range(1, num_pages + 1):
             pages.append(self._render_ranking_page(key, data, i))
         return data, pages
 
+    def build_ranking_update(self, key, previous, user_ids):
+        """Incrementally updates the ranking for given key, after results
+           of users with ids in ``user_ids`` changed.
+
+           ``previous`` is the
+           :class:`~oioioi.rankings.serialization.CompactRanking` saved by
+           the last recalculation. It is updated using
+           update_serialized_ranking and only the pages whose contents
+           changed are rendered. Returns a tuple containing serialized data,
+           a dict mapping numbers of changed pages to their html code and
+           the total number of pages, or ``None`` if the ranking has to be
+           rebuilt with build_ranking.
+        """
+        if 'participants_on_page' not in previous.header:
+            return None
+        old_layout = list(zip(previous.user_ids, previous.places))
+        old_num_pages = self._num_pages(len(old_layout),
+                previous.header['participants_on_page'])
+
+        data = self.update_serialized_ranking(key, previous, user_ids)
+        if data is None:
+            return None
+        rows = data['rows']
+        on_page = data['participants_on_page']
+        num_pages = self._num_pages(len(rows), on_page)
+        if num_pages != old_num_pages or \
+                any(previous.header.get(k) != v
+                    for k, v in encode_header(data).items()):
+            # Pagination links or the header are on every page.
+            changed_pages = set(range(1, num_pages + 1))
+        else:
+            changed_pages = set()
+            for i, row in enumerate(rows):
+                if row['user_id'] in user_ids or i >= len(old_layout) or \
+                        old_layout[i] != (row['user_id'], row['place']):
+                    changed_pages.add(i // on_page + 1)
+
+        to_fill = [i for nr in changed_pages
+                   for i in range((nr - 1) * on_page,
+                                  min(nr * on_page, len(rows)))]
+        if not self._fill_rows(key, data, to_fill):
+            return None
+        pages = dict((nr, self._render_ranking_page(key, data, nr))
+                     for nr in changed_pages)
+        return data, pages, num_pages
+
+    def _num_pages(self, num_participants, on_page):
+        num_pages = (num_participants + on_page - 1) // on_page
+        return max(num_pages, 1)  # Render at least a single page
+
     def _fake_request(self, page):
         """Creates a fake request used to render ranking.
 
@@ -199,6 +249,31 @@ class RankingController(RegisteredSubclassesBase, ObjectWithMixins):
         """
         raise NotImplementedError
 
+    def update_serialized_ranking(self, key, previous, user_ids):
+        """Returns the data saved earlier as ``previous`` (a
+           :class:`~oioioi.rankings.serialization.CompactRanking`) updated
+           with the current results of users with ids in ``user_ids``.
+
+           The result must be the same as if :meth:`serialize_ranking`
+           was called again, except that the rows of other users may be in
+           the form returned by
+           :meth:`~oioioi.rankings.serialization.CompactRanking.rows`. Every
+           row must contain ``user_id``. ``None`` may be returned if the data
+           can't be updated incrementally.
+        """
+        return None
+
+    def _fill_rows(self, key, data, indices):
+        """Replaces the rows of ``data`` with given indices, if they are
+           in the form returned by
+           :meth:`~oioioi.rankings.serialization.CompactRanking.rows`, with
+           full rows, as returned by :meth:`serialize_ranking`, so that they
+           can be rendered.
+
+           Returns ``False`` if that's not possible.
+        """
+        raise NotImplementedError
+
 
 class DefaultRankingController(RankingController):
     description = _("Default ranking")
@@ -243,14 +318,8 @@ class DefaultRankingController(RankingController):
         if getattr(settings, 'MOCK_RANKINGSD', False):
             rows = self.serialize_ranking(key)['rows']
         else:
-            try:
-                ranking = Ranking.objects.get(contest=self.contest, key=key)
-            except Ranking.DoesNotExist:
-                return None
-            serialized = ranking.serialized or {}
-            rows = serialized.get('rows')
-            if not rows:  # Ranking isn't ready yet
-                return None
+            row = Ranking.find_user_row(self.contest, key, user.id)
+            return row + 1 if row is not None else None
 
         for i, row in enumerate(rows):
             if row['user'] == user:
@@ -318,6 +387,7 @@ class DefaultRankingController(RankingController):
             user_results = []
             user_data = {
                 'user': user,
+                'user_id': user.id,
                 'results': user_results,
                 'sum': None
             }
@@ -376,32 +446,91 @@ class DefaultRankingController(RankingController):
         return [(pi, self._is_problem_statement_visible(key, pi, now))
                 for pi in pis]
 
-    def serialize_ranking(self, key):
+    def _get_rounds_and_pis(self, key):
         partial_key = self.get_partial_key(key)
         rounds = list(self._rounds_for_key(key))
         pis = list(self._filter_pis_for_ranking(partial_key,
             ProblemInstance.objects.filter(round__in=rounds)).
             select_related('problem').prefetch_related('round'))
-        users = self.filter_users_for_ranking(key, User.objects.all())
-        results = UserResultForProblem.objects \
+        return rounds, pis
+
+    def _get_results(self, key, rounds, pis, users):
+        return UserResultForProblem.objects \
                 .filter(problem_instance__in=pis, user__in=users) \
                 .prefetch_related('problem_instance__round') \
                 .select_related('submission_report', 'problem_instance',
                         'problem_instance__contest')
 
-        data = self._get_users_results(pis, results, rounds, users)
-        self._assign_places(data, itemgetter('sum'))
-        return {'rows': data,
-                'problem_instances': self._get_pis_with_visibility(key, pis),
+    def _serialize_header(self, key, rounds, pis):
+        """Returns the serialized ranking data other than the rows."""
+        return {'problem_instances': self._get_pis_with_visibility(key, pis),
                 'participants_on_page': getattr(settings,
                     'PARTICIPANTS_ON_PAGE', 100)}
 
+    def serialize_ranking(self, key):
+        rounds, pis = self._get_rounds_and_pis(key)
+        users = self.filter_users_for_ranking(key, User.objects.all())
+        results = self._get_results(key, rounds, pis, users)
+
+        data = self._get_users_results(pis, results, rounds, users)
+        self._assign_places(data, itemgetter('sum'))
+        serialized = self._serialize_header(key, rounds, pis)
+        serialized['rows'] = data
+        return serialized
+
+    def update_serialized_ranking(self, key, previous, user_ids):
+        rounds, pis = self._get_rounds_and_pis(key)
+        if previous.problem_instance_ids != [pi.id for pi in pis]:
+            return None
+        users = self.filter_users_for_ranking(key,
+                User.objects.filter(id__in=user_ids))
+        results = self._get_results(key, rounds, pis, users)
+
+        rows = [row for row in previous.rows()
+                if row['user_id'] not in user_ids]
+        rows += self._get_users_results(pis, results, rounds, users)
+        # Restore the order in which _get_users_results returns the rows,
+        # so that ties are resolved in the same way as in a full rebuild.
+        ordered_ids = User.objects \
+                .filter(id__in=[row['user_id'] for row in rows]) \
+                .order_by('last_name', 'first_name', 'username') \
+                .values_list('id', flat=True)
+        order = dict((user_id, i) for i, user_id in enumerate(ordered_ids))
+        rows = [row for row in rows if row['user_id'] in order]
+        rows.sort(key=lambda row: order[row['user_id']])
+        self._assign_places(rows, itemgetter('sum'))
+        serialized = self._serialize_header(key, rounds, pis)
+        serialized['rows'] = rows
+        return serialized
+
+    def _fill_rows(self, key, data, indices):
+        partial = dict((i, data['rows'][i]) for i in indices
+                       if 'user' not in data['rows'][i])
+        if not partial:
+            return True
+        rounds, pis = self._get_rounds_and_pis(key)
+        users = User.objects.filter(
+                id__in=[row['user_id'] for row in partial.values()])
+        results = self._get_results(key, rounds, pis, users)
+        full_rows = dict((row['user_id'], row) for row
+                         in self._get_users_results(pis, results, rounds,
+                                                    users))
+        for i, row in partial.items():
+            full_row = full_rows.get(row['user_id'])
+            if full_row is None:
+                return False
+            full_row['place'] = row['place']
+            for k, v in row.items():
+                full_row.setdefault(k, v)
+            data['rows'][i] = full_row
+        return True
+
 
 def update_rankings_with_user_callback(sender, **kwargs):
     user = sender.instance
     contests = Contest.objects.filter(probleminstance__submission__user=user)
-    for contest in contests:
-        Ranking.invalidate_contest(contest)
+    for contest in contests.distinct():
+        Ranking.invalidate_user_results(contest, user)
 
 
 PreferencesSaved.connect(update_rankings_with_user_callback)
@@ -1,10 +1,108 @@
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
 import time
+from optparse import make_option
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
 from django.utils.translation import ugettext as _
+from six.moves import range
 
-from oioioi.rankings.models import choose_for_recalculation, recalculate
+from oioioi.rankings.models import (choose_for_recalculation, recalculate,
+                                    renew_lease)
+
+logger = logging.getLogger(__name__)
+
+
+class LeaseRenewer(threading.Thread):
+    """Renews the lease of a recalculation in progress until stopped."""
+
+    def __init__(self, recalc):
+        super(LeaseRenewer, self).__init__()
+        self.daemon = True
+        self.recalc = recalc
+        self._finished = threading.Event()
+
+    def run(self):
+        try:
+            while not self._finished.wait(
+                    settings.RANKINGSD_HEARTBEAT_INTERVAL):
+                if not renew_lease(self.recalc):
+                    logger.warning("Recalculation %d has been taken over "
+                                   "by another worker", self.recalc.id)
+                    break
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._finished.set()
+        self.join()
+
+
+class WorkerStats(object):
+    """Throughput statistics of a single rankingsd worker."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start_time = self.last_report_time = time.time()
+        self.recalculations = 0
+        self.full_recalculations = 0
+        self.busy_time = 0.0
+
+    def add(self, full, duration):
+        self.recalculations += 1
+        if full:
+            self.full_recalculations += 1
+        self.busy_time += duration
+
+    def report_if_needed(self, interval):
+        now = time.time()
+        if now - self.last_report_time < interval:
+            return
+        self.last_report_time = now
+        uptime = max(now - self.start_time, 1e-6)
+        logger.info("rankingsd worker %s: %d rankings recalculated "
+                    "(%d full), %.2f per minute, %.2fs on average, "
+                    "%.0f%% busy", self.name, self.recalculations,
+                    self.full_recalculations,
+                    self.recalculations * 60. / uptime,
+                    self.busy_time / max(self.recalculations, 1),
+                    100. * self.busy_time / uptime)
+
+
+def run_worker(stats_interval):
+    name = '%s:%d' % (socket.gethostname(), os.getpid())
+    stats = WorkerStats(name)
+    while True:
+        recalc = choose_for_recalculation(name)
+        if recalc:
+            renewer = LeaseRenewer(recalc)
+            renewer.start()
+            start_time = time.time()
+            try:
+                recalculate(recalc)
+            finally:
+                renewer.stop()
+            stats.add(recalc.full, time.time() - start_time)
+        else:
+            time.sleep(settings.RANKINGSD_POLLING_INTERVAL)
+        stats.report_if_needed(stats_interval)
+
+
+def _worker_process_main(stats_interval):
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        run_worker(stats_interval)
+    # pylint: disable=broad-except
+    except Exception:
+        logger.exception("rankingsd worker crashed")
+        raise
 
 
 class Command(BaseCommand):
@@ -14,13 +112,53 @@ class Command(BaseCommand):
         "This allows gracefully handling both the biggest, busiest contests, "
         "and the stale ones."
         "Internally it uses explicit invalidation and eager recalculation "
-        "with cooldown."
+        "with cooldown. With --workers, rankings are recalculated by many "
+        "processes concurrently; a worker which died is restarted and its "
+        "rankings are reclaimed by others."
+    )
+
+    option_list = BaseCommand.option_list + (
+        make_option('-w', '--workers',
+                    type='int',
+                    default=settings.RANKINGSD_WORKERS,
+                    help="Number of worker processes"),
+        make_option('--stats-interval',
+                    metavar='SECONDS',
+                    type='int',
+                    default=300,
+                    help="Time between reports of workers' throughput"),
     )
 
     def handle(self, *args, **options):
-        while True:
-            r = choose_for_recalculation()
-            if r:
-                recalculate(r)
-            else:
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError("At least one worker is required.")
+        if workers == 1:
+            run_worker(options['stats_interval'])
+            return
+
+        # Forked workers must not share the database connection.
+        for conn in connections.all():
+            conn.close()
+
+        def spawn():
+            process = multiprocessing.Process(target=_worker_process_main,
+                    args=(options['stats_interval'],))
+            process.daemon = True
+            process.start()
+            return process
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        processes = [spawn() for _i in range(workers)]
+        try:
+            while True:
                 time.sleep(settings.RANKINGSD_POLLING_INTERVAL)
+                for i, process in enumerate(processes):
+                    if not process.is_alive():
+                        logger.error("rankingsd worker %d died with exit "
+                                     "code %s, restarting", process.pid,
+                                     process.exitcode)
+                        processes[i] = spawn()
+        finally:
+            for process in processes:
+                process.terminate()
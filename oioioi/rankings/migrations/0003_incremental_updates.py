@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 12:00
+from __future__ import unicode_literals
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('contests', '0010_auto_20181205_1802'),
+        ('rankings', '0002_auto_20160618_1855'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rankingrecalc',
+            name='full',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='ranking',
+            name='needs_full_recalculation',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.CreateModel(
+            name='RankingDelta',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('problem_instance', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='contests.ProblemInstance')),
+                ('ranking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deltas', to='rankings.Ranking')),
+                ('recalc', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='deltas', to='rankings.RankingRecalc')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankings', '0003_incremental_updates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rankingrecalc',
+            name='lease_expiry_date',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='rankingrecalc',
+            name='worker',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
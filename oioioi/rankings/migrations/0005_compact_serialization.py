@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 12:00
+from __future__ import unicode_literals
+
+import pickle
+
+from django.db import migrations, models
+
+from oioioi.rankings.serialization import CompactRanking, to_bytes
+
+
+def convert_pickled_rankings(apps, schema_editor):
+    """Converts rankings pickled by the previous versions to the compact
+       format. Rankings which can't be converted are scheduled for a full
+       recalculation.
+    """
+    Ranking = apps.get_model('rankings', 'Ranking')
+    for ranking in Ranking.objects.exclude(serialized_data=None).iterator():
+        data = to_bytes(ranking.serialized_data)
+        if CompactRanking.decode(data) is not None:
+            continue
+        try:
+            compact = CompactRanking.from_serialized(pickle.loads(data))
+        # pylint: disable=broad-except
+        except Exception:
+            ranking.serialized_data = None
+            ranking.user_index = None
+            ranking.needs_recalculation = True
+            ranking.needs_full_recalculation = True
+        else:
+            ranking.serialized_data = compact.encode()
+            ranking.user_index = compact.build_user_index()
+        ranking.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rankings', '0004_recalc_lease'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ranking',
+            name='user_index',
+            field=models.BinaryField(null=True),
+        ),
+        migrations.RunPython(convert_pickled_rankings,
+                             migrations.RunPython.noop),
+    ]
@@ -1,15 +1,25 @@
-import pickle
 from datetime import timedelta  # pylint: disable=E0611
 
 from django.conf import settings
-from django.db import models, transaction
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection, models, transaction
+from django.db.models import Q
 from django.utils import timezone
 
-from oioioi.contests.models import Contest
+from oioioi.contests.models import Contest, ProblemInstance
+from oioioi.rankings.serialization import CompactRanking, find_in_user_index
 
 
 class RankingRecalc(models.Model):
-    pass
+    # Whether the ranking has to be rebuilt from scratch, or only
+    # the RankingDeltas assigned to this recalc should be applied.
+    full = models.BooleanField(default=True)
+
+    # Recalculations are leased to rankingsd workers. A worker renews
+    # the lease periodically, so when it expires the worker is assumed
+    # to be dead and the ranking may be claimed by another one.
+    worker = models.CharField(max_length=255, blank=True)
+    lease_expiry_date = models.DateTimeField(null=True)
 
 
 class Ranking(models.Model):
@@ -64,6 +74,19 @@ class Ranking(models.Model):
        RANKING_MIN_COOLDOWN - minimum cooldown duration (safety limit)
        RANKING_MAX_COOLDOWN - maximum cooldown duration (safety limit)
 
+       Most invalidations are caused by a change of a single user's result
+       (see invalidate_user_results). Such invalidations are recorded as
+       RankingDeltas and, if possible, the recalculation applies only them
+       to the previously serialized ranking, re-rendering only the pages
+       which changed. Any other invalidation requires a full rebuild.
+       Incremental updates can be disabled with RANKING_INCREMENTAL_UPDATES.
+
+       The recalculations may be run by many rankingsd workers concurrently.
+       Each of them claims a ranking by creating a RankingRecalc with
+       a lease, which it renews while working. A ranking whose lease
+       expired is reclaimed by another worker. The lease duration is
+       configured by RANKINGSD_LEASE_DURATION.
+
        NOTE: We use the local time (and not the database time), for all time
        calculations, including the cooldowns, so be careful about drastic
        changes of system time on the generating machine.
@@ -78,21 +101,39 @@ class Ranking(models.Model):
     # used to determine cooldown
     last_recalculation_duration = models.DurationField(default=timedelta(0))
 
-    # internal, use serialized instead
+    # internal, use serialized and find_user_row instead
     serialized_data = models.BinaryField(null=True)
+    user_index = models.BinaryField(null=True)
 
     # internal to ranking recalculation mechanism
     # use invalidate_* and is_up_to_date instead
     needs_recalculation = models.BooleanField(default=True)
+    needs_full_recalculation = models.BooleanField(default=True)
     cooldown_date = models.DateTimeField(auto_now_add=True)
     recalc_in_progress = models.ForeignKey(RankingRecalc, null=True)
 
     @property
     def serialized(self):
-        """Serialized data of this ranking"""
+        """Serialized data of this ranking, as a
+           :class:`~oioioi.rankings.serialization.CompactRanking`.
+        """
         if not self.serialized_data:
             return None
-        return pickle.loads(self.serialized_data)
+        return CompactRanking.decode(self.serialized_data)
+
+    @classmethod
+    def find_user_row(cls, contest, key, user_id):
+        """Returns the number of the user's row (counting from 0) in
+           the ranking, or ``None`` if the user is not in the ranking or
+           the ranking hasn't been generated yet.
+
+           Only the user index is read from the database.
+        """
+        index = cls.objects.filter(contest=contest, key=key) \
+                .values_list('user_index', flat=True).first()
+        if not index:
+            return None
+        return find_in_user_index(index, user_id)
 
     def controller(self):
         """RankingController of the contest"""
@@ -102,6 +143,7 @@ class Ranking(models.Model):
     def invalidate_queryset(cls, qs):
         """Marks queryset of rankings as invalid"""
         qs.all().update(needs_recalculation=True,
+                        needs_full_recalculation=True,
                         invalidation_date=timezone.now())
 
     @classmethod
@@ -109,6 +151,26 @@ class Ranking(models.Model):
         """Marks all the keys in the constest as invalid"""
         return cls.invalidate_queryset(cls.objects.filter(contest=contest))
 
+    @classmethod
+    @transaction.atomic
+    def invalidate_user_results(cls, contest, user, problem_instance=None):
+        """Marks all the keys in the contest as invalid because results
+           of a single user changed.
+
+           The change is recorded, so that only the row of this user needs
+           to be recalculated. If ``problem_instance`` is ``None``, anything
+           about the user (e.g. their name) could have changed.
+        """
+        if not getattr(settings, 'RANKING_INCREMENTAL_UPDATES', True):
+            return cls.invalidate_contest(contest)
+        rankings = cls.objects.filter(contest=contest)
+        RankingDelta.objects.bulk_create([
+            RankingDelta(ranking_id=ranking_id, user=user,
+                         problem_instance=problem_instance)
+            for ranking_id in rankings.values_list('id', flat=True)])
+        rankings.update(needs_recalculation=True,
+                        invalidation_date=timezone.now())
+
     def is_up_to_date(self):
         """Is all the data for this contest up to date (i.e. not invalidated
            since the last recalculation succeeded)?
@@ -130,33 +192,128 @@ class RankingPage(models.Model):
     data = models.TextField()
 
 
+class RankingDelta(models.Model):
+    """A change of results of a single user, which has not been applied
+       to the ranking yet.
+
+       Deltas are assigned to a RankingRecalc when it is started and are
+       deleted together with it after the results are saved.
+    """
+    ranking = models.ForeignKey(Ranking, related_name='deltas')
+    user = models.ForeignKey(User)
+    problem_instance = models.ForeignKey(ProblemInstance, null=True)
+    recalc = models.ForeignKey(RankingRecalc, null=True,
+                               related_name='deltas')
+
+
 def clamp(minimum, x, maximum):
     return max(minimum, min(x, maximum))
 
 
-@transaction.atomic
-def choose_for_recalculation():
-    now = timezone.now()
-    r = Ranking.objects.filter(
-        needs_recalculation=True,
-        cooldown_date__lt=now
-    ).order_by('last_recalculation_date').select_for_update().first()
+def _lease_expiry_date(now):
+    return now + timedelta(seconds=settings.RANKINGSD_LEASE_DURATION)
+
+
+def _lease_expired(recalc_id, now):
+    expiry_date = RankingRecalc.objects.filter(id=recalc_id) \
+            .values_list('lease_expiry_date', flat=True).first()
+    return expiry_date is None or expiry_date < now
+
+
+def _lock_ranking(ranking_id):
+    """Locks the ranking for the rest of the current transaction.
+
+       Returns ``None`` without waiting if the ranking is locked by someone
+       else (and the database supports it), so that concurrent workers can
+       skip rankings being claimed by others.
+    """
+    nowait = connection.features.has_select_for_update_nowait
+    try:
+        with transaction.atomic():
+            return Ranking.objects.select_for_update(nowait=nowait) \
+                    .get(id=ranking_id)
+    except (DatabaseError, Ranking.DoesNotExist):
+        return None
+
+
+def _claim_ranking(ranking_id, worker, now):
+    """Claims the ranking for the given worker, if it still needs
+       recalculation and nobody else is working on it. Must be called in
+       a transaction, which should be committed right after that.
+
+       Returns a new RankingRecalc, or ``None`` if the ranking wasn't
+       claimed.
+    """
+    r = _lock_ranking(ranking_id)
     if r is None:
         return None
+    previous = r.recalc_in_progress_id
+    abandoned = previous is not None and _lease_expired(previous, now)
+    if previous is not None and not abandoned:
+        return None
+    if not abandoned and not (r.needs_recalculation and
+                              r.cooldown_date < now):
+        return None
+
     cooldown_duration = clamp(
         timedelta(seconds=settings.RANKING_MIN_COOLDOWN),
         r.last_recalculation_duration * settings.RANKING_COOLDOWN_FACTOR,
         timedelta(seconds=settings.RANKING_MAX_COOLDOWN)
     )
     r.cooldown_date = now + cooldown_duration
+    # The abandoned recalculation will never save its results, so the new
+    # one has to take over its work.
+    full = r.needs_full_recalculation or (abandoned and
+            RankingRecalc.objects.filter(id=previous, full=True).exists())
     r.needs_recalculation = False
-    recalc = RankingRecalc()
+    r.needs_full_recalculation = False
+    recalc = RankingRecalc(full=full, worker=worker,
+                           lease_expiry_date=_lease_expiry_date(now))
     recalc.save()
+    r.deltas.update(recalc=recalc)
     r.recalc_in_progress = recalc
     r.save()
+    if abandoned:
+        RankingRecalc.objects.filter(id=previous).delete()
     return recalc
 
 
+def choose_for_recalculation(worker=''):
+    """Claims a ranking which needs recalculation for the given worker.
+
+       Rankings being recalculated by live workers are not considered.
+       Each candidate is locked and claimed in its own short transaction,
+       so that a ranking skipped or claimed by this worker isn't kept
+       locked while the others are examined or recalculated.
+
+       Returns a new RankingRecalc, or ``None`` if there is nothing to do.
+    """
+    now = timezone.now()
+    candidates = list(Ranking.objects.filter(
+        Q(needs_recalculation=True, cooldown_date__lt=now,
+          recalc_in_progress__isnull=True) |
+        Q(recalc_in_progress__lease_expiry_date__lt=now) |
+        Q(recalc_in_progress__isnull=False,
+          recalc_in_progress__lease_expiry_date__isnull=True)
+    ).order_by('last_recalculation_date').values_list('id', flat=True))
+    for ranking_id in candidates:
+        with transaction.atomic():
+            recalc = _claim_ranking(ranking_id, worker, now)
+        if recalc is not None:
+            return recalc
+    return None
+
+
+def renew_lease(recalc):
+    """Extends the lease of a recalculation in progress.
+
+       Returns ``False`` if the recalculation has been already taken over
+       by another worker.
+    """
+    return RankingRecalc.objects.filter(id=recalc.id).update(
+        lease_expiry_date=_lease_expiry_date(timezone.now())) > 0
+
+
 @transaction.atomic
 def save_pages(ranking, pages_list):
     ranking.pages.all().delete()
@@ -165,16 +322,39 @@ def save_pages(ranking, pages_list):
         page.save()
 
 
+@transaction.atomic
+def update_pages(ranking, changed_pages, num_pages):
+    """Replaces the pages listed in ``changed_pages`` (a dict mapping page
+       numbers to html) and removes the pages past ``num_pages``.
+    """
+    ranking.pages.filter(Q(nr__in=list(changed_pages.keys())) |
+                         Q(nr__gt=num_pages)).delete()
+    RankingPage.objects.bulk_create([
+        RankingPage(ranking=ranking, nr=nr, data=page_data)
+        for nr, page_data in sorted(changed_pages.items())])
+
+
 @transaction.atomic
 def save_recalc_results(recalc, date_before, date_after, serialized,
-                        pages_list):
+                        pages_list, changed_pages=None):
+    """Saves the results of a recalculation.
+
+       For a full rebuild ``pages_list`` is the list of all pages, otherwise
+       it is ``None`` and ``changed_pages`` is a tuple
+       ``(pages, num_pages)``, as passed to :func:`update_pages`.
+    """
     try:
         r = Ranking.objects.filter(recalc_in_progress=recalc). \
             select_for_update().get()
     except Ranking.DoesNotExist:
         return
-    r.serialized_data = pickle.dumps(serialized)
-    save_pages(r, pages_list)
+    compact = CompactRanking.from_serialized(serialized)
+    r.serialized_data = compact.encode()
+    r.user_index = compact.build_user_index()
+    if pages_list is not None:
+        save_pages(r, pages_list)
+    else:
+        update_pages(r, *changed_pages)
     r.last_recalculation_date = date_before
     r.last_recalculation_duration = date_after - date_before
     old_recalc = r.recalc_in_progress
@@ -191,7 +371,19 @@ def recalculate(recalc):
     except Ranking.DoesNotExist:
         return
     ranking_controller = r.controller()
-    serialized, pages_list = ranking_controller.build_ranking(r.key)
+    update = None
+    previous = None if recalc.full else r.serialized
+    if previous is not None:
+        user_ids = set(recalc.deltas.values_list('user_id', flat=True))
+        update = ranking_controller.build_ranking_update(r.key, previous,
+                                                         user_ids)
+    if update is None:
+        serialized, pages_list = ranking_controller.build_ranking(r.key)
+        changed_pages = None
+    else:
+        serialized, pages, num_pages = update
+        pages_list = None
+        changed_pages = (pages, num_pages)
     date_after = timezone.now()
     save_recalc_results(recalc, date_before, date_after, serialized,
-                        pages_list)
+                        pages_list, changed_pages)
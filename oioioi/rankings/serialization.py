@@ -0,0 +1,188 @@
+"""Compact storage format of serialized rankings.
+
+   The data returned by ``RankingController.serialize_ranking`` contains
+   model instances, which are large when pickled and slow to
+   unpickle. What has to be stored between recalculations is much smaller:
+   the order of users, their places, sums and scores for every problem
+   instance. This module stores these as columns, in a versioned format.
+
+   Positions of users are looked up in a separate index, which is a hash
+   table packed into bytes, so that looking up a single user doesn't require
+   decoding anything else.
+"""
+import json
+import struct
+import zlib
+
+import six
+from six.moves import range, zip
+
+from oioioi.contests.scores import ScoreValue
+
+FORMAT_VERSION = 1
+_MAGIC = b'ORNK'
+_HEADER = struct.Struct('<4sB')
+_INDEX_SLOT = struct.Struct('<ii')
+
+
+def to_bytes(data):
+    """Converts the value of a ``BinaryField`` to bytes."""
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return bytes(data)
+
+
+def _encode_score(score):
+    return score.serialize() if score is not None else ''
+
+
+def encode_header(data):
+    """Returns the ranking data other than rows, with problem instances
+       replaced by their ids. Values which can't be stored are skipped.
+    """
+    header = {}
+    for key, value in data.items():
+        if key == 'rows':
+            continue
+        if key == 'problem_instances':
+            value = [[pi.id, bool(visible)] for pi, visible in value]
+        elif not isinstance(value, six.integer_types + six.string_types +
+                                   (bool, float, type(None))):
+            continue
+        header[key] = value
+    return header
+
+
+def _row_user_id(row):
+    return row['user_id'] if 'user_id' in row else row['user'].id
+
+
+def _row_scores(row):
+    if 'results' not in row:
+        return row['scores']
+    return [_encode_score(r.score if r else None) for r in row['results']]
+
+
+class CompactRanking(object):
+    """Column-oriented representation of a serialized ranking.
+
+       Row ``i`` of the ranking is described by ``user_ids[i]``,
+       ``places[i]``, ``sums[i]`` and ``scores[j][i]`` for every problem
+       instance ``j``. Scores are stored in their
+       :class:`~oioioi.contests.fields.ScoreField` form.
+    """
+
+    def __init__(self, header, user_ids, places, sums, scores):
+        self.header = header
+        self.user_ids = user_ids
+        self.places = places
+        self.sums = sums
+        self.scores = scores
+
+    @property
+    def problem_instance_ids(self):
+        return [pi_id for pi_id, _visible
+                in self.header.get('problem_instances', [])]
+
+    @classmethod
+    def from_serialized(cls, data):
+        """Builds the compact form of the data returned by
+           ``serialize_ranking``.
+        """
+        header = encode_header(data)
+        rows = data['rows']
+        num_columns = len(header.get('problem_instances', []))
+        scores = [[] for _i in range(num_columns)]
+        for row in rows:
+            for column, score in zip(scores, _row_scores(row)):
+                column.append(score)
+        return cls(header,
+                   [_row_user_id(row) for row in rows],
+                   [row['place'] for row in rows],
+                   [_encode_score(row['sum']) for row in rows],
+                   scores)
+
+    def rows(self):
+        """Returns a list of rows, in a format similar to
+           ``serialize_ranking``, but without model instances.
+
+           Each row contains ``user_id``, ``place``, ``sum`` and ``scores``
+           (a list of serialized scores).
+        """
+        return [{'user_id': user_id,
+                 'place': place,
+                 'sum': ScoreValue.deserialize(score_sum),
+                 'scores': [column[i] for column in self.scores]}
+                for i, (user_id, place, score_sum)
+                in enumerate(zip(self.user_ids, self.places, self.sums))]
+
+    def encode(self):
+        payload = json.dumps({
+            'header': self.header,
+            'user_ids': self.user_ids,
+            'places': self.places,
+            'sums': self.sums,
+            'scores': self.scores,
+        }, separators=(',', ':'))
+        return _HEADER.pack(_MAGIC, FORMAT_VERSION) + \
+            zlib.compress(payload.encode('utf-8'))
+
+    @classmethod
+    def decode(cls, data):
+        """Inverts :meth:`encode`. Returns ``None`` if the data is not in
+           a supported format.
+        """
+        data = to_bytes(data)
+        if len(data) < _HEADER.size:
+            return None
+        magic, version = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != FORMAT_VERSION:
+            return None
+        payload = json.loads(
+            zlib.decompress(data[_HEADER.size:]).decode('utf-8'))
+        return cls(payload['header'], payload['user_ids'], payload['places'],
+                   payload['sums'], payload['scores'])
+
+    def build_user_index(self):
+        return build_user_index(self.user_ids)
+
+
+def _index_slot(user_id, capacity):
+    return ((user_id * 2654435761) & 0xffffffff) % capacity
+
+
+def build_user_index(user_ids):
+    """Builds an index mapping user ids to row numbers, to be used with
+       :func:`find_in_user_index`.
+
+       The index is an open addressing hash table with fixed-size slots,
+       so a lookup reads only a few slots of it.
+    """
+    capacity = 1
+    while capacity < 2 * len(user_ids):
+        capacity *= 2
+    index = bytearray(capacity * _INDEX_SLOT.size)
+    for row, user_id in enumerate(user_ids):
+        slot = _index_slot(user_id, capacity)
+        while _INDEX_SLOT.unpack_from(index, slot * _INDEX_SLOT.size)[0]:
+            slot = (slot + 1) % capacity
+        _INDEX_SLOT.pack_into(index, slot * _INDEX_SLOT.size, user_id, row)
+    return bytes(index)
+
+
+def find_in_user_index(index, user_id):
+    """Returns the row number of the user with the given id, or ``None`` if
+       the user is not in the index.
+    """
+    capacity = len(index) // _INDEX_SLOT.size
+    if not capacity:
+        return None
+    slot = _index_slot(user_id, capacity)
+    while True:
+        slot_user_id, row = _INDEX_SLOT.unpack_from(
+            index, slot * _INDEX_SLOT.size)
+        if not slot_user_id:
+            return None
+        if slot_user_id == user_id:
+            return row
+        slot = (slot + 1) % capacity
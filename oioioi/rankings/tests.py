@@ -1,12 +1,16 @@
+import pickle
 import re
-from datetime import datetime  # pylint: disable=E0611
+import time
+from datetime import datetime, timedelta  # pylint: disable=E0611
 
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.urlresolvers import reverse
 from django.http import QueryDict
+from django.test import RequestFactory
 from django.test.utils import override_settings
 from django.utils.timezone import utc
+import pytest
 from six.moves import range, zip
 
 from oioioi.base.templatetags.simple_filters import result_color_class
@@ -18,8 +22,11 @@ from oioioi.contests.scores import IntegerScore
 from oioioi.pa.score import PAScore
 from oioioi.programs.controllers import ProgrammingContestController
 from oioioi.rankings.controllers import DefaultRankingController
-from oioioi.rankings.models import (Ranking, RankingPage, RankingRecalc,
-                                    choose_for_recalculation, recalculate)
+from oioioi.rankings.models import (Ranking, RankingDelta, RankingPage,
+                                    RankingRecalc, choose_for_recalculation,
+                                    recalculate, renew_lease)
+from oioioi.rankings.serialization import (CompactRanking, build_user_index,
+                                           find_in_user_index)
 
 VISIBLE_TASKS = ["zad1", "zad2"]
 HIDDEN_TASKS = ["zad3", "zad4"]
@@ -271,7 +278,9 @@ class TestRankingViews(TestCase):
 
 
 class MockRankingController(DefaultRankingController):
-    recalculation_result = ('serialized', ['1st', '2nd', '3rd'])
+    recalculation_result = ({'rows': [], 'problem_instances': [],
+                             'participants_on_page': 100},
+                            ['1st', '2nd', '3rd'])
 
     def build_ranking(self, key):
         assert key == "key"
@@ -312,7 +321,9 @@ class TestRecalc(TestCase):
         recalculate(recalc)
         ranking.refresh_from_db()
         self.assertTrue(ranking.is_up_to_date())
-        self.assertEqual(ranking.serialized, 'serialized')
+        self.assertEqual(ranking.serialized.header,
+                         {'problem_instances': [], 'participants_on_page': 100})
+        self.assertEqual(ranking.serialized.user_ids, [])
         self.assertEqual([page.data for page in ranking.pages.all()],
                          ['1st', '2nd', '3rd'])
         self.assertEqual([page.nr for page in ranking.pages.all()],
@@ -361,6 +372,65 @@ class TestRecalc(TestCase):
         recalc = choose_for_recalculation()
         self.assertIsNotNone(recalc)
 
+    def test_lease(self):
+        contest = Contest.objects.get()
+        contest.controller_name = \
+            'oioioi.rankings.tests.MockRankingContestController'
+        contest.save()
+        ranking, _ = Ranking.objects.get_or_create(contest=contest, key='key')
+        recalc = choose_for_recalculation('worker1')
+        self.assertEqual(recalc.worker, 'worker1')
+        self.assertIsNotNone(recalc.lease_expiry_date)
+
+        # The ranking is leased, so nobody else may claim it, even after
+        # an invalidation. It isn't even locked to be checked.
+        Ranking.invalidate_contest(contest)
+        with fake_timezone_now(recalc.lease_expiry_date -
+                               timedelta(seconds=1)):
+            with self.assertNumQueries(1):
+                self.assertIsNone(choose_for_recalculation('worker2'))
+            self.assertTrue(renew_lease(recalc))
+
+        # The first worker died, so its recalculation is reclaimed.
+        recalc.refresh_from_db()
+        with fake_timezone_now(recalc.lease_expiry_date +
+                               timedelta(seconds=1)):
+            new_recalc = choose_for_recalculation('worker2')
+        self.assertIsNotNone(new_recalc)
+        self.assertEqual(new_recalc.worker, 'worker2')
+        self.assertTrue(new_recalc.full)
+        self.assertFalse(RankingRecalc.objects.filter(id=recalc.id).exists())
+        self.assertFalse(renew_lease(recalc))
+
+        # Results of the dead worker are discarded.
+        recalculate(recalc)
+        ranking.refresh_from_db()
+        self.assertFalse(ranking.is_up_to_date())
+        recalculate(new_recalc)
+        ranking.refresh_from_db()
+        self.assertTrue(ranking.is_up_to_date())
+        self.assertEqual(ranking.serialized.header,
+                         {'problem_instances': [], 'participants_on_page': 100})
+        self.assertEqual(ranking.serialized.user_ids, [])
+
+    def test_reclaimed_recalc_takes_over_deltas(self):
+        contest = Contest.objects.get()
+        ranking = Ranking.objects.create(contest=contest, key='key',
+                                         needs_full_recalculation=False,
+                                         serialized_data=b'')
+        user = User.objects.get(username='test_user')
+        Ranking.invalidate_user_results(contest, user)
+        recalc = choose_for_recalculation()
+        self.assertFalse(recalc.full)
+        self.assertEqual(recalc.deltas.count(), 1)
+
+        with fake_timezone_now(recalc.lease_expiry_date +
+                               timedelta(seconds=1)):
+            new_recalc = choose_for_recalculation()
+        self.assertFalse(new_recalc.full)
+        self.assertEqual(new_recalc.deltas.count(), 1)
+        self.assertEqual(ranking.deltas.get().recalc, new_recalc)
+
     def test_null_checking(self):
         contest = Contest.objects.get()
         ranking, _ = Ranking.objects.get_or_create(contest=contest, key='key')
@@ -381,6 +451,226 @@ class TestRecalc(TestCase):
         self.assertFalse(ranking.is_up_to_date())
 
 
+class TestIncrementalRecalc(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+            'test_problem_instance', 'test_submission', 'test_extra_rounds',
+            'test_ranking_data', 'test_permissions']
+
+    def setUp(self):
+        self.contest = Contest.objects.get()
+        pi = ProblemInstance.objects.get(id=1)
+        for i in range(4):
+            user = User.objects.create_user('incremental%d' % i)
+            UserResultForProblem(user=user, problem_instance=pi,
+                                 status='OK', score=IntegerScore(i)).save()
+        self.ranking = Ranking.objects.create(contest=self.contest,
+                                              key='admin#c')
+        recalculate(choose_for_recalculation())
+        self.ranking.refresh_from_db()
+
+    def _change_score(self, user_id, score):
+        result = UserResultForProblem.objects.filter(user_id=user_id).first()
+        result.score = IntegerScore(score)
+        result.save()
+        Ranking.invalidate_user_results(self.contest, result.user,
+                                        result.problem_instance)
+
+    def _recalculate_incrementally(self):
+        self.ranking.refresh_from_db()
+        self.assertFalse(self.ranking.is_up_to_date())
+        recalc = choose_for_recalculation()
+        self.assertFalse(recalc.full)
+        self.assertTrue(recalc.deltas.exists())
+        recalculate(recalc)
+        self.assertFalse(RankingDelta.objects.exists())
+
+    def _assert_same_as_full_rebuild(self):
+        self.ranking.refresh_from_db()
+        self.assertTrue(self.ranking.is_up_to_date())
+        serialized, pages = self.ranking.controller() \
+                .build_ranking(self.ranking.key)
+        expected = CompactRanking.from_serialized(serialized)
+        stored = self.ranking.serialized
+        self.assertEqual(stored.user_ids, expected.user_ids)
+        self.assertEqual(stored.places, expected.places)
+        self.assertEqual(stored.sums, expected.sums)
+        self.assertEqual(stored.scores, expected.scores)
+        self.assertEqual([page.data
+                          for page in self.ranking.pages.order_by('nr')],
+                         pages)
+
+    @override_settings(PARTICIPANTS_ON_PAGE=2)
+    def test_only_changed_pages_rendered(self):
+        user_ids = self.ranking.serialized.user_ids
+        self.assertGreater(len(user_ids), 4)
+        page_ids = dict((page.nr, page.id)
+                        for page in self.ranking.pages.all())
+
+        # The leader stays on the first place.
+        self._change_score(user_ids[0], 1000)
+        self._recalculate_incrementally()
+        self._assert_same_as_full_rebuild()
+        new_page_ids = dict((page.nr, page.id)
+                            for page in self.ranking.pages.all())
+        self.assertNotEqual(page_ids[1], new_page_ids[1])
+        del page_ids[1], new_page_ids[1]
+        self.assertEqual(page_ids, new_page_ids)
+
+    @override_settings(PARTICIPANTS_ON_PAGE=2)
+    def test_reordering(self):
+        user_ids = self.ranking.serialized.user_ids
+        self._change_score(user_ids[-1], 2000)
+        self._change_score(user_ids[1], 0)
+        self._recalculate_incrementally()
+        self._assert_same_as_full_rebuild()
+
+        # A new user appears in the ranking.
+        user = User.objects.create_user('incremental_new')
+        UserResultForProblem(user=user,
+                             problem_instance=ProblemInstance.objects.get(id=1),
+                             status='OK', score=IntegerScore(3)).save()
+        Ranking.invalidate_user_results(self.contest, user)
+        self._recalculate_incrementally()
+        self._assert_same_as_full_rebuild()
+
+    def test_full_invalidation(self):
+        self._change_score(self.ranking.serialized.user_ids[0], 5)
+        Ranking.invalidate_contest(self.contest)
+        recalc = choose_for_recalculation()
+        self.assertTrue(recalc.full)
+        recalculate(recalc)
+        self._assert_same_as_full_rebuild()
+
+    @override_settings(RANKING_INCREMENTAL_UPDATES=False)
+    def test_incremental_updates_disabled(self):
+        self._change_score(self.ranking.serialized.user_ids[0], 5)
+        self.assertFalse(RankingDelta.objects.exists())
+        recalc = choose_for_recalculation()
+        self.assertTrue(recalc.full)
+
+
+class TestCompactRanking(TestCase):
+    def _make_data(self, num_users, num_problems):
+        pis = [ProblemInstance(id=i, short_name='p%d' % i)
+               for i in range(1, num_problems + 1)]
+        rows = []
+        for i in range(num_users):
+            user = User(id=i + 1, username='user%d' % i,
+                        first_name='First', last_name='Last %d' % i)
+            results = [UserResultForProblem(user=user, problem_instance=pi,
+                                            score=IntegerScore(i % 100))
+                       if (i + pi.id) % 3 else None for pi in pis]
+            rows.append({'user': user, 'user_id': user.id,
+                         'results': results, 'place': i // 2 + 1,
+                         'sum': IntegerScore(i)})
+        return {'rows': rows,
+                'problem_instances': [(pi, pi.id % 2 == 0) for pi in pis],
+                'participants_on_page': 100,
+                'frozen': False}
+
+    def test_encode_decode(self):
+        data = self._make_data(10, 3)
+        compact = CompactRanking.from_serialized(data)
+        decoded = CompactRanking.decode(compact.encode())
+        self.assertEqual(decoded.header, {
+            'problem_instances': [[1, False], [2, True], [3, False]],
+            'participants_on_page': 100,
+            'frozen': False,
+        })
+        self.assertEqual(decoded.problem_instance_ids, [1, 2, 3])
+        self.assertEqual(decoded.user_ids, list(range(1, 11)))
+        self.assertEqual(decoded.places, [row['place'] for row in data['rows']])
+        rows = decoded.rows()
+        for row, original in zip(rows, data['rows']):
+            self.assertEqual(row['user_id'], original['user'].id)
+            self.assertEqual(row['sum'], original['sum'])
+            self.assertEqual(row['scores'],
+                             [r.score.serialize() if r else ''
+                              for r in original['results']])
+        self.assertEqual(CompactRanking.from_serialized(
+                {'rows': rows, 'problem_instances': data['problem_instances'],
+                 'participants_on_page': 100, 'frozen': False}).encode(),
+                compact.encode())
+
+        self.assertIsNone(CompactRanking.decode(b''))
+        self.assertIsNone(CompactRanking.decode(b'not a ranking'))
+
+    def test_user_index(self):
+        user_ids = [5, 3, 1024, 7, 2048, 1]
+        index = build_user_index(user_ids)
+        for row, user_id in enumerate(user_ids):
+            self.assertEqual(find_in_user_index(index, user_id), row)
+        for user_id in [2, 4, 1023, 4096]:
+            self.assertIsNone(find_in_user_index(index, user_id))
+        self.assertIsNone(find_in_user_index(build_user_index([]), 1))
+        self.assertIsNone(find_in_user_index(b'', 1))
+
+    @pytest.mark.slow
+    def test_benchmark(self):
+        num_users = 5000
+        data = self._make_data(num_users, 12)
+
+        pickled = pickle.dumps(data)
+        compact = CompactRanking.from_serialized(data)
+        encoded = compact.encode()
+        index = compact.build_user_index()
+
+        start = time.time()
+        for user_id in range(1, num_users + 1, 100):
+            rows = pickle.loads(pickled)['rows']
+            next(i for i, row in enumerate(rows) if row['user'].id == user_id)
+        pickle_lookup = (time.time() - start) / (num_users // 100)
+
+        start = time.time()
+        for user_id in range(1, num_users + 1):
+            find_in_user_index(index, user_id)
+        index_lookup = (time.time() - start) / num_users
+
+        start = time.time()
+        CompactRanking.decode(encoded).rows()
+        decode_time = time.time() - start
+
+        print("Ranking of %d users: pickle %d bytes, compact %d bytes "
+              "+ %d bytes of index" % (num_users, len(pickled), len(encoded),
+                                        len(index)))
+        print("User lookup: pickle %.6fs, index %.6fs; full decode %.6fs"
+              % (pickle_lookup, index_lookup, decode_time))
+        self.assertLess(len(encoded) + len(index), len(pickled) // 5)
+        self.assertLess(index_lookup, pickle_lookup)
+
+
+class TestRankingsdFindUser(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+            'test_problem_instance', 'test_submission', 'test_extra_rounds',
+            'test_ranking_data', 'test_permissions']
+
+    @override_settings(MOCK_RANKINGSD=False)
+    def test_find_user_position(self):
+        contest = Contest.objects.get()
+        rcontroller = contest.controller.ranking_controller()
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(username='test_user')
+        request.contest = contest
+        request.timestamp = datetime(2015, 8, 5, tzinfo=utc)
+        key = rcontroller.get_full_key(request, 'c')
+
+        self.assertIsNone(
+            rcontroller.find_user_position(request, 'c', request.user))
+        Ranking.objects.create(contest=contest, key=key)
+        self.assertIsNone(
+            rcontroller.find_user_position(request, 'c', request.user))
+
+        with fake_timezone_now(request.timestamp):
+            recalculate(choose_for_recalculation())
+        user_ids = Ranking.objects.get(key=key).serialized.user_ids
+        self.assertIn(request.user.id, user_ids)
+        for position, user_id in enumerate(user_ids, 1):
+            self.assertEqual(rcontroller.find_user_position(request, 'c',
+                    User.objects.get(id=user_id)), position)
+        self.assertIsNone(rcontroller.find_user_position(request, 'c',
+                User.objects.get(username='test_admin')))
+
+
 class TestRankingsdFrontend(TestCase):
     fixtures = ['test_users', 'test_contest', 'test_full_package',
             'test_problem_instance', 'test_submission', 'test_extra_rounds',
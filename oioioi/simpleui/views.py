@@ -13,7 +13,7 @@ from django.template.response import TemplateResponse
 
 from oioioi.base.main_page import register_main_page_view
 from oioioi.base.permissions import enforce_condition, is_superuser
-from oioioi.contests.controllers import submission_template_context
+from oioioi.contests.controllers import submission_template_contexts
 from oioioi.contests.models import (ProblemInstance, Round, Submission,
                                     UserResultForContest, UserResultForProblem)
 from oioioi.contests.utils import (can_admin_contest, contest_exists,
@@ -169,8 +169,8 @@ def contest_dashboard_view(request, round_pk=None):
                         'problem_instance__round',
                         'problem_instance__problem')
 
-    ss = [submission_template_context(request, s) for s in
-          queryset[:NUMBER_OF_RECENT_ACTIONS]]
+    ss = submission_template_contexts(request,
+                                      queryset[:NUMBER_OF_RECENT_ACTIONS])
 
     rtimes = list(rounds_times(request).items())
     rtimes.sort(key=lambda r_rt: r_rt[0].start_date)
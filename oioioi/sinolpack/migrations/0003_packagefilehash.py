@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.13 on 2026-10-17 12:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0010_save_all'),
+        ('sinolpack', '0002_filefield'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageFileHash',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('hash', models.CharField(max_length=64)),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='problems.Problem')),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='packagefilehash',
+            unique_together=set([('problem', 'name')]),
+        ),
+    ]
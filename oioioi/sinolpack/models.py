@@ -43,3 +43,16 @@ class OriginalPackage(models.Model):
     class Meta(object):
         verbose_name = _("original problem package")
         verbose_name_plural = _("original problem packages")
+
+
+class PackageFileHash(models.Model):
+    """Hash of a file from the last package of a problem, or of the inputs
+       of a program run on it. Used to skip the unchanged tests when the
+       package is uploaded again.
+    """
+    problem = models.ForeignKey(Problem)
+    name = models.CharField(max_length=255)
+    hash = models.CharField(max_length=64)
+
+    class Meta(object):
+        unique_together = ('problem', 'name')
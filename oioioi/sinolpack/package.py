@@ -1,10 +1,15 @@
 import glob
+import hashlib
+import json
 import logging
 import os
 import re
 import shutil
 import tempfile
+import threading
+import time
 import zipfile
+from multiprocessing.pool import ThreadPool
 
 import chardet
 from django.conf import settings
@@ -17,17 +22,21 @@ import six
 from six.moves import filter, map
 
 from oioioi.base.utils import generate_key, naturalsort_key
-from oioioi.base.utils.archive import Archive
+from oioioi.base.utils.archive import Archive, ArchiveException
 from oioioi.base.utils.execute import ExecuteError, execute
-from oioioi.filetracker.client import get_client
+from oioioi.filetracker.client import get_client, new_client
+from oioioi.filetracker.storage import FiletrackerStorage
 from oioioi.filetracker.utils import (django_to_filetracker_path,
                                       filetracker_to_django_file, stream_file)
 from oioioi.problems.models import (Problem, ProblemAttachment, ProblemPackage,
-                                    ProblemSite, ProblemStatement)
+                                    ProblemSite, ProblemStatement,
+                                    make_problem_filename)
 from oioioi.problems.package import ProblemPackageBackend, ProblemPackageError
+from oioioi.programs import compilation_cache
 from oioioi.programs.models import (LibraryProblemData, ModelSolution,
                                     OutputChecker, Test)
-from oioioi.sinolpack.models import ExtraConfig, ExtraFile, OriginalPackage
+from oioioi.sinolpack.models import (ExtraConfig, ExtraFile, OriginalPackage,
+                                     PackageFileHash)
 from oioioi.sinolpack.utils import add_extra_files
 from oioioi.sioworkers.jobs import run_sioworkers_job, run_sioworkers_jobs
 
@@ -70,6 +79,29 @@ def _make_filename_in_job_dir(env, base_name):
     return '%s/%s-%s' % (env['unpack_dir'], env['job_id'], base_name)
 
 
+def _hash_values(*values):
+    return hashlib.sha256(json.dumps(values).encode('utf-8')).hexdigest()
+
+
+def _dir_size(path):
+    return sum(os.lstat(os.path.join(dirpath, name)).st_size
+               for dirpath, _dirnames, filenames in os.walk(path)
+               for name in filenames)
+
+
+class _DiskUsage(object):
+    """Tracks the total size of the files unpacked from a package."""
+
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        self.size = self.peak = size
+
+    def add(self, size):
+        with self.lock:
+            self.size += size
+            self.peak = max(self.peak, self.size)
+
+
 def _remove_from_zip(zipfname, *filenames):
     """Removes files from zip file by creating new zip file with all
        the files except the files to remove. Then the old file is removed.
@@ -105,6 +137,8 @@ class SinolPackage(object):
         self.problem = None
         self.main_problem_instance = None
         self.rootdir = None
+        self.archive_test_files = None
+        self.disk_usage = None
         self.short_name = None
         self.env = None
         self.package = None
@@ -112,6 +146,11 @@ class SinolPackage(object):
         self.memory_limits = None
         self.statement_memory_limit = None
         self.prog_archive = None
+        self.prog_archive_hash = None
+        self.checker_hash = None
+        self.old_hashes = {}
+        self.new_hashes = {}
+        self.judging_changed = True
         self.extra_compilation_args = \
                 {'c': C_EXTRA_ARGS, 'cpp': C_EXTRA_ARGS, 'pas': PAS_EXTRA_ARGS}
         self.use_make = settings.USE_SINOLPACK_MAKEFILES
@@ -154,7 +193,8 @@ class SinolPackage(object):
         basename = os.path.basename(filetracker_to_django_file(file).name)
         filename = os.path.join(self.rootdir, basename)
         get_client().get_file(file, filename)
-        field.save(os.path.basename(filename), File(open(filename, 'rb')))
+        with open(filename, 'rb') as f:
+            field.save(os.path.basename(filename), File(f))
         get_client().delete_file(file)
 
     def _find_and_compile(self, suffix, command=None, cwd=None,
@@ -205,10 +245,15 @@ class SinolPackage(object):
             _make_filename_in_job_dir(self.env, source_name),
             filename)
 
-        if not out_name:
-            out_name = _make_filename_in_job_dir(self.env, '%s.e' % prog_name)
-
-        new_env = self._run_compilation_job(ext, ft_source_name, out_name)
+        if out_name or not compilation_cache.is_enabled():
+            if not out_name:
+                out_name = _make_filename_in_job_dir(self.env,
+                                                     '%s.e' % prog_name)
+            new_env = self._run_compilation_job(ext, ft_source_name,
+                                                out_name)
+        else:
+            new_env = self._run_cached_compilation_job(filename, prog_name,
+                                                       ext, ft_source_name)
         client.delete_file(ft_source_name)
 
         self._ensure_compilation_success(filename, new_env)
@@ -217,7 +262,33 @@ class SinolPackage(object):
         new_env['compiled_file'] = new_env['out_file']
         return new_env
 
-    def _run_compilation_job(self, ext, ft_source_name, out_name):
+    def _run_cached_compilation_job(self, filename, prog_name, ext,
+                                    ft_source_name):
+        """Compiles the program using the compilation cache. The returned
+           ``out_file`` may belong to the cache, so it should be deleted with
+           :func:`oioioi.programs.compilation_cache.delete_executable`.
+        """
+        compilation_job = self._make_compilation_job(ext, ft_source_name,
+                                                     None)
+        key = compilation_cache.compilation_key(compilation_job,
+                compilation_cache.hash_local_file(filename),
+                self.prog_archive_hash)
+        result, owner = compilation_cache.claim(key)
+        if result is not None:
+            return result
+        if not owner:
+            # Someone else is compiling it right now, we won't wait.
+            out_name = _make_filename_in_job_dir(self.env, '%s.e' % prog_name)
+            return self._run_compilation_job(ext, ft_source_name, out_name)
+        compilation_job['out_file'] = compilation_cache.cache_file_name(key)
+        new_env = {}
+        try:
+            new_env = run_sioworkers_job(compilation_job)
+        finally:
+            compilation_cache.finish(key, new_env)
+        return new_env
+
+    def _make_compilation_job(self, ext, ft_source_name, out_name):
         compilation_job = self.env.copy()
         compilation_job['job_type'] = 'compile'
         compilation_job['task_priority'] = TASK_PRIORITY
@@ -234,6 +305,11 @@ class SinolPackage(object):
             compilation_job['additional_archive'] = self.prog_archive
         add_extra_files(compilation_job, self.problem,
                         additional_args=self.extra_compilation_args)
+        return compilation_job
+
+    def _run_compilation_job(self, ext, ft_source_name, out_name):
+        compilation_job = self._make_compilation_job(ext, ft_source_name,
+                                                     out_name)
         new_env = run_sioworkers_job(compilation_job)
         return new_env
 
@@ -264,7 +340,7 @@ class SinolPackage(object):
                 _make_filename_in_job_dir(self.env, 'in')
 
             renv = run_sioworkers_job(env)
-            get_client().delete_file(env['compiled_file'])
+            compilation_cache.delete_executable(env['compiled_file'])
             return renv['collected_files']
 
         return {}
@@ -318,18 +394,74 @@ class SinolPackage(object):
     def _extract_and_process_package(self):
         tmpdir = tempfile.mkdtemp()
         logger.info("%s: tmpdir is %s", self.filename, tmpdir)
+        start_time = time.time()
         try:
-            self.archive.extract(to_path=tmpdir)
             self.rootdir = os.path.join(tmpdir, self.short_name)
+            if self._use_streaming():
+                self._extract_all_but_tests(tmpdir)
+            else:
+                self.archive.extract(to_path=tmpdir)
+            self.disk_usage = _DiskUsage(_dir_size(tmpdir))
             self._process_package()
 
+            logger.info("%s: processed in %.1fs, peak size of unpacked "
+                        "files: %d bytes", self.filename,
+                        time.time() - start_time, self.disk_usage.peak)
             return self.problem
         finally:
             shutil.rmtree(tmpdir)
             if self.prog_archive:
                 get_client().delete_file(self.prog_archive)
 
+    def _use_streaming(self):
+        # Makefiles need the tests in the in/ and out/ directories.
+        return settings.SINOLPACK_STREAMING_EXTRACTION and not self.use_make
+
+    def _extract_all_but_tests(self, tmpdir):
+        """Extracts the package, except for the files in the in/ and out/
+           directories, which are read straight from the archive when
+           they're saved (see :meth:`_upload_test_files`).
+        """
+        self.archive_test_files = {}
+        members = []
+        for name in self.archive.filenames():
+            parts = os.path.normpath(os.path.normcase(name)).split(os.sep)
+            if len(parts) == 3 and parts[0] == self.short_name \
+                    and parts[1] in ('in', 'out'):
+                self.archive_test_files[os.path.join(*parts[1:])] = name
+            else:
+                members.append(name)
+        self.archive.extract(to_path=tmpdir, members=members)
+        if not os.path.isdir(self.rootdir):
+            os.makedirs(self.rootdir)
+
+    def _list_test_files(self, subdir):
+        if self.archive_test_files is not None:
+            prefix = subdir + os.sep
+            return [path[len(prefix):] for path in self.archive_test_files
+                    if path.startswith(prefix)]
+        return os.listdir(os.path.join(self.rootdir, subdir))
+
+    def _has_test_file(self, subdir, basename):
+        path = os.path.join(subdir, basename)
+        if self.archive_test_files is not None:
+            return path in self.archive_test_files
+        return os.path.isfile(os.path.join(self.rootdir, path))
+
+    def _test_file_upload(self, instance, field_name, subdir, basename):
+        """Returns the upload (see :meth:`_upload_test_files`) of the file
+           ``subdir/basename`` from the package.
+        """
+        path = os.path.join(subdir, basename)
+        if self.archive_test_files is not None:
+            return (instance, field_name, basename,
+                    self.archive_test_files[path], 'archive')
+        return (instance, field_name, basename,
+                os.path.join(self.rootdir, path), 'local')
+
     def _process_package(self):
+        self.old_hashes = dict(PackageFileHash.objects
+                .filter(problem=self.problem).values_list('name', 'hash'))
         self._process_config_yml()
         self._detect_full_name()
         self._detect_library()
@@ -343,8 +475,73 @@ class SinolPackage(object):
         self._process_checkers()
         self._process_model_solutions()
         self._process_attachments()
+        self._save_hashes()
         self._save_original_package()
 
+    def _program_hash(self, suffix):
+        """Returns a hash of the source of the program
+           ``short_name + suffix`` and of the files in ``prog/`` which aren't
+           sources of programs (e.g. headers), or ``None`` if there's no such
+           program.
+        """
+        progdir = os.path.join(self.rootdir, 'prog')
+        if not os.path.isdir(progdir):
+            return None
+        extensions = set(ext for exts in getattr(settings,
+                'SUBMITTABLE_EXTENSIONS', {}).values() for ext in exts)
+        prefix = self.short_name + suffix + '.'
+        hashes = []
+        found = False
+        for name in sorted(os.listdir(progdir)):
+            path = os.path.join(progdir, name)
+            if not os.path.isfile(path):
+                continue
+            if name.startswith(prefix):
+                found = True
+            elif os.path.splitext(name)[1][1:] in extensions:
+                continue
+            hashes.append((name, compilation_cache.hash_local_file(path)))
+        if not found:
+            return None
+        return _hash_values(hashes)
+
+    def _judging_hash(self):
+        """Returns a hash of everything in the package which affects
+           judging of submissions.
+        """
+        config = ExtraConfig.objects.get(problem=self.problem).config
+        # The hash of the checker's executable changes along with the
+        # compiler, unlike the hash of its source.
+        values = [config, self._program_hash('chk'), self.checker_hash,
+                  self.use_make, self.use_sandboxes]
+        for filename in self.config.get('extra_compilation_files', ()):
+            values.append(compilation_cache.hash_local_file(
+                    os.path.join(self.rootdir, 'prog', filename)))
+        for test in Test.objects.filter(
+                problem_instance=self.main_problem_instance) \
+                .order_by('name'):
+            basename = self.short_name + test.name
+            values.append([test.name, test.kind, test.group,
+                           test.time_limit, test.memory_limit,
+                           test.max_score, test.is_active,
+                           self.new_hashes.get(basename + '.in'),
+                           self.new_hashes.get(basename + '.out')])
+        return _hash_values(*values)
+
+    def _save_hashes(self):
+        """Saves the hashes of the files from the package and checks
+           whether anything which affects judging has changed since the last
+           upload.
+        """
+        self.new_hashes['judging'] = self._judging_hash()
+        self.judging_changed = \
+            self.old_hashes.get('judging') != self.new_hashes['judging']
+        PackageFileHash.objects.filter(problem=self.problem).delete()
+        PackageFileHash.objects.bulk_create([
+            PackageFileHash(problem=self.problem, name=name, hash=value)
+            for name, value in six.iteritems(self.new_hashes)
+            if value is not None])
+
     def _process_config_yml(self):
         """Parses config file from problem dir, saves its content to
            the current instance.
@@ -445,6 +642,7 @@ class SinolPackage(object):
                 root_dir=prog_dir)
         self.prog_archive = get_client().put_file(
                 _make_filename_in_job_dir(self.env, archive), archive)
+        self.prog_archive_hash = compilation_cache.hash_local_file(archive)
 
     def _process_statements(self):
         """Creates problem statement from html or pdf source.
@@ -570,15 +768,13 @@ class SinolPackage(object):
                             outs that have to be generated,
                             score groups (determined by test names))
         """
-        indir = os.path.join(self.rootdir, 'in')
-        outdir = os.path.join(self.rootdir, 'out')
-
         re_string = r'^(%s(([0-9]+)([a-z]?[a-z0-9]*))).in$' \
                     % (re.escape(self.short_name))
         names_re = re.compile(re_string)
 
         collected_ins = self._make_ins(re_string)
-        all_items = list(set(os.listdir(indir)) | set(collected_ins.keys()))
+        all_items = list(set(self._list_test_files('in')) |
+                         set(collected_ins.keys()))
 
         created_tests = []
         outs_to_make = []
@@ -587,16 +783,159 @@ class SinolPackage(object):
         if self.use_make:
             self._find_and_compile('', command='outgen')
 
+        existing_tests = dict((test.name, test) for test in
+                Test.objects.filter(problem_instance=self.main_problem_instance))
+        uploads = []
         for order, test in enumerate(sorted(all_items, key=naturalsort_key)):
             instance = self._process_test(test, order, names_re,
-                                          indir, outdir,
                                           collected_ins, scored_groups,
-                                          outs_to_make)
+                                          outs_to_make, existing_tests,
+                                          uploads)
             if instance:
                 created_tests.append(instance)
 
+        self._upload_test_files(uploads)
+        self._save_tests(created_tests)
         return created_tests, outs_to_make, scored_groups
 
+    def _upload_thread_client(self):
+        # Filetracker clients can't be shared between threads.
+        if not hasattr(self._upload_thread_data, 'client'):
+            self._upload_thread_data.client = new_client()
+        return self._upload_thread_data.client
+
+    def _upload_test_file(self, upload, slots):
+        instance, field_name, basename, source, source_type = upload
+        client = self._upload_thread_client()
+        filename = source
+        try:
+            if source_type == 'filetracker':
+                filename = os.path.join(self.rootdir, basename)
+                client.get_file(source, filename)
+            file_hash = compilation_cache.hash_local_file(filename)
+            self.new_hashes[basename] = file_hash
+            if getattr(instance, field_name) \
+                    and self.old_hashes.get(basename) == file_hash:
+                # Unchanged since the last upload of the package.
+                name = None
+            else:
+                storage = Test._meta.get_field(field_name).storage
+                if isinstance(storage, FiletrackerStorage):
+                    storage = FiletrackerStorage(prefix=storage.prefix,
+                                                 client=client)
+                with open(filename, 'rb') as f:
+                    name = storage.save(
+                            make_problem_filename(self.problem, basename),
+                            File(f))
+            if source_type == 'filetracker':
+                client.delete_file(source)
+        finally:
+            if source_type == 'temporary':
+                size = os.path.getsize(filename)
+                os.unlink(filename)
+                self.disk_usage.add(-size)
+            elif source_type == 'filetracker' and os.path.exists(filename):
+                os.unlink(filename)
+            slots.release()
+        return upload, name
+
+    def _read_uploads(self, uploads):
+        """Yields the uploads, replacing the ones of files in the archive
+           with uploads of their temporary copies, which are made one by one,
+           in the order of the files in the archive.
+        """
+        from_archive = {}
+        for upload in uploads:
+            if upload[4] == 'archive':
+                from_archive[upload[3]] = upload
+            else:
+                yield upload
+        if not from_archive:
+            return
+        try:
+            for member, f in self.archive.iter_files(from_archive):
+                upload = from_archive.pop(member, None)
+                if upload is None:
+                    continue
+                tmp = tempfile.NamedTemporaryFile(dir=self.rootdir,
+                                                  prefix='.test',
+                                                  delete=False)
+                with tmp:
+                    shutil.copyfileobj(f, tmp)
+                f.close()
+                self.disk_usage.add(os.path.getsize(tmp.name))
+                yield upload[:3] + (tmp.name, 'temporary')
+        except ArchiveException as e:
+            raise ProblemPackageError(_("Invalid test file: %s") % (e,))
+        if from_archive:
+            raise ProblemPackageError(_("Test files missing from the "
+                    "archive: %s") % ', '.join(sorted(from_archive)))
+
+    def _finish_upload(self, result, done, total):
+        upload, name = result.get()
+        if name is not None:
+            setattr(upload[0], upload[1], name)
+        if done % 20 == 0 or done == total:
+            self.package.set_progress(_("Uploaded %(done)d of "
+                    "%(total)d test files") % {'done': done, 'total': total})
+
+    def _upload_test_files(self, uploads):
+        """Saves test files concurrently, in
+           ``settings.SINOLPACK_UPLOAD_THREADS`` threads, reporting the
+           progress to the package.
+
+           :param uploads: List of tuples ``(test, field name, file basename,
+                  source, source type)``. ``source`` is a local path if the
+                  type is ``'local'``, a Filetracker path of a file which is
+                  deleted once it's saved if it's ``'filetracker'``, or the
+                  name of a file in the package archive if it's
+                  ``'archive'``. Files from the archive are copied to
+                  temporary files as they're read, and at most twice as many
+                  copies as threads are kept at once. Files which haven't
+                  changed since the last upload of the package are not
+                  saved again.
+        """
+        if not uploads:
+            return
+        threads = min(settings.SINOLPACK_UPLOAD_THREADS, len(uploads))
+        self._upload_thread_data = threading.local()
+        pool = ThreadPool(threads)
+        slots = threading.BoundedSemaphore(2 * threads)
+        results = []
+        done = 0
+        try:
+            for upload in self._read_uploads(uploads):
+                slots.acquire()
+                results.append(pool.apply_async(self._upload_test_file,
+                                                 (upload, slots)))
+                while done < len(results) and results[done].ready():
+                    done += 1
+                    self._finish_upload(results[done - 1], done, len(uploads))
+            for result in results[done:]:
+                done += 1
+                self._finish_upload(result, done, len(uploads))
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def _save_tests(self, tests):
+        """Saves the test instances. New tests are created in bulk."""
+        new_tests = []
+        for test in tests:
+            if test.pk is None:
+                new_tests.append(test)
+            else:
+                test.save()
+        Test.objects.bulk_create(new_tests)
+        # Ids of the created objects are not set by all database backends.
+        if new_tests and new_tests[0].pk is None:
+            ids = dict(Test.objects.filter(
+                    problem_instance=self.main_problem_instance,
+                    name__in=[test.name for test in new_tests])
+                .values_list('name', 'id'))
+            for test in new_tests:
+                test.id = ids[test.name]
+
     def _verify_time_limits(self, tests):
         """:raises: :class:`~oioioi.problems.package.ProblemPackageError`
            if sum of tests time limits exceeds
@@ -618,6 +957,11 @@ class SinolPackage(object):
            :raises: :class:`~oioioi.problems.package.ProblemPackageError`
            otherwise.
         """
+        if not self.use_make:
+            tests = self._tests_to_verify(tests)
+            if not tests:
+                logger.info("%s: no changed inputs for inwer", self.filename)
+                return
         env = self._find_and_compile('inwer')
         if env and not self.use_make:
             jobs = {}
@@ -632,7 +976,7 @@ class SinolPackage(object):
                 jobs[test.name] = job
 
             jobs = run_sioworkers_jobs(jobs)
-            get_client().delete_file(env['compiled_file'])
+            compilation_cache.delete_executable(env['compiled_file'])
 
             for test_name, job in six.iteritems(jobs):
                 if job['result_code'] != 'OK':
@@ -645,14 +989,59 @@ class SinolPackage(object):
 
             logger.info("%s: inwer success", self.filename)
 
+    def _tests_to_verify(self, tests):
+        """Returns the tests whose inputs haven't been verified by the same
+           inwer already.
+        """
+        inwer_hash = self._program_hash('inwer')
+        if inwer_hash is None:
+            return tests
+        result = []
+        for test in tests:
+            key_name = 'inwer/' + test.name
+            self.new_hashes[key_name] = _hash_values(inwer_hash,
+                    self.new_hashes.get(self.short_name + test.name + '.in'))
+            if self.old_hashes.get(key_name) != self.new_hashes[key_name]:
+                result.append(test)
+        return result
+
+    def _outs_to_regenerate(self, outs_to_make):
+        """Skips the outputs which would be generated by the same outgen,
+           from the same inputs, as in the last upload of the package.
+        """
+        outgen_hash = self._program_hash('')
+        if outgen_hash is None:
+            return outs_to_make
+        result = []
+        for outname, test in outs_to_make:
+            basename = self.short_name + test.name
+            key_name = 'outgen/' + test.name
+            self.new_hashes[key_name] = _hash_values(outgen_hash,
+                    self.new_hashes.get(basename + '.in'), test.memory_limit)
+            if test.output_file \
+                    and self.old_hashes.get(key_name) == \
+                    self.new_hashes[key_name]:
+                self.new_hashes[basename + '.out'] = \
+                    self.old_hashes.get(basename + '.out')
+            else:
+                result.append((outname, test))
+        return result
+
     def _generate_test_outputs(self, tests, outs_to_make):
         if not self.use_make:
+            outs_to_make = self._outs_to_regenerate(outs_to_make)
             outs = self._make_outs(outs_to_make)
+            uploads = []
             for instance in tests:
                 if instance.name in outs:
-                    generated_out = outs[instance.name]
-                    self._save_to_field(instance.output_file,
-                                        generated_out['out_file'])
+                    out_file = outs[instance.name]['out_file']
+                    uploads.append((instance, 'output_file',
+                        os.path.basename(
+                            filetracker_to_django_file(out_file).name),
+                        out_file, 'filetracker'))
+            self._upload_test_files(uploads)
+            for instance, _field_name, _basename, _path, _type in uploads:
+                instance.save(update_fields=['output_file'])
 
     def _validate_tests(self, created_tests):
         """Check if all tests have output files and that
@@ -675,8 +1064,8 @@ class SinolPackage(object):
             logger.info("%s: deleting test %s", self.filename, test.name)
             test.delete()
 
-    def _process_test(self, test, order, names_re, indir, outdir,
-            collected_ins, scored_groups, outs_to_make):
+    def _process_test(self, test, order, names_re, collected_ins,
+            scored_groups, outs_to_make, existing_tests, uploads):
         """Responsible for saving test in and out files,
            setting test limits, assigning test kind and group.
            :param test: Test name.
@@ -684,14 +1073,16 @@ class SinolPackage(object):
            :param names_re: Compiled regex to match test details from name.
                   Should extract basename, test name,
                   group number and test type.
-           :param indir: Directory with tests inputs.
-           :param outdir: Directory with tests outputs.
            :param collected_ins: List of inputs that were generated,
                   not taken from archive as a file.
            :param scored_groups: Accumulator for score groups.
            :param outs_to_make: Accumulator for name of output files to
                   be generated by model solution.
-           :return: Test instance or None if name couldn't be matched.
+           :param existing_tests: Dictionary of the problem's tests, by name.
+           :param uploads: Accumulator for test files to be saved (see
+                  :meth:`_upload_test_files`).
+           :return: Unsaved test instance or None if name couldn't be
+                    matched.
         """
         match = names_re.match(test)
         if not match:
@@ -706,21 +1097,25 @@ class SinolPackage(object):
         group = match.group(3)       # 0
         suffix = match.group(4)      # ocen
 
-        instance, created = Test.objects.get_or_create(
-                problem_instance=self.main_problem_instance, name=name)
+        instance = existing_tests.get(name)
+        created = instance is None
+        if created:
+            instance = Test(problem_instance=self.main_problem_instance,
+                            name=name)
 
         inname_base = basename + '.in'
-        inname = os.path.join(indir, inname_base)
         outname_base = basename + '.out'
-        outname = os.path.join(outdir, outname_base)
 
         if test in collected_ins:
-            self._save_to_field(instance.input_file, collected_ins[test])
+            uploads.append((instance, 'input_file', inname_base,
+                            collected_ins[test], 'filetracker'))
         else:
-            instance.input_file.save(inname_base, File(open(inname, 'rb')))
+            uploads.append(self._test_file_upload(instance, 'input_file',
+                                                  'in', inname_base))
 
-        if os.path.isfile(outname):
-            instance.output_file.save(outname_base, File(open(outname), 'rb'))
+        if self._has_test_file('out', outname_base):
+            uploads.append(self._test_file_upload(instance, 'output_file',
+                                                  'out', outname_base))
         else:
             outs_to_make.append((_make_filename_in_job_dir(self.env,
                 'out/%s' % (outname_base)), instance))
@@ -743,7 +1138,6 @@ class SinolPackage(object):
             instance.memory_limit = memory_limit
 
         instance.order = order
-        instance.save()
         return instance
 
     def _get_memory_limit(self, created, name):
@@ -788,7 +1182,7 @@ class SinolPackage(object):
             jobs[test.name] = job
 
         jobs = run_sioworkers_jobs(jobs)
-        get_client().delete_file(env['compiled_file'])
+        compilation_cache.delete_executable(env['compiled_file'])
         return jobs
 
     def _check_scores_from_config(self, scored_groups, config_scores):
@@ -879,9 +1273,15 @@ class SinolPackage(object):
                 log_on_failure=False,
                 out_name=out_name)
         if not self.use_make and env:
+            self.checker_hash = compilation_cache.hash_filetracker_file(
+                    env['compiled_file'])
             self._save_to_field(instance.exe_file, env['compiled_file'])
         else:
-            instance.exe_file = self._find_checker_exec()
+            exe = self._find_checker_exec()
+            if exe is not None:
+                self.checker_hash = compilation_cache.hash_local_file(
+                        exe.name)
+            instance.exe_file = exe
             instance.save()
 
     def _find_checker_exec(self):
@@ -1082,9 +1482,11 @@ class SinolPackageBackend(ProblemPackageBackend):
         with tempfile.NamedTemporaryFile() as tmpfile:
             shutil.copyfileobj(package.package_file.file, tmpfile)
             tmpfile.flush()
-            problem = self.package_class(tmpfile.name,
-                    package.package_file.name).unpack(env, package)
+            package_instance = self.package_class(tmpfile.name,
+                    package.package_file.name)
+            problem = package_instance.unpack(env, package)
             env['problem_id'] = problem.id
+            env['needs_rejudge'] = package_instance.judging_changed
         return env
 
     def pack(self, problem):
@@ -9,6 +9,7 @@ from django.core.management.base import CommandError
 from django.core.urlresolvers import reverse
 from django.test import TransactionTestCase
 from django.test.utils import override_settings
+import mock
 import pytest
 import six.moves.urllib.parse
 from six.moves import cStringIO as StringIO
@@ -22,7 +23,7 @@ from oioioi.filetracker.tests import TestStreamingMixin
 from oioioi.problems.models import Problem, ProblemPackage, ProblemStatement
 from oioioi.programs.models import (ModelSolution, OutputChecker, Test,
                                     TestReport)
-from oioioi.sinolpack.models import ExtraConfig, ExtraFile
+from oioioi.sinolpack.models import ExtraConfig, ExtraFile, PackageFileHash
 from oioioi.sinolpack.package import (DEFAULT_MEMORY_LIMIT, DEFAULT_TIME_LIMIT,
                                       SinolPackageBackend)
 
@@ -254,6 +255,33 @@ class TestSinolPackage(TestCase):
         problem = Problem.objects.get()
         self._check_no_ingen_package(problem)
 
+    @no_makefiles
+    def test_reupload_unchanged_package(self):
+        filename = get_test_filename('test_no_ingen_package.tgz')
+        call_command('addproblem', filename)
+        problem = Problem.objects.get()
+        judging_hash = PackageFileHash.objects.get(problem=problem,
+                                                   name='judging').hash
+
+        with mock.patch('oioioi.sinolpack.package.make_problem_filename') \
+                as make_filename:
+            call_command('updateproblem', str(problem.id), filename)
+        # No test file was saved again.
+        self.assertFalse(make_filename.called)
+        problem = Problem.objects.get()
+        self._check_no_ingen_package(problem)
+        self.assertEqual(PackageFileHash.objects.get(problem=problem,
+                                                     name='judging').hash,
+                         judging_hash)
+
+    @no_makefiles
+    @override_settings(SINOLPACK_STREAMING_EXTRACTION=False)
+    def test_no_ingen_package_without_streaming(self):
+        filename = get_test_filename('test_no_ingen_package.tgz')
+        call_command('addproblem', filename)
+        problem = Problem.objects.get()
+        self._check_no_ingen_package(problem)
+
     def _check_full_package(self, problem, doc=True):
         self.assertEqual(problem.short_name, 'sum')
 
@@ -1,13 +1,20 @@
+import atexit
 import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
 
 import sio.celery.job
 import sio.workers.runner
+from celery.signals import worker_process_shutdown
 from django.conf import settings
 from django.db import transaction
 import six
-from six.moves.xmlrpc_client import Server
 
 from oioioi.evalmgr.tasks import delay_environ
+from oioioi.sioworkers.client import get_sioworkersd_client
 
 # This is a workaround for SIO-915. We assume that other parts of OIOIOI code
 # do not rely on particular directory being the current directory. Without
@@ -15,25 +22,90 @@ from oioioi.evalmgr.tasks import delay_environ
 # code.
 from threading import Lock
 
+logger = logging.getLogger(__name__)
+
 _local_backend_lock = Lock()
 
+# Maps (pid, number of processes) to pairs (pool, directory with working
+# directories of its processes).
+_local_pools = {}
+
+
+def _init_local_pool_process(base_dir):
+    # Each process of the pool gets its own working directory, so jobs
+    # running in parallel don't need the lock above.
+    os.chdir(tempfile.mkdtemp(dir=base_dir))
+
+
+def _run_in_local_pool(job):
+    return sio.workers.runner.run(job)
+
+
+def close_local_pools(**kwargs):
+    """Stops the processes of the pools of :class:`LocalBackend` created by
+       this process and removes their working directories.
+
+       Called at exit of the process, or of a Celery worker process.
+    """
+    with _local_backend_lock:
+        for key in list(_local_pools):
+            if key[0] != os.getpid():
+                continue
+            pool, base_dir = _local_pools.pop(key)
+            pool.close()
+            pool.join()
+            shutil.rmtree(base_dir, ignore_errors=True)
+
+
+# Prefork Celery workers leave without running atexit handlers.
+atexit.register(close_local_pools)
+worker_process_shutdown.connect(close_local_pools)
+
+
+def _job_priority(item):
+    return -item[1].get('task_priority', 0)
+
 
 class LocalBackend(object):
     """A simple sioworkers backend which executes the work in the calling
-       process.
+       process, or with ``settings.SIOWORKERS_LOCAL_PROCESSES`` greater than
+       one, in a pool of processes on the local machine. The pool can't be
+       created in a daemonic process (e.g. of a ``multiprocessing`` pool),
+       where the jobs are run one by one.
 
        Perfect for tests or a single-machine OIOIOI setup.
     """
 
+    def _get_pool(self):
+        processes = settings.SIOWORKERS_LOCAL_PROCESSES
+        if processes <= 1:
+            return None
+        if multiprocessing.current_process().daemon:
+            logger.warning("Daemonic processes can't have children, "
+                           "running LocalBackend jobs one by one")
+            return None
+        # The pool must not be shared with forked processes.
+        key = (os.getpid(), processes)
+        with _local_backend_lock:
+            if key not in _local_pools:
+                base_dir = tempfile.mkdtemp(prefix='oioioi-sioworkers-')
+                _local_pools[key] = (multiprocessing.Pool(processes,
+                        _init_local_pool_process, (base_dir,)), base_dir)
+            return _local_pools[key][0]
+
     def run_job(self, job, **kwargs):
         with _local_backend_lock:
             return sio.workers.runner.run(job)
 
     def run_jobs(self, dict_of_jobs, **kwargs):
-        results = {}
-        for key, value in six.iteritems(dict_of_jobs):
-            results[key] = self.run_job(value, **kwargs)
-        return results
+        # Jobs with higher task_priority are started first.
+        jobs = sorted(six.iteritems(dict_of_jobs), key=_job_priority)
+        pool = self._get_pool()
+        if pool is None or len(jobs) < 2:
+            return {key: self.run_job(job, **kwargs) for key, job in jobs}
+        async_results = [(key, pool.apply_async(_run_in_local_pool, (job,)))
+                         for key, job in jobs]
+        return {key: result.get() for key, result in async_results}
 
     def send_async_jobs(self, env, **kwargs):
         res = self.run_jobs(env['workers_jobs'],
@@ -48,7 +120,6 @@ class LocalBackend(object):
 
 class SioworkersdBackend(object):
     """A backend which collaborates with sioworkersd"""
-    server = Server(settings.SIOWORKERSD_URL, allow_none=True)
 
     def run_job(self, job, **kwargs):
         env = {'workers_jobs': {'dummy_name': job}}
@@ -58,7 +129,7 @@ class SioworkersdBackend(object):
             settings.NON_CONTEST_PRIORITY)
         env['contest_weight'] = (settings.OIOIOI_INSTANCE_WEIGHT_BONUS +
             settings.NON_CONTEST_WEIGHT)
-        ans = SioworkersdBackend.server.sync_run_group(json.dumps(env))
+        ans = get_sioworkersd_client().sync_run_group(json.dumps(env))
         if 'error' in ans:
             raise RuntimeError('Error from workers:\n%s\nTB:\n%s' %
                 (ans['error']['message'], ans['error']['traceback']))
@@ -72,16 +143,31 @@ class SioworkersdBackend(object):
             settings.NON_CONTEST_PRIORITY)
         env['contest_weight'] = (settings.OIOIOI_INSTANCE_WEIGHT_BONUS +
             settings.NON_CONTEST_WEIGHT)
-        ans = SioworkersdBackend.server.sync_run_group(json.dumps(env))
+        ans = get_sioworkersd_client().sync_run_group(json.dumps(env))
         if 'error' in ans:
             raise RuntimeError('Error from workers:\n%s\nTB:\n%s' %
                 (ans['error']['message'], ans['error']['traceback']))
         return ans['workers_jobs.results']
 
-    def send_async_jobs(self, env, **kwargs):
+    def _return_url(self):
         url = settings.SIOWORKERS_LISTEN_URL
         if url is None:
             url = 'http://' + settings.SIOWORKERS_LISTEN_ADDR + ':' \
                 + str(settings.SIOWORKERS_LISTEN_PORT)
-        env['return_url'] = url
-        SioworkersdBackend.server.run_group(json.dumps(env))
+        return url
+
+    def send_async_jobs(self, env, **kwargs):
+        env['return_url'] = self._return_url()
+        get_sioworkersd_client().run_group(json.dumps(env))
+
+    def send_many_async_jobs(self, envs, **kwargs):
+        """Sends many groups of jobs with as few requests to sioworkersd
+           as possible. Returns a list with the exception for every group
+           which couldn't be sent, and ``None`` for the others.
+        """
+        for env in envs:
+            env['return_url'] = self._return_url()
+        results = get_sioworkersd_client().call_many('run_group',
+                [(json.dumps(env),) for env in envs])
+        return [result if isinstance(result, Exception) else None
+                for result in results]
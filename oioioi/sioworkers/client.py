@@ -0,0 +1,196 @@
+"""A client of the XML-RPC interface of sioworkersd.
+
+   ``xmlrpc_client.ServerProxy`` can't be shared between threads, and a new
+   one costs a new connection. :class:`SioworkersdClient` keeps a pool of
+   proxies, each with its own keep-alive connection, and retries calls which
+   failed because of a network error or an overloaded server, as long as
+   retrying them can't run anything twice.
+"""
+import errno
+import functools
+import logging
+import os
+import random
+import socket
+import threading
+import time
+
+from django.conf import settings
+from six.moves import http_client, queue, range, xmlrpc_client
+from six.moves.urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class _Transport(xmlrpc_client.Transport):
+    def __init__(self, timeout):
+        xmlrpc_client.Transport.__init__(self)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = xmlrpc_client.Transport.make_connection(self, host)
+        connection.timeout = self.timeout
+        return connection
+
+
+class _SafeTransport(xmlrpc_client.SafeTransport):
+    def __init__(self, timeout):
+        xmlrpc_client.SafeTransport.__init__(self)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = xmlrpc_client.SafeTransport.make_connection(self, host)
+        connection.timeout = self.timeout
+        return connection
+
+
+def _multicall_result(result):
+    if isinstance(result, dict):
+        return xmlrpc_client.Fault(result['faultCode'],
+                                   result['faultString'])
+    return result[0]
+
+
+class SioworkersdClient(object):
+    """Thread-safe client of sioworkersd.
+
+       XML-RPC methods are called like methods of this object, e.g.
+       ``client.get_workers()``.
+
+       Failed calls are retried up to ``retries`` times, with exponential
+       backoff and full jitter, starting from ``retry_delay`` seconds, if
+       the connection was refused, so the call never reached the server.
+       Calls of :attr:`IDEMPOTENT_METHODS` are also retried after other
+       connection errors and after HTTP 502, 503 or 504. Other calls, like
+       ``run_group``, may have been accepted by the server in such cases,
+       so they are not retried. Timeouts are never retried, as the call may
+       still be running.
+    """
+
+    RETRIABLE_HTTP_CODES = (502, 503, 504)
+
+    #: Methods of sioworkersd which may be safely called more than once.
+    IDEMPOTENT_METHODS = ('get_workers', 'get_queue', 'forget_worker')
+
+    def __init__(self, url, pool_size=8, timeout=None, retries=3,
+                 retry_delay=0.5):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._pool = queue.LifoQueue(pool_size)
+        self._multicall_supported = None
+
+    def _make_proxy(self):
+        if urlparse(self.url).scheme == 'https':
+            transport = _SafeTransport(self.timeout)
+        else:
+            transport = _Transport(self.timeout)
+        return xmlrpc_client.ServerProxy(self.url, transport=transport,
+                                         allow_none=True)
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._make_proxy()
+
+    def _release(self, proxy):
+        try:
+            self._pool.put_nowait(proxy)
+        except queue.Full:
+            proxy('close')()
+
+    def _is_retriable(self, error, idempotent):
+        if isinstance(error, socket.timeout):
+            return False
+        if isinstance(error, socket.error) and \
+                error.errno == errno.ECONNREFUSED:
+            return True
+        if not idempotent:
+            return False
+        if isinstance(error, xmlrpc_client.ProtocolError):
+            return error.errcode in self.RETRIABLE_HTTP_CODES
+        return isinstance(error, (socket.error, http_client.HTTPException))
+
+    def call(self, method, *args):
+        return self._call(method, args, method in self.IDEMPOTENT_METHODS)
+
+    def _call(self, method, args, idempotent):
+        for attempt in range(self.retries + 1):
+            proxy = self._acquire()
+            try:
+                result = getattr(proxy, method)(*args)
+            # pylint: disable=broad-except
+            except Exception as e:
+                # The connection may be left in an unknown state.
+                proxy('close')()
+                if attempt == self.retries or \
+                        not self._is_retriable(e, idempotent):
+                    raise
+                delay = random.uniform(0, self.retry_delay * 2 ** attempt)
+                logger.warning("Call of %s on sioworkersd failed (%s), "
+                               "retrying in %.2fs", method, e, delay)
+                time.sleep(delay)
+            else:
+                self._release(proxy)
+                return result
+
+    def call_many(self, method, args_list):
+        """Calls ``method`` with each of the argument tuples from
+           ``args_list``, in a single request if the server supports
+           ``system.multicall``, and otherwise one by one over a single
+           connection.
+
+           Returns a list of results. Calls which failed have the exception
+           in place of their result.
+        """
+        if not args_list:
+            return []
+        if self._multicall_supported is not False:
+            calls = [{'methodName': method, 'params': list(args)}
+                     for args in args_list]
+            try:
+                results = self._call('system.multicall', (calls,),
+                                     method in self.IDEMPOTENT_METHODS)
+            except xmlrpc_client.Fault:
+                if self._multicall_supported:
+                    raise
+                self._multicall_supported = False
+            else:
+                self._multicall_supported = True
+                return [_multicall_result(result) for result in results]
+
+        results = []
+        for args in args_list:
+            try:
+                results.append(self.call(method, *args))
+            # pylint: disable=broad-except
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return functools.partial(self.call, name)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_sioworkersd_client():
+    """Returns the client of ``settings.SIOWORKERSD_URL`` shared by all
+       threads of the current process.
+    """
+    # Connections must not be shared with forked processes.
+    key = (os.getpid(), settings.SIOWORKERSD_URL)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = SioworkersdClient(settings.SIOWORKERSD_URL,
+                    pool_size=settings.SIOWORKERSD_POOL_SIZE,
+                    timeout=settings.SIOWORKERSD_TIMEOUT,
+                    retries=settings.SIOWORKERSD_RETRIES,
+                    retry_delay=settings.SIOWORKERSD_RETRY_DELAY)
+        return _clients[key]
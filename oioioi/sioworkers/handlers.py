@@ -1,4 +1,4 @@
-from oioioi.sioworkers.jobs import send_async_jobs
+from oioioi.sioworkers.jobs import send_async_jobs, send_many_async_jobs
 
 _STRIPPED_FIELDS = ['recipe', 'error_handlers']
 
@@ -14,11 +14,28 @@ def restore_job(saved_environ, resuming_environ):
     return saved_environ
 
 
+def _strip_environ(environ):
+    for field in _STRIPPED_FIELDS:
+        if field in environ:
+            del environ[field]
+
+
 def transfer_job(environ):
     """Removes fields from environ that aren't needed by sioworkersd and
        sends it. Environ is already saved in database.
     """
-    for field in _STRIPPED_FIELDS:
-        if field in environ:
-            del environ[field]
+    _strip_environ(environ)
     send_async_jobs(environ)
+
+
+def transfer_jobs(environs_with_kwargs):
+    """Like :func:`transfer_job`, but sends many environs at once. Used by
+       ``evalmgr_batch_job``.
+    """
+    environs = [environ for environ, _kwargs in environs_with_kwargs]
+    for environ in environs:
+        _strip_environ(environ)
+    return send_many_async_jobs(environs)
+
+
+transfer_job.transfer_many = transfer_jobs
@@ -27,3 +27,26 @@ def send_async_jobs(dict_of_jobs, **kwargs):
         for _, job in six.iteritems(dict_of_jobs['workers_jobs']):
             job['filetracker_url'] = settings.FILETRACKER_URL
     return _get_backend().send_async_jobs(dict_of_jobs, **kwargs)
+
+
+def send_many_async_jobs(list_of_envs, **kwargs):
+    """Like :func:`send_async_jobs`, but for many environs at once. Returns
+       a list with the exception for every environ which couldn't be sent,
+       and ``None`` for the others.
+    """
+    for env in list_of_envs:
+        if settings.FILETRACKER_URL:
+            for _, job in six.iteritems(env['workers_jobs']):
+                job['filetracker_url'] = settings.FILETRACKER_URL
+    backend = _get_backend()
+    if not hasattr(backend, 'send_many_async_jobs'):
+        errors = []
+        for env in list_of_envs:
+            try:
+                backend.send_async_jobs(env, **kwargs)
+                errors.append(None)
+            # pylint: disable=broad-except
+            except Exception as e:
+                errors.append(e)
+        return errors
+    return backend.send_many_async_jobs(list_of_envs, **kwargs)
@@ -1,5 +1,13 @@
+import errno
+import os
+import socket
+
 from django.test import TestCase
+from django.test.utils import override_settings
+from six.moves import xmlrpc_client
 
+from oioioi.sioworkers.backends import _local_pools, close_local_pools
+from oioioi.sioworkers.client import SioworkersdClient
 from oioioi.sioworkers.jobs import run_sioworkers_job, run_sioworkers_jobs
 
 
@@ -13,3 +21,110 @@ class TestSioworkersBindings(TestCase):
         self.assertEqual(envs['key1'].get('pong'), 'e1')
         self.assertEqual(envs['key2'].get('pong'), 'e2')
         self.assertEqual(len(envs), 2)
+
+    @override_settings(SIOWORKERS_LOCAL_PROCESSES=2)
+    def test_parallel_local_backend(self):
+        self.addCleanup(close_local_pools)
+        jobs = {'key%d' % i: dict(job_type='ping', ping='e%d' % i,
+                                  task_priority=i)
+                for i in range(5)}
+        envs = run_sioworkers_jobs(jobs)
+        self.assertEqual(len(envs), 5)
+        for i in range(5):
+            self.assertEqual(envs['key%d' % i].get('pong'), 'e%d' % i)
+
+        base_dirs = [base_dir for _pool, base_dir in _local_pools.values()]
+        self.assertEqual(len(base_dirs), 1)
+        close_local_pools()
+        self.assertFalse(_local_pools)
+        self.assertFalse(os.path.exists(base_dirs[0]))
+
+
+class FakeProxy(object):
+    def __init__(self, client):
+        self.client = client
+        self.closed = False
+
+    def __call__(self, attr):
+        assert attr == 'close'
+        return self.close
+
+    def close(self):
+        self.closed = True
+
+    def __getattr__(self, name):
+        def method(*args):
+            self.client.calls.append((name, args))
+            if self.client.failures:
+                raise self.client.failures.pop(0)
+            if name == 'system.multicall':
+                if not self.client.multicall:
+                    raise xmlrpc_client.Fault(8001, 'no such method')
+                return [[call['params'][0]] for call in args[0]]
+            return args[0] if args else None
+        return method
+
+
+class FakeClient(SioworkersdClient):
+    def __init__(self, failures=(), multicall=True, **kwargs):
+        kwargs.setdefault('retry_delay', 0)
+        super(FakeClient, self).__init__('http://localhost/', **kwargs)
+        self.failures = list(failures)
+        self.multicall = multicall
+        self.calls = []
+        self.proxies = []
+
+    def _make_proxy(self):
+        proxy = FakeProxy(self)
+        self.proxies.append(proxy)
+        return proxy
+
+
+class TestSioworkersdClient(TestCase):
+    def test_connections_reused(self):
+        client = FakeClient()
+        for i in range(3):
+            self.assertEqual(client.run_group(i), i)
+        self.assertEqual(len(client.proxies), 1)
+
+    def test_retries(self):
+        client = FakeClient(failures=[socket.error(), xmlrpc_client
+                .ProtocolError('url', 503, 'Unavailable', {})])
+        self.assertEqual(client.get_workers('env'), 'env')
+        self.assertEqual(len(client.calls), 3)
+        self.assertTrue(client.proxies[0].closed)
+
+        client = FakeClient(failures=[socket.error()] * 3, retries=2)
+        with self.assertRaises(socket.error):
+            client.get_workers()
+
+        client = FakeClient(failures=[socket.timeout()])
+        with self.assertRaises(socket.timeout):
+            client.get_workers()
+        self.assertEqual(len(client.calls), 1)
+
+    def test_non_idempotent_retries(self):
+        # The group may have been queued already.
+        for error in [socket.error(errno.ECONNRESET, 'reset'),
+                      xmlrpc_client.ProtocolError('url', 504, 'Timeout', {})]:
+            client = FakeClient(failures=[error])
+            with self.assertRaises(type(error)):
+                client.run_group('env')
+            self.assertEqual(len(client.calls), 1)
+
+        # The connection was refused, so the group wasn't queued.
+        client = FakeClient(failures=[socket.error(errno.ECONNREFUSED,
+                                                   'refused')])
+        self.assertEqual(client.run_group('env'), 'env')
+        self.assertEqual(len(client.calls), 2)
+
+    def test_call_many(self):
+        client = FakeClient()
+        self.assertEqual(client.call_many('run_group', [(1,), (2,)]), [1, 2])
+        self.assertEqual(len(client.calls), 1)
+
+        client = FakeClient(multicall=False)
+        self.assertEqual(client.call_many('run_group', [(1,), (2,)]), [1, 2])
+        self.assertEqual(client.call_many('run_group', [(3,)]), [3])
+        self.assertEqual([name for name, _args in client.calls],
+                         ['system.multicall'] + ['run_group'] * 3)
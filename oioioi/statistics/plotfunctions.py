@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
-from collections import defaultdict
-from itertools import groupby  # pylint: disable=E0611
+from collections import Counter, defaultdict
 from operator import itemgetter  # pylint: disable=E0611
 
 from django.core.urlresolvers import reverse
@@ -10,6 +9,7 @@ from six.moves import zip
 
 from oioioi.contests.models import (ScoreReport, Submission,
                                     UserResultForContest, UserResultForProblem)
+from oioioi.contests.score_keys import int_score_counts
 from oioioi.contests.utils import is_contest_admin, is_contest_observer
 from oioioi.programs.models import ProgramSubmission, TestReport
 
@@ -19,20 +19,25 @@ def int_score(score, default=0):
             else default
 
 
-def histogram(values, num_buckets=10, max_result=None):
+def histogram(values, num_buckets=10, max_result=None, value_counts=None):
     """Calculates the histogram of the provided values (integers).
        Assumes that minimal value is 0.
 
        :param values: List of integers to compute the histogram.
        :param num_buckets: Number of histogram buckets.
+       :param value_counts: Dictionary mapping values to the numbers of their
+           occurrences, used instead of ``values``.
        :returns: A pair of lists (boundaries, counts); boundaries contain
            lower bounds of bucket limits; counts contain the numbers of
            elements going in particular buckets.
     """
     assert num_buckets > 0, "Non positive number of buckets for histogram"
 
-    if max_result is None and values:
-        max_result = max(values)
+    if value_counts is None:
+        value_counts = Counter(values)
+
+    if max_result is None and value_counts:
+        max_result = max(value_counts)
 
     if max_result:
         if max_result < num_buckets:
@@ -47,18 +52,17 @@ def histogram(values, num_buckets=10, max_result=None):
         bucket = 1
         counts = [0]
 
-    for key, group in groupby(values, key=(lambda x: x / bucket)):
-        counts[key] += len(list(group))
+    for value, count in value_counts.items():
+        counts[value / bucket] += count
 
     return [list(tup) for tup in
             zip(*[[i*bucket, value] for i, value in enumerate(counts)])]
 
 
 def results_histogram_for_queryset(request, qs, max_score=None):
-    scores = [int_score(r.score) for r in qs]
-
     max_score = int_score(max_score, None)
-    keys_left, data = histogram(scores, max_result=max_score)
+    keys_left, data = histogram(None, max_result=max_score,
+                                value_counts=int_score_counts(qs))
 
     keys = ['[%d;%d)' % p for p in zip(keys_left[:-1], keys_left[1:])]
     keys.append('[%d;∞)' % keys_left[-1])
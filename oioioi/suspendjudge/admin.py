@@ -10,6 +10,7 @@ from oioioi.contests.admin import ProblemInstanceAdmin
 from oioioi.contests.models import ProblemInstance, Submission
 from oioioi.contests.utils import contest_exists, is_contest_admin
 from oioioi.evalmgr.models import QueuedJob
+from oioioi.evalmgr.tasks import batched_evaluation
 from oioioi.suspendjudge.models import SuspendedProblem
 from oioioi.suspendjudge.utils import is_suspended, is_suspended_on_init
 
@@ -31,9 +32,10 @@ class SuspendJudgeProblemInstanceAdminMixin(object):
     def _rejudge(self, instance_id):
         suspended = Submission.objects.filter(queuedjob__state="SUSPENDED",
                                               problem_instance=instance_id)
-        for submission in suspended:
-            QueuedJob.objects.filter(submission=submission).delete()
-            submission.problem_instance.controller.judge(submission)
+        with batched_evaluation():
+            for submission in suspended:
+                QueuedJob.objects.filter(submission=submission).delete()
+                submission.problem_instance.controller.judge(submission)
 
     def _clear_queue(self, instance_id):
         QueuedJob.objects.filter(submission__problem_instance=instance_id,
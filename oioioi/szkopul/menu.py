@@ -1,4 +1,5 @@
 from django.utils.translation import ugettext_lazy as _
 from oioioi.base.menu import MenuRegistry
 
-navbar_links_registry = MenuRegistry(_("Navigation Bar Menu"))
+navbar_links_registry = MenuRegistry(_("Navigation Bar Menu"),
+    name='navbar_links')
@@ -83,7 +83,7 @@ COMPRESS_ENABLED = False
 COMPRESS_PRECOMPILERS = ()
 CELERY_ALWAYS_EAGER = True
 SIOWORKERS_BACKEND = 'oioioi.sioworkers.backends.LocalBackend'
-FILETRACKER_CLIENT_FACTORY = 'filetracker.client.dummy.DummyClient'
+FILETRACKER_CLIENT_FACTORY = 'oioioi.filetracker.client.shared_dummy_factory'
 FILETRACKER_URL = None
 USE_UNSAFE_EXEC = True
 USE_LOCAL_COMPILERS = True
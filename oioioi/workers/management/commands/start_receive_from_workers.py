@@ -1,19 +1,141 @@
-import BaseHTTPServer
 import cgi
 import json
 import logging
-import SocketServer
+import threading
+import time
+from optparse import make_option
 
-import six.moves.BaseHTTPServer
-import six.moves.socketserver
 from django.conf import settings
-from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, transaction
+from six.moves import queue, range
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler
+from six.moves.socketserver import TCPServer, ThreadingMixIn
 
 from oioioi.evalmgr.tasks import delay_environ
 
+logger = logging.getLogger(__name__)
 
-class ServerHandler(six.moves.BaseHTTPServer.BaseHTTPRequestHandler):
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+class ReceiverStats(object):
+    """Statistics of the receiver, collected between reports."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.failed = 0
+        self.rejected = 0
+
+    def add(self, latency, ok):
+        with self.lock:
+            self.latencies.append(latency)
+            if not ok:
+                self.failed += 1
+
+    def add_rejected(self):
+        with self.lock:
+            self.rejected += 1
+
+    def report(self, queue_depth):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            failed, rejected = self.failed, self.rejected
+            self.latencies = []
+            self.failed = self.rejected = 0
+        logger.info("Sioworkers receiver: %d results handled (%d failed, "
+                    "%d rejected), queue depth %d, latency p50 %.3fs, "
+                    "p99 %.3fs", len(latencies), failed, rejected,
+                    queue_depth, _percentile(latencies, 0.5),
+                    _percentile(latencies, 0.99))
+
+
+class _ReceivedEnviron(object):
+    def __init__(self, env):
+        self.env = env
+        self.received = time.time()
+        self.ok = False
+        self.done = threading.Event()
+
+
+class EnvironReceiver(object):
+    """Queues environs received from sioworkersd in evalmgr.
+
+       Environs wait in a bounded queue for one of ``workers`` threads,
+       each of which takes up to ``batch_size`` of them at once and queues
+       them one by one, each in its own transaction. They are acknowledged
+       once their transactions are committed.
+    """
+
+    def __init__(self, workers, batch_size, queue_size):
+        self.batch_size = batch_size
+        self.queue = queue.Queue(queue_size)
+        self.stats = ReceiverStats()
+        self.threads = [threading.Thread(target=self._work)
+                        for _i in range(workers)]
+        for thread in self.threads:
+            thread.daemon = True
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, env, timeout=None):
+        """Waits until the environ is queued in evalmgr. Returns whether it
+           succeeded.
+
+           Raises :exc:`queue.Full` if the environ couldn't be accepted
+           within ``timeout`` seconds, because too many environs are waiting.
+        """
+        item = _ReceivedEnviron(env)
+        try:
+            self.queue.put(item, timeout=timeout)
+        except queue.Full:
+            self.stats.add_rejected()
+            raise
+        item.done.wait()
+        return item.ok
+
+    def _work(self):
+        while True:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            close_old_connections()
+            self.process_batch(batch)
+
+    def process_batch(self, batch):
+        # Every environ is queued in its own transaction: ``delay_environ``
+        # sends the job to celery before the commit, so a job queued in
+        # a transaction rolled back later would run anyway, and would be
+        # queued again when sioworkersd resent the rejected environ.
+        try:
+            for item in batch:
+                try:
+                    with transaction.atomic():
+                        delay_environ(item.env)
+                    item.ok = True
+                # pylint: disable=broad-except
+                except Exception:
+                    logger.error("Failed to queue environ %s",
+                                 item.env.get('job_id'), exc_info=True)
+        finally:
+            now = time.time()
+            for item in batch:
+                self.stats.add(now - item.received, item.ok)
+                item.done.set()
+
+
+class ServerHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         # security through obscurity
         self.send_error(404)
@@ -27,32 +149,79 @@ class ServerHandler(six.moves.BaseHTTPServer.BaseHTTPRequestHandler):
                      })
         if "data" not in form:
             self.send_error(404)
-        else:
-            logging.debug("Sioworkersd receiver got: " + form.getvalue('data'))
-            env = json.loads(form.getvalue('data'))
-            del env['workers_jobs']
-            if 'workers_jobs.extra_args' in env:
-                del env['workers_jobs.extra_args']
-            assert 'workers_jobs.results' in env or 'error' in env
-
-            with transaction.atomic():
-                delay_environ(env)
-
-            self.send_response(200, 'OK')
-            self.send_header('Content-type', 'text/plain')
+            return
+
+        logger.debug("Sioworkersd receiver got: " + form.getvalue('data'))
+        env = json.loads(form.getvalue('data'))
+        del env['workers_jobs']
+        if 'workers_jobs.extra_args' in env:
+            del env['workers_jobs.extra_args']
+        assert 'workers_jobs.results' in env or 'error' in env
+
+        try:
+            ok = self.server.receiver.submit(env,
+                    settings.SIOWORKERS_RECEIVER_QUEUE_TIMEOUT)
+        except queue.Full:
+            self.send_response(503, 'Too many results waiting')
+            self.send_header('Retry-After',
+                             str(settings.SIOWORKERS_RECEIVER_QUEUE_TIMEOUT))
             self.end_headers()
-            self.wfile.write('OK')
+            return
+        if not ok:
+            self.send_error(500)
+            return
+
+        self.send_response(200, 'OK')
+        self.send_header('Content-type', 'text/plain')
+        self.end_headers()
+        self.wfile.write(b'OK')
 
 
-class Server(six.moves.socketserver.TCPServer):
+class Server(ThreadingMixIn, TCPServer):
     # See SIO-1741 and
     # https://docs.python.org/2/library/socketserver.html#SocketServer.BaseServer.allow_reuse_address
     allow_reuse_address = True
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, receiver):
+        TCPServer.__init__(self, server_address, handler_class)
+        self.receiver = receiver
 
 
 class Command(BaseCommand):
+    help = "Receives results of jobs from sioworkersd and queues them " \
+           "in evalmgr."
+
+    option_list = BaseCommand.option_list + (
+        make_option('-w', '--workers',
+                    type='int',
+                    default=settings.SIOWORKERS_RECEIVER_WORKERS,
+                    help="Number of threads queuing results in evalmgr"),
+        make_option('--stats-interval',
+                    metavar='SECONDS',
+                    type='int',
+                    default=300,
+                    help="Time between reports of the queue depth and "
+                         "handling latency"),
+    )
+
     def handle(self, *args, **options):
-        Handler = ServerHandler
+        if options['workers'] < 1:
+            raise CommandError("At least one worker is required.")
+        receiver = EnvironReceiver(options['workers'],
+                                   settings.SIOWORKERS_RECEIVER_BATCH_SIZE,
+                                   settings.SIOWORKERS_RECEIVER_QUEUE_SIZE)
+        receiver.start()
+
+        def report_stats():
+            while True:
+                time.sleep(options['stats_interval'])
+                receiver.stats.report(receiver.queue.qsize())
+        reporter = threading.Thread(target=report_stats)
+        reporter.daemon = True
+        reporter.start()
+
         httpd = Server((settings.SIOWORKERS_LISTEN_ADDR,
-            settings.SIOWORKERS_LISTEN_PORT), Handler)
+            settings.SIOWORKERS_LISTEN_PORT), ServerHandler, receiver)
         httpd.serve_forever()
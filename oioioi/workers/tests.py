@@ -1,7 +1,12 @@
 from django.core.urlresolvers import reverse
+import mock
+from six.moves import queue
 
 from oioioi.base.tests import TestCase
+from oioioi.evalmgr.models import QueuedJob
 from oioioi.workers import views
+from oioioi.workers.management.commands.start_receive_from_workers import \
+    EnvironReceiver, _ReceivedEnviron
 
 
 class TestServer(object):
@@ -18,7 +23,10 @@ class TestWorkersInfo(TestCase):
 
     def setUp(self):
         # monkeypatch test server instead of XMLRPC
-        views.server = TestServer()
+        patcher = mock.patch.object(views, 'get_sioworkersd_client',
+                                    return_value=TestServer())
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
     def test_admin_can_see(self):
         self.client.login(username='test_admin')
@@ -31,3 +39,26 @@ class TestWorkersInfo(TestCase):
         url = reverse('show_workers')
         response = self.client.get(url)
         self.assertNotIn(b'Komp4', response.content)
+
+
+class TestEnvironReceiver(TestCase):
+    def test_process_batch(self):
+        receiver = EnvironReceiver(workers=1, batch_size=10, queue_size=10)
+        good = _ReceivedEnviron({'job_id': 'good', 'recipe': []})
+        broken = _ReceivedEnviron({'recipe': []})
+        receiver.process_batch([good, broken])
+
+        self.assertTrue(good.done.is_set())
+        self.assertTrue(good.ok)
+        self.assertTrue(broken.done.is_set())
+        self.assertFalse(broken.ok)
+        self.assertFalse(QueuedJob.objects.exists())
+        self.assertEqual(len(receiver.stats.latencies), 2)
+        self.assertEqual(receiver.stats.failed, 1)
+
+    def test_backpressure(self):
+        receiver = EnvironReceiver(workers=1, batch_size=10, queue_size=1)
+        receiver.queue.put(_ReceivedEnviron({'job_id': 'waiting'}))
+        with self.assertRaises(queue.Full):
+            receiver.submit({'job_id': 'rejected'}, timeout=0)
+        self.assertEqual(receiver.stats.rejected, 1)
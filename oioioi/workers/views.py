@@ -6,18 +6,15 @@ from django.core.urlresolvers import reverse
 from django.http import JsonResponse
 from django.shortcuts import render
 from django.utils.translation import ugettext_lazy as _
-import six.moves.xmlrpc_client
 from six.moves import map
 
 from oioioi.base.admin import system_admin_menu_registry
 from oioioi.base.permissions import enforce_condition, is_superuser
-
-server = six.moves.xmlrpc_client.ServerProxy(settings.SIOWORKERSD_URL,
-        allow_none=True)
+from oioioi.sioworkers.client import get_sioworkersd_client
 
 
 def get_info_about_workers():
-    return server.get_workers()
+    return get_sioworkersd_client().get_workers()
 
 
 def get_all_names():
@@ -26,7 +23,7 @@ def get_all_names():
 
 def del_worker(l):
     for i in l:
-        server.forget_worker(i)
+        get_sioworkersd_client().forget_worker(i)
 
 
 @enforce_condition(is_superuser)